@@ -0,0 +1,47 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import database
+from config import DB_EXECUTOR_WORKERS
+
+# Dedicated threads for SQLite work; each keeps its own pooled WAL connection,
+# so readers are never blocked by a committing writer and the event loop never is
+_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="eaglens-db")
+
+async def run_db(func, *args, **kwargs):
+    """Run a blocking database call on the DB executor and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+async def init_db():
+    return await run_db(database.init_db)
+
+async def add_invite_code(code, max_uses=1):
+    return await run_db(database.add_invite_code, code, max_uses)
+
+async def log_visitor(telegram_id, username):
+    return await run_db(database.log_visitor, telegram_id, username)
+
+async def verify_invite_code(telegram_id, code):
+    return await run_db(database.verify_invite_code, telegram_id, code)
+
+async def get_all_users():
+    return await run_db(database.get_all_users)
+
+async def set_setting(key, value):
+    return await run_db(database.set_setting, key, value)
+
+async def get_owner_id():
+    return await run_db(database.get_owner_id)
+
+async def check_user_access(telegram_id):
+    # Cache hits are answered on the event loop without an executor hop
+    cached = database.cached_user_access(telegram_id)
+    if cached is not None:
+        return cached
+    return await run_db(database.check_user_access, telegram_id)
+
+def shutdown():
+    """Drain the DB executor and close its pooled connections."""
+    _executor.shutdown(wait=True)
+    database.close_db_connections()
@@ -0,0 +1,216 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from calibration import ALL_LEAGUES, CalibrationTracker
+from engine import EaglensEngine
+from rules import RuleTable
+from signals import OUTCOMES, AssumptionRegistry, NewsSignalEngine
+from strength import TeamStrengthModel
+from config import GATE_RULES, LEAGUE_GATE_OVERRIDES, DEFAULT_HOME_EXP_GOALS, DEFAULT_AWAY_EXP_GOALS
+
+CALIBRATION_BINS = 10
+
+def outcome_index(home_goals, away_goals):
+    return 0 if home_goals > away_goals else 1 if home_goals == away_goals else 2
+
+def shard_results(results):
+    """Group get_finished_fixtures() rows by (competition_id, season), each in kickoff order."""
+    shards = {}
+    for row in sorted(results, key=lambda r: (r[3], r[0])):
+        shards.setdefault((row[1], row[2]), []).append(row)
+    return shards
+
+def replay_shard(results, news_by_fixture=None):
+    """Replay one league-season day by day through a fresh engine, strength model and calibration tracker.
+
+    Every fixture is predicted from what was known before its kickoff day, then settled. As in production,
+    suppressed predictions are settled too, so the rolling metrics (and therefore the gates) do not depend on the
+    gate thresholds; that is what lets one replay be re-scored under any number of threshold variants.
+    Returns one record per fixture: (fixture_id, league, metrics at prediction time, probabilities, outcome,
+    assumption confidence penalty).
+    """
+    news_by_fixture = news_by_fixture or {}
+    engine = EaglensEngine()
+    news_engine = NewsSignalEngine()
+    tracker = CalibrationTracker()
+    assumptions = AssumptionRegistry()
+    model = TeamStrengthModel()
+    history, records = [], []
+
+    for _, rows in itertools.groupby(results, key=lambda r: r[3][:10]):
+        rows = list(rows)
+        if history:
+            # Production refits once a day, warm-started; do the same with everything settled so far
+            model.fit(history, reference_date=rows[0][3])
+        goals = [model.expected_goals(r[4], r[5]) if history else (DEFAULT_HOME_EXP_GOALS, DEFAULT_AWAY_EXP_GOALS)
+                 for r in rows]
+        probs = engine.calculate_poisson_probabilities_batch(
+            [g[0] * engine.home_goals_factor for g in goals], [g[1] for g in goals]
+        )
+        probs = np.column_stack([probs[k] for k in OUTCOMES])
+        news = [news_by_fixture.get(r[0], []) for r in rows]
+        if any(news):
+            probs, _ = news_engine.apply_signal_shift_batch(probs, **news_engine.encode_news(news))
+
+        for row, p in zip(rows, probs):
+            fixture_id, league, _, _, _, _, home_goals, away_goals = row
+            records.append((fixture_id, league, dict(engine.metrics_for(league)), p.tolist(),
+                            outcome_index(home_goals, away_goals), engine.assumption_penalty))
+        for row, p, g in zip(rows, probs, goals):
+            _, league, _, utc_date, home_team, away_team, home_goals, away_goals = row
+            tracker.settle(league, dict(zip(OUTCOMES, p)), home_goals, away_goals, sum(g))
+            history.append((utc_date, home_team, away_team, home_goals, away_goals))
+
+        engine.league_metrics = tracker.league_metrics()
+        engine.calibration_metrics = tracker.metrics(ALL_LEAGUES)
+        assumptions.evaluate_all(engine.calibration_metrics)
+        engine.set_assumption_weights(assumptions.weights())
+    return records
+
+def variant_rules(overrides):
+    """RuleTable gating every league at the thresholds in `overrides` ({metric: threshold}), config elsewhere."""
+    return RuleTable(
+        gate_rules=tuple((metric, op, overrides.get(metric, threshold), reason)
+                         for metric, op, threshold, reason in GATE_RULES),
+        gate_overrides={league: {m: t for m, t in rules.items() if m not in overrides}
+                        for league, rules in LEAGUE_GATE_OVERRIDES.items()}
+    )
+
+def sweep_variants(grid):
+    """Every combination of a {metric: [thresholds]} grid, as override dicts."""
+    metrics = sorted(grid)
+    return [dict(zip(metrics, values)) for values in itertools.product(*(grid[m] for m in metrics))]
+
+def score_records(records, overrides=None, bins=CALIBRATION_BINS):
+    """Brier, log-loss, calibration curve and suppression rate for replayed records under one gate variant."""
+    if not records:
+        # Same keys as a scored report, so callers can sort and format without special cases
+        return {
+            "overrides": overrides or {}, "fixtures": 0, "published": 0, "suppression_rate": None,
+            "brier": None, "log_loss": None, "suppressed_brier": None, "all_brier": None, "all_log_loss": None,
+            "mean_confidence": None, "calibration_curve": []
+        }
+    rules = variant_rules(overrides or {})
+    _, leagues, metrics, probs, outcomes, penalties = zip(*records)
+    reliable, _, confidence = rules.evaluate(list(metrics), list(leagues))
+    published = np.array(reliable)
+    probs = np.array(probs)
+    actual = np.eye(3)[list(outcomes)]
+    brier = ((probs - actual) ** 2).mean(axis=1)
+    log_loss = -np.log(np.clip(probs[np.arange(len(probs)), list(outcomes)], 1e-15, 1.0))
+
+    def mean(values, mask):
+        return float(values[mask].mean()) if mask.any() else None
+
+    # Reliability diagram over every published outcome probability
+    predicted, observed = probs[published].ravel(), actual[published].ravel()
+    which = np.minimum((predicted * bins).astype(int), bins - 1)
+    counts = np.bincount(which, minlength=bins)
+    with np.errstate(invalid="ignore"):
+        mean_predicted = np.bincount(which, predicted, bins) / counts
+        frequency = np.bincount(which, observed, bins) / counts
+    curve = [[float(p), float(f), int(c)] for p, f, c in zip(mean_predicted, frequency, counts) if c]
+
+    confidence = np.maximum(np.array(confidence) - np.array(penalties), 0)
+    everything = np.ones(len(records), dtype=bool)
+    return {
+        "overrides": overrides or {},
+        "fixtures": len(records),
+        "published": int(published.sum()),
+        "suppression_rate": float(1.0 - published.mean()),
+        "brier": mean(brier, published),
+        "log_loss": mean(log_loss, published),
+        "suppressed_brier": mean(brier, ~published),
+        "all_brier": mean(brier, everything),
+        "all_log_loss": mean(log_loss, everything),
+        "mean_confidence": mean(confidence, published),
+        "calibration_curve": curve
+    }
+
+def _score_variant(args):
+    records, overrides = args
+    return score_records(records, overrides)
+
+def run_backtest(results, grid=None, news_by_fixture=None, workers=None):
+    """Replay every (league, season) shard in parallel, then score the baseline gates and each sweep variant.
+
+    Shards are independent, so each season starts from a cold strength model and empty calibration windows.
+
+    Returns {"shards": {"league/season": report}, "baseline": report, "sweep": [report, ...]}.
+    """
+    shards = shard_results(results)
+    keys = list(shards)
+    news_by_fixture = news_by_fixture or {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        replays = list(pool.map(replay_shard, [shards[k] for k in keys],
+                                [{r[0]: news_by_fixture[r[0]] for r in shards[k] if r[0] in news_by_fixture}
+                                 for k in keys]))
+        records = [record for replay in replays for record in replay]
+        variants = sweep_variants(grid) if grid else []
+        sweep = list(pool.map(_score_variant, [(records, overrides) for overrides in variants]))
+    return {
+        "shards": {f"{league}/{season}": score_records(replay) for (league, season), replay in zip(keys, replays)},
+        "baseline": score_records(records),
+        "sweep": sorted(sweep, key=lambda report: (report["brier"] is None, report["brier"]))
+    }
+
+def parse_grid(specs):
+    """["brier_score=0.21,0.23,0.25", ...] -> {"brier_score": [0.21, 0.23, 0.25]}."""
+    grid = {}
+    known = {rule[0] for rule in GATE_RULES}
+    for spec in specs or ():
+        metric, _, values = spec.partition("=")
+        if metric not in known:
+            raise ValueError(f"Unknown gate metric: {metric} (expected one of {', '.join(sorted(known))})")
+        grid[metric] = [float(v) for v in values.split(",")]
+    return grid
+
+def format_report(name, report):
+    if not report.get("fixtures"):
+        return f"{name:<40} no fixtures"
+    brier = f"{report['brier']:.4f}" if report["brier"] is not None else "-"
+    log_loss = f"{report['log_loss']:.4f}" if report["log_loss"] is not None else "-"
+    return f"{name:<40} {report['fixtures']:>8} {report['suppression_rate']:>9.1%} {brier:>8} {log_loss:>9} " \
+           f"{report['all_brier']:>9.4f}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay stored results through the Eaglens engine and gates")
+    parser.add_argument("--db", help="SQLite database to read finished fixtures and news from (default: config DB_PATH)")
+    parser.add_argument("--league", type=int, help="Only this competition id")
+    parser.add_argument("--sweep", nargs="*", metavar="METRIC=V1,V2",
+                        help="Gate thresholds to sweep, e.g. brier_score=0.21,0.23,0.25 sample_size=5,10,20")
+    parser.add_argument("--no-news", action="store_true", help="Ignore stored news items")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output", help="Write the full report as JSON")
+    args = parser.parse_args(argv)
+
+    import database
+    if args.db:
+        database.DB_PATH = args.db
+    from fixtures import get_finished_fixtures
+    from news import load_news_by_fixture
+    results = get_finished_fixtures(args.league)
+    news_by_fixture = {} if args.no_news else load_news_by_fixture(row[0] for row in results)
+
+    started = time.perf_counter()
+    report = run_backtest(results, parse_grid(args.sweep), news_by_fixture, args.workers)
+    print(f"{'shard / variant':<40} {'fixtures':>8} {'suppress':>9} {'brier':>8} {'log-loss':>9} {'all brier':>9}")
+    for name, shard in report["shards"].items():
+        print(format_report(name, shard))
+    print(format_report("baseline", report["baseline"]))
+    for variant in report["sweep"]:
+        print(format_report(" ".join(f"{k}={v:g}" for k, v in variant["overrides"].items()), variant))
+    print(f"Replayed {len(results)} results in {time.perf_counter() - started:.1f}s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
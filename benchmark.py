@@ -0,0 +1,243 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_PATH = os.path.join(BASE_DIR, "bench_results.json")
+BASELINE_PATH = os.path.join(BASE_DIR, "benchmark_baseline.json")
+
+def summarize(latencies, elapsed):
+    """p50/p99 latency in microseconds plus throughput for one benchmark."""
+    latencies = np.asarray(latencies) * 1e6
+    return {
+        "ops": len(latencies),
+        "p50_us": float(np.percentile(latencies, 50)),
+        "p99_us": float(np.percentile(latencies, 99)),
+        "ops_per_sec": len(latencies) / elapsed if elapsed else 0.0
+    }
+
+def measure(fn, iterations, warmup=10):
+    """Time a synchronous callable once per iteration."""
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - start)
+
+async def measure_concurrent(make_coro, iterations, concurrency):
+    """Drive `iterations` coroutines with at most `concurrency` in flight."""
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            t0 = time.perf_counter()
+            await make_coro(i)
+            latencies.append(time.perf_counter() - t0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(iterations)))
+    return summarize(latencies, time.perf_counter() - start)
+
+def bench_engine(iterations):
+    from engine import EaglensEngine
+    from signals import NewsSignalEngine
+
+    engine = EaglensEngine()
+    rng = random.Random(7)
+    inputs = [(round(rng.uniform(0.5, 3.0), 2), round(rng.uniform(0.5, 3.0), 2)) for _ in range(iterations)]
+    cycle = iter(inputs * 1000)
+
+    results = {}
+    results["engine.predict"] = measure(lambda: engine.predict("Home", "Away", *next(cycle)), iterations)
+
+    def cold_probabilities():
+        engine.clear_cache()
+        engine.calculate_poisson_probabilities(*next(cycle))
+    results["engine.calculate_poisson_probabilities[cold]"] = measure(cold_probabilities, iterations)
+    results["engine.calculate_poisson_probabilities[cached]"] = measure(
+        lambda: engine.calculate_poisson_probabilities(1.8, 1.2), iterations
+    )
+
+    fixtures = [("Home", "Away", h, a) for h, a in inputs[:200]]
+    results["engine.predict_many[200]"] = measure(lambda: engine.predict_many(fixtures), max(iterations // 20, 5))
+
+    signals = NewsSignalEngine()
+    base_probs = {"home": 0.45, "draw": 0.27, "away": 0.28}
+    news = [
+        {"category": category, "impact": rng.uniform(-1, 1), "sr": 0.9, "ss": 0.8, "pi": 0.7, "tr": 0.9}
+        for category in list(signals.CATEGORIES) * 4
+    ]
+    results["signals.apply_signal_shift[24 items]"] = measure(
+        lambda: signals.apply_signal_shift(base_probs, news), iterations
+    )
+    slate_columns = signals.encode_news([news] * 200)
+    slate_probs = [[base_probs[k] for k in ("home", "draw", "away")]] * 200
+    results["signals.apply_signal_shift_batch[200x24 items]"] = measure(
+        lambda: signals.apply_signal_shift_batch(slate_probs, **slate_columns), max(iterations // 20, 5)
+    )
+    return results
+
+def seed_users(database, count):
+    expiry = datetime.now() + timedelta(days=30)
+    conn = database.get_db_connection()
+    with conn:
+        conn.executemany(
+            'INSERT INTO users (telegram_id, username, is_verified, is_subscribed, expiry_date, expiry_ts, first_seen) '
+            'VALUES (?, ?, 1, 1, ?, ?, ?)',
+            [(user_id, f"user{user_id}", expiry.isoformat(), int(expiry.timestamp()), datetime.now().isoformat())
+             for user_id in range(1, count + 1)]
+        )
+
+def seed_fixtures(database, count):
+    """Today's slate, materialized, so the Today's Analysis handler has real work to do."""
+    kickoff = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    conn = database.get_db_connection()
+    with conn:
+        conn.executemany(
+            'INSERT INTO fixtures (id, competition_id, utc_date, status, home_team, away_team) '
+            'VALUES (?, 1, ?, ?, ?, ?)',
+            [(i, kickoff, "TIMED", f"Home {i}", f"Away {i}") for i in range(1, count + 1)]
+        )
+
+    from engine import EaglensEngine
+    from predictions import PredictionMaterializer
+    from signals import NewsSignalEngine
+    PredictionMaterializer(EaglensEngine(), NewsSignalEngine()).refresh()
+
+def bench_database(iterations):
+    import database
+
+    results = {}
+    user_ids = iter(range(10**9))
+    results["database.check_user_access[uncached]"] = measure(
+        lambda: (database.clear_access_cache(), database.check_user_access(next(user_ids) % 1000 + 1)), iterations
+    )
+    results["database.check_user_access[cached]"] = measure(lambda: database.check_user_access(1), iterations)
+    results["database.log_visitor"] = measure(
+        lambda: database.log_visitor(next(user_ids) % 1000 + 1, "visitor"), iterations
+    )
+    return results
+
+def make_update(bot, update_id, user_id, text):
+    """Build a real telegram.Update for a private text message."""
+    from telegram import Update
+    return Update.de_json({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Load", "username": f"user{user_id}"},
+            "text": text
+        }
+    }, bot)
+
+def make_load_test_bot():
+    """A Bot whose outgoing calls are swallowed so handlers run without network."""
+    from telegram import Bot
+
+    class LoadTestBot(Bot):
+        async def send_message(self, *args, **kwargs):
+            return None
+
+    return LoadTestBot("123456:load-test")
+
+async def bench_handlers(iterations, concurrency):
+    import bot as eaglens_bot
+
+    eaglens_bot.get_engine()
+    load_bot = make_load_test_bot()
+    texts = ['📅 Today\'s Analysis', '🔍 Search Match', '📈 System Status', 'ℹ️ About Eaglens']
+
+    async def handle(i):
+        update = make_update(load_bot, i, i % 1000 + 1, texts[i % len(texts)])
+        context = SimpleNamespace(user_data={}, args=[], bot=load_bot, application=None)
+        await eaglens_bot.handle_invite(update, context)
+
+    return {
+        f"bot.handle_invite[concurrency={concurrency}]": await measure_concurrent(handle, iterations, concurrency)
+    }
+
+def run_suite(iterations=500, concurrency=50):
+    """Run every benchmark against a throwaway database and return the results."""
+    import database
+
+    results = bench_engine(iterations)
+    original_path = database.DB_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "bench.db")
+        try:
+            database.init_db()
+            seed_users(database, 1000)
+            seed_fixtures(database, 10)
+            database.clear_access_cache()
+            results.update(bench_database(iterations))
+            results.update(asyncio.run(bench_handlers(iterations, concurrency)))
+        finally:
+            database.close_db_connections()
+            database.clear_access_cache()
+            database.DB_PATH = original_path
+    return results
+
+def compare(results, baseline, tolerance):
+    """Return human-readable regressions where p50 latency grew or throughput fell beyond tolerance."""
+    regressions = []
+    for name, base in baseline.items():
+        current = results.get(name)
+        if current is None:
+            continue
+        if current["p50_us"] > base["p50_us"] * (1 + tolerance):
+            regressions.append(f"{name}: p50 {base['p50_us']:.1f}us -> {current['p50_us']:.1f}us")
+        if current["ops_per_sec"] < base["ops_per_sec"] * (1 - tolerance):
+            regressions.append(f"{name}: {base['ops_per_sec']:.0f} -> {current['ops_per_sec']:.0f} ops/s")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Eaglens micro-benchmarks and handler load test")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed fractional regression")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.iterations, args.concurrency)
+    print(f"{'benchmark':<52} {'p50 us':>10} {'p99 us':>10} {'ops/s':>10}")
+    for name, stats in results.items():
+        print(f"{name:<52} {stats['p50_us']:>10.1f} {stats['p99_us']:>10.1f} {stats['ops_per_sec']:>10.0f}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found; run with --save-baseline to record one.")
+        return 0
+
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,31 @@
+import startup
+import asyncio
+import io
+import json
 import logging
-from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes, MessageHandler, filters, CallbackQueryHandler
-from config import TELEGRAM_TOKEN, TRIAL_PRICE, QUARTERLY_PRICE, MONTHLY_PRICE, OWNER_USERNAME, OWNER_ID
-from engine import EaglensEngine
-from database import check_user_access, verify_invite_code, init_db, log_visitor, get_all_users
-from payments import PaymentManager
-from invites import generate_invite_code, notify_owner_of_new_code
+import threading
+import time
+from datetime import datetime, timezone
+with startup.phase("import telegram"):
+    from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup, InputFile
+    from telegram.error import Forbidden, BadRequest, TelegramError
+    from telegram.ext import (
+        ApplicationBuilder, CommandHandler, ContextTypes, MessageHandler, filters, CallbackQueryHandler, TypeHandler
+    )
+with startup.phase("import local modules"):
+    from config import TELEGRAM_TOKEN, RUN_MODE, TRIAL_PRICE, QUARTERLY_PRICE, MONTHLY_PRICE, OWNER_USERNAME
+    from config import FIXTURE_REFRESH_INTERVAL, PREDICTION_REFRESH_INTERVAL, NEWS_SOURCES, WORKER_PROCESSES
+    from config import EXPIRY_SWEEP_INTERVAL, INVITE_BULK_MAX, SEARCH_INDEX_TTL
+    from async_database import check_user_access, verify_invite_code, init_db, log_visitor, run_db, set_setting
+    import async_database
+    import database
+    from payments import PaymentManager
+    from invites import generate_invite_code, generate_invite_codes, notify_owner_of_new_code
+    from broadcast import start_broadcast, resume_broadcasts, get_rate_limiter
+    from database import sweep_subscriptions, get_pending_reminders, record_reminder_results
+    from fixtures import FootballDataClient, refresh_fixtures, backfill_seasons, history_seasons
+    from predictions import get_predictions_for_date, get_prediction
+    from search import SearchIndex
 
 # Configure logging
 logging.basicConfig(
@@ -13,7 +33,47 @@ logging.basicConfig(
     level=logging.INFO
 )
 
-engine = EaglensEngine()
+# The engine pulls in numpy, so it is loaded by a warm-up task after polling starts
+engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    """Return the shared engine, importing and building it on first use."""
+    global engine
+    if engine is None:
+        with _engine_lock:
+            if engine is None:
+                with startup.phase("import engine + build EaglensEngine"):
+                    from engine import EaglensEngine
+                    engine = EaglensEngine()
+    return engine
+
+def build_news_engine():
+    from signals import NewsSignalEngine
+    return NewsSignalEngine()
+
+def build_materializer():
+    """PredictionMaterializer over the shared engine; call off the event loop, it imports numpy and scipy."""
+    from predictions import PredictionMaterializer
+    return PredictionMaterializer(get_engine(), build_news_engine())
+
+async def get_materializer(bot_data):
+    """The application's one PredictionMaterializer, built on first use; its lock serializes every writer."""
+    if 'materializer' not in bot_data:
+        materializer = await run_db(build_materializer)
+        bot_data.setdefault('materializer', materializer)
+    return bot_data['materializer']
+
+def load_system_status():
+    """(calibration metrics, engine cache counters) as last persisted, so every worker process reports the same."""
+    from calibration import load_metrics
+    cache = database.get_setting("engine_cache_stats")
+    return load_metrics(), json.loads(cache) if cache else None
+
+async def warm_up_engine():
+    """Load the engine off the event loop so polling is not delayed by heavy imports."""
+    await asyncio.to_thread(get_engine)
+    startup.log_report("Engine warm-up report")
 
 DISCLAIMER_TEXT = (
     "🦅 *Welcome to Eaglens: Your Probabilistic Decision-Support System*\n\n"
@@ -27,20 +87,45 @@ DISCLAIMER_TEXT = (
     "⚠️ *Access Restricted*: Eaglens is **Invite-Only**."
 )
 
+def format_prediction(prediction):
+    """Render a single engine prediction as a Markdown message."""
+    if prediction['status'] != 'success':
+        return f"🦅 *Prediction Suppressed*\n\n{prediction['reason']}"
+    return f"🦅 *Match Analysis: {prediction['home_team']} vs {prediction['away_team']}*\n\n" \
+           f"🏠 Home: {prediction['probabilities']['home']:.1%}\n" \
+           f"🤝 Draw: {prediction['probabilities']['draw']:.1%}\n" \
+           f"🚀 Away: {prediction['probabilities']['away']:.1%}\n\n" \
+           f"{format_markets(prediction.get('markets'))}" \
+           f"**Confidence: {prediction['confidence']}/100** ({prediction['confidence_label']})"
+
+def format_markets(markets):
+    """Headline derived markets; predictions stored before markets existed render without them."""
+    if not markets:
+        return ""
+    score, score_prob = markets['correct_scores'][0]
+    return f"⚽ Over 2.5: {markets['totals']['2.5']['over']:.1%} · BTTS: {markets['btts']['yes']:.1%}\n" \
+           f"🛡️ Double Chance 1X: {markets['double_chance']['1X']:.1%} · X2: {markets['double_chance']['X2']:.1%}\n" \
+           f"🎯 Likely Score: {score} ({score_prob:.1%})\n\n"
+
+async def reply_predictions(update, predictions, chunk_size=15):
+    """Send predictions, splitting long slates to stay under Telegram's message size limit."""
+    for i in range(0, len(predictions), chunk_size):
+        msg = "\n\n".join(format_prediction(prediction) for prediction in predictions[i:i + chunk_size])
+        await update.message.reply_text(msg, parse_mode='Markdown')
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /start command and check access."""
     user_id = update.effective_user.id
     username = update.effective_user.username
     
     # Log visitor
-    log_visitor(user_id, username)
+    await log_visitor(user_id, username)
 
-    # Update OWNER_ID if the owner interacts
+    # Record the owner's chat id in shared settings so every worker can reach them
     if username and f"@{username}" == OWNER_USERNAME:
-        global OWNER_ID
-        OWNER_ID = user_id
+        await set_setting("owner_id", user_id)
 
-    has_access, status = check_user_access(user_id)
+    has_access, status = await check_user_access(user_id)
     
     # If user is already verified but not subscribed, skip invite and go to payment
     if status in ["not_subscribed", "expired"]:
@@ -88,7 +173,7 @@ async def handle_invite(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
     # Check if user is already verified in DB
-    _, status = check_user_access(user_id)
+    _, status = await check_user_access(user_id)
     if status != "not_verified" and status != "not_registered":
         context.user_data['awaiting_invite'] = False
         return await handle_menu(update, context)
@@ -98,7 +183,7 @@ async def handle_invite(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     code = update.message.text.strip()
     
-    if verify_invite_code(user_id, code):
+    if await verify_invite_code(user_id, code):
         context.user_data['awaiting_invite'] = False
         await update.message.reply_text(
             "✅ *Invite Verified!*\n\nWelcome to the elite circle. Now, choose your entry plan to start receiving predictions:",
@@ -124,7 +209,7 @@ async def handle_payment_callback(update: Update, context: ContextTypes.DEFAULT_
     user_id = query.from_user.id
     email = f"user_{user_id}@eaglens.bot"
     
-    res = PaymentManager.initialize_transaction(email, amount, {"user_id": user_id, "plan": plan})
+    res = await PaymentManager.initialize_transaction(email, amount, {"user_id": user_id, "plan": plan})
     
     if res.get('status'):
         auth_url = res['data']['link']
@@ -151,35 +236,48 @@ async def verify_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return await update.message.reply_text("Usage: `/verify [transaction_id]`\n\nYou can find your Transaction ID on the payment success page.")
 
     transaction_id = context.args[0]
-    res = PaymentManager.verify_transaction(transaction_id)
-    
-    if res.get('status') == 'success' and res['data']['status'] == 'successful':
-        user_id = update.effective_user.id
-        plan = res['data']['meta']['plan']
-        expiry = PaymentManager.activate_subscription(user_id, plan)
-        
+    # Same idempotent path as the Flutterwave webhook, so a transaction is only ever redeemed once
+    res = await PaymentManager.settle_payment(transaction_id, update.effective_user.id)
+
+    if res['status'] == 'activated':
         await update.message.reply_text(
-            f"🎉 *Payment Successful!*\n\nYour Eaglens access is now **Active** until {expiry[:10]}.\n"
+            f"🎉 *Payment Successful!*\n\nYour Eaglens access is now **Active** until {res['expiry'][:10]}.\n"
             "Use /start to open the main menu and start raining dollars! 💰",
             parse_mode='Markdown'
         )
+    elif res['status'] == 'already_processed':
+        await update.message.reply_text("✅ This payment has already been applied to your account. Use /start to open the main menu.")
+    elif res['status'] == 'wrong_user':
+        await update.message.reply_text("❌ This transaction was not made from your account.")
     else:
         await update.message.reply_text("❌ Payment verification failed. Please ensure you entered the correct Transaction ID.")
 
 async def generate_code_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Owner command to generate a new multi-use invite code."""
+    """Owner command to generate invite codes: `/gen_code [max_uses] [count]`."""
     user_id = update.effective_user.id
     username = update.effective_user.username
     
     if username and f"@{username}" == OWNER_USERNAME:
         max_uses = 100
+        count = 1
         if context.args:
             try:
                 max_uses = int(context.args[0])
+                if len(context.args) > 1:
+                    count = min(max(int(context.args[1]), 1), INVITE_BULK_MAX)
             except ValueError:
                 pass
-        
-        code = generate_invite_code(max_uses=max_uses)
+
+        if count > 1:
+            # Bulk mode: every code is created in one transaction and delivered as a file
+            codes = await run_db(generate_invite_codes, count, max_uses=max_uses)
+            await update.message.reply_document(
+                document=InputFile(io.BytesIO("\n".join(codes).encode()), filename=f"invite_codes_{len(codes)}.txt"),
+                caption=f"✅ Generated {len(codes)} codes with {max_uses} uses each."
+            )
+            return
+
+        code = await run_db(generate_invite_code, max_uses=max_uses)
         await update.message.reply_text(f"✅ Generated code: `{code}` with {max_uses} uses.", parse_mode='Markdown')
         await notify_owner_of_new_code(context, code, max_uses)
     else:
@@ -195,40 +293,40 @@ async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return await update.message.reply_text("Usage: `/broadcast Your message here`", parse_mode='Markdown')
 
     message = " ".join(context.args)
-    users = get_all_users()
-    count = 0
-    
-    await update.message.reply_text(f"🚀 Starting broadcast to {len(users)} users...")
-    
-    for user_id in users:
-        try:
-            await context.bot.send_message(chat_id=user_id, text=f"📢 *Eaglens Broadcast*\n\n{message}", parse_mode='Markdown')
-            count += 1
-        except Exception as e:
-            logging.error(f"Failed to send broadcast to {user_id}: {e}")
-    
-    await update.message.reply_text(f"✅ Broadcast complete. Sent to {count}/{len(users)} users.")
+    broadcast_id = await start_broadcast(context.application, message, update.effective_chat.id)
+    await update.message.reply_text(
+        f"🚀 Broadcast #{broadcast_id} started in the background. You will receive progress reports here."
+    )
 
 async def handle_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle main menu interactions with access check."""
     user_id = update.effective_user.id
-    has_access, _ = check_user_access(user_id)
+    has_access, _ = await check_user_access(user_id)
     
     if not has_access:
         return await start(update, context)
 
     text = update.message.text
-    if text in ['🔍 Search Match', '📅 Today\'s Analysis']:
-        prediction = engine.predict("Arsenal", "Chelsea", 1.8, 1.2)
-        msg = f"🦅 *Match Analysis: {prediction['home_team']} vs {prediction['away_team']}*\n\n" \
-              f"🏠 Home: {prediction['probabilities']['home']:.1%}\n" \
-              f"🤝 Draw: {prediction['probabilities']['draw']:.1%}\n" \
-              f"🚀 Away: {prediction['probabilities']['away']:.1%}\n\n" \
-              f"**Confidence: {prediction['confidence']}/100** ({prediction['confidence_label']})"
-        await update.message.reply_text(msg, parse_mode='Markdown')
+    if text == '🔍 Search Match':
+        context.user_data['awaiting_search'] = True
+        await update.message.reply_text("🔍 Type a team or fixture to search, e.g. `arsenal` or `man utd vs spurs`.",
+                                        parse_mode='Markdown')
+    elif text == '📅 Today\'s Analysis':
+        # A single indexed read of predictions materialized by the background job
+        predictions = await run_db(get_predictions_for_date, datetime.now(timezone.utc).date())
+        if not predictions:
+            return await update.message.reply_text("🦅 No fixtures scheduled for analysis today.")
+        await reply_predictions(update, predictions)
     elif text == '📈 System Status':
-        metrics = engine.calibration_metrics
-        status_msg = f"🦅 *System Health*\n\n✅ Calibration: {metrics['brier_score']:.3f}\n✅ Stability: {metrics['data_drift_psi']:.2f}"
+        # Live metrics belong to the process running the prediction job; read what it last persisted
+        metrics, cache = await run_db(load_system_status)
+        status_msg = "🦅 *System Health*\n\n"
+        if metrics is None:
+            status_msg += "⏳ Calibration: awaiting the first settled results\n"
+        else:
+            status_msg += f"✅ Calibration: {metrics['brier_score']:.3f}\n✅ Stability: {metrics['data_drift_psi']:.2f}\n"
+        if cache is not None:
+            status_msg += f"⚡ Cache: {cache['hits']} hits / {cache['misses']} misses ({cache['hit_rate']:.0%}, {cache['size']}/{cache['max_size']} entries)"
         await update.message.reply_text(status_msg, parse_mode='Markdown')
     elif text == 'ℹ️ About Eaglens':
         await update.message.reply_text(
@@ -236,18 +334,175 @@ async def handle_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "We provide well-guided predictions that **rain dollars**. Let Eaglens guide your path to profitability!",
             parse_mode='Markdown'
         )
+    elif context.user_data.pop('awaiting_search', False):
+        await reply_search_results(update, context, text)
+
+async def get_search_index(context):
+    """This process's search index, re-synced with the fixture store at most every SEARCH_INDEX_TTL seconds."""
+    index = context.bot_data.get('search_index')
+    if index is None:
+        index = context.bot_data['search_index'] = SearchIndex()
+    if time.monotonic() - index.refreshed_at > SEARCH_INDEX_TTL:
+        index.refreshed_at = time.monotonic()  # one re-sync at a time; others keep searching the current index
+        # Rows are read on a DB thread, the diff is applied here so searches never see a half-updated index
+        index.refresh(await run_db(SearchIndex.load_rows))
+    return index
+
+async def reply_search_results(update, context, query):
+    """Offer the fixtures matching a free-text query as inline buttons."""
+    index = await get_search_index(context)
+    results = index.search(query)
+    if not results:
+        return await update.message.reply_text("🦅 No upcoming fixtures match that search. Try another team name.")
+    keyboard = [[InlineKeyboardButton(f"{home} vs {away} · {utc_date[5:10]} {utc_date[11:16]}",
+                                      callback_data=f"match_{fixture_id}")]
+                for fixture_id, home, away, utc_date in results]
+    await update.message.reply_text("🔍 *Select a fixture:*", reply_markup=InlineKeyboardMarkup(keyboard),
+                                    parse_mode='Markdown')
+
+async def handle_match_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show the stored prediction for a fixture picked from search results."""
+    query = update.callback_query
+    await query.answer()
+    has_access, _ = await check_user_access(query.from_user.id)
+    if not has_access:
+        return await query.edit_message_text("🔒 Your access is not active. Use /start to continue.")
+    prediction = await run_db(get_prediction, int(query.data.split('_', 1)[1]))
+    if prediction is None:
+        return await query.edit_message_text("🦅 Analysis for this fixture is not ready yet. Please check back shortly.")
+    await query.edit_message_text(format_prediction(prediction), parse_mode='Markdown')
 
 async def post_init(application):
     """Ensure database is ready and notify owner if possible."""
-    init_db()
+    with startup.phase("init_db"):
+        await init_db()
     logging.info("Eaglens Bot initialized and database ready.")
+    startup.log_report()
+    application.create_task(warm_up_engine())
+    await resume_broadcasts(application)
 
-if __name__ == '__main__':
-    application = ApplicationBuilder().token(TELEGRAM_TOKEN).post_init(post_init).build()
+    # Fixtures are refreshed in the background; handlers only ever read the local store
+    application.bot_data['football_data'] = FootballDataClient()
+    application.job_queue.run_repeating(refresh_fixtures_job, interval=FIXTURE_REFRESH_INTERVAL, first=5)
+    application.job_queue.run_repeating(refresh_predictions_job, interval=PREDICTION_REFRESH_INTERVAL, first=15)
+    application.job_queue.run_repeating(subscription_sweep_job, interval=EXPIRY_SWEEP_INTERVAL, first=30)
+    application.job_queue.run_once(backfill_history_job, 10)
+    if NEWS_SOURCES:
+        application.create_task(run_news_pipeline(application))
+
+async def refresh_fixtures_job(context: ContextTypes.DEFAULT_TYPE):
+    if await refresh_fixtures(context.bot_data['football_data']):
+        context.job_queue.run_once(refresh_predictions_job, 0)
+        if 'search_index' in context.bot_data:
+            context.bot_data['search_index'].refreshed_at = 0.0  # re-sync on the next search
+
+async def backfill_history_job(context: ContextTypes.DEFAULT_TYPE):
+    """Load past seasons' results once per start, so team strengths are fitted on more than the fixture window."""
+    if await backfill_seasons(context.bot_data['football_data'], history_seasons()):
+        context.job_queue.run_once(refresh_predictions_job, 0)
+
+async def refresh_predictions_job(context: ContextTypes.DEFAULT_TYPE):
+    """Recompute stored predictions when fixtures or calibration have changed."""
+    materializer = await get_materializer(context.bot_data)
+    await run_db(materializer.refresh)
+    await set_setting("engine_cache_stats", json.dumps(materializer.engine.cache_stats()))
+
+RENEWAL_REMINDERS = {
+    'expiring': "⏳ *Your Eaglens access ends on {date}.*\n\nRenew now to keep the predictions coming: /start",
+    'expired': "🦅 *Your Eaglens subscription has expired.*\n\nUse /start to choose a plan and reactivate your access.",
+}
+
+async def subscription_sweep_job(context: ContextTypes.DEFAULT_TYPE):
+    """Expire lapsed subscriptions in one set-based pass, then deliver queued renewal reminders."""
+    expired, queued = await run_db(sweep_subscriptions)
+    if expired or queued:
+        logging.info(f"Subscription sweep: {len(expired)} expired, {queued} reminders queued")
+
+    limiter = get_rate_limiter(context.application)
+    results = []
+    for telegram_id, expiry_ts, kind in await run_db(get_pending_reminders):
+        await limiter.acquire(telegram_id)
+        date = datetime.fromtimestamp(expiry_ts).strftime('%Y-%m-%d')
+        try:
+            await context.bot.send_message(
+                chat_id=telegram_id, text=RENEWAL_REMINDERS[kind].format(date=date), parse_mode='Markdown'
+            )
+            results.append((telegram_id, expiry_ts, kind, 'sent'))
+        except (Forbidden, BadRequest) as e:
+            logging.info(f"Cannot deliver renewal reminder to {telegram_id}: {e}")
+            results.append((telegram_id, expiry_ts, kind, 'failed'))
+        except TelegramError as e:
+            # Left pending; the next sweep retries it
+            logging.error(f"Failed to send renewal reminder to {telegram_id}: {e}")
+    await run_db(record_reminder_results, results)
+
+async def run_news_pipeline(application):
+    """Stream news from NEWS_SOURCES into stored predictions, touching only fixtures that get news."""
+    from news import NewsPipeline, NewsClassifier, ContentIndex, load_recent_hashes, sources_from_config
+    classifier = await asyncio.to_thread(NewsClassifier.load)
+    materializer = await get_materializer(application.bot_data)
+
+    async def on_update(fixture_ids):
+        # Through the materializer so a concurrent refresh cannot overwrite the shifted predictions
+        await run_db(materializer.apply_news_updates, fixture_ids)
+
+    pipeline = NewsPipeline(
+        sources_from_config(NEWS_SOURCES), classifier, on_update,
+        seen=ContentIndex(hashes=await run_db(load_recent_hashes))
+    )
+    await pipeline.run()
+
+async def post_shutdown(application):
+    """Close HTTP clients, drain pending database work and close pooled connections."""
+    await PaymentManager.close()
+    if 'football_data' in application.bot_data:
+        await application.bot_data['football_data'].close()
+    async_database.shutdown()
+
+def _builder(bot=None):
+    builder = ApplicationBuilder().post_init(post_init).post_shutdown(post_shutdown)
+    return builder.bot(bot) if bot is not None else builder.token(TELEGRAM_TOKEN)
+
+def build_application(bot=None, persistence=None):
+    """Application with every handler registered; `bot` replaces the real Bot (used by tests)."""
+    builder = _builder(bot)
+    if persistence is not None:
+        builder = builder.persistence(persistence)
+    application = builder.build()
     application.add_handler(CommandHandler('start', start))
     application.add_handler(CommandHandler('verify', verify_payment))
     application.add_handler(CommandHandler('gen_code', generate_code_command))
     application.add_handler(CommandHandler('broadcast', broadcast_command))
     application.add_handler(CallbackQueryHandler(handle_payment_callback, pattern='^pay_'))
+    application.add_handler(CallbackQueryHandler(handle_match_callback, pattern='^match_'))
     application.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), handle_invite))
-    application.run_polling()
+    return application
+
+def build_receiver_application(router, bot=None):
+    """Front application for multi-worker mode: runs the background jobs and hands every update to `router`."""
+    application = _builder(bot).build()
+    application.add_handler(TypeHandler(Update, router.dispatch))
+    application.bot_data['router'] = router
+    return application
+
+if __name__ == '__main__':
+    router = None
+    with startup.phase("build application"):
+        if WORKER_PROCESSES > 1:
+            from workers import UpdateRouter
+            router = UpdateRouter()
+            router.start()
+            application = build_receiver_application(router)
+        else:
+            from persistence import SQLitePersistence
+            database.init_db()  # persistence is loaded before post_init runs
+            application = build_application(persistence=SQLitePersistence())
+    try:
+        if RUN_MODE == "webhook":
+            from webhook import run_webhook
+            asyncio.run(run_webhook(application))
+        else:
+            application.run_polling()
+    finally:
+        if router is not None:
+            router.stop()
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from telegram.error import RetryAfter, Forbidden, BadRequest, TelegramError
+from async_database import run_db
+from database import (
+    create_broadcast, get_unfinished_broadcasts, get_pending_recipients,
+    record_broadcast_results, finish_broadcast
+)
+from config import (
+    BROADCAST_CONCURRENCY, BROADCAST_RATE, BROADCAST_PER_CHAT_INTERVAL, BROADCAST_MAX_ATTEMPTS,
+    BROADCAST_MAX_RATE_LIMITS, BROADCAST_FLUSH_SIZE, BROADCAST_REPORT_INTERVAL
+)
+
+BROADCAST_TEMPLATE = "📢 *Eaglens Broadcast*\n\n{message}"
+
+class RateLimiter:
+    """Token bucket for the global send rate plus a minimum spacing per chat.
+
+    Telegram's limit is per bot, so every sender in a process shares one limiter (see get_rate_limiter).
+    """
+
+    def __init__(self, rate=BROADCAST_RATE, per_chat_interval=BROADCAST_PER_CHAT_INTERVAL):
+        self.rate = rate
+        self.per_chat_interval = per_chat_interval
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.last_sent = {}
+
+    def pause(self, seconds):
+        """Hold every sender back after Telegram answers with RetryAfter."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, chat_id):
+        # Check-and-take has no await in between, so it is atomic on the event loop without a lock; sleeping
+        # unlocked means a chat waiting out its own spacing never holds back sends to other chats
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            wait = max(
+                self.paused_until - now,
+                self.last_sent.get(chat_id, 0.0) + self.per_chat_interval - now,
+                (1 - self.tokens) / self.rate
+            )
+            if wait <= 0:
+                self.tokens -= 1
+                self.last_sent[chat_id] = now
+                return
+            await asyncio.sleep(wait)
+
+def get_rate_limiter(application):
+    """The process-wide limiter shared by broadcasts and reminder sweeps, kept in bot_data."""
+    limiter = application.bot_data.get('rate_limiter')
+    if limiter is None:
+        limiter = application.bot_data['rate_limiter'] = RateLimiter()
+    return limiter
+
+class BroadcastJob:
+    """Deliver one persisted broadcast with bounded concurrency, resuming from pending recipients."""
+
+    def __init__(self, bot, broadcast_id, message, owner_chat_id, limiter=None,
+                 concurrency=BROADCAST_CONCURRENCY, report_interval=BROADCAST_REPORT_INTERVAL):
+        self.bot = bot
+        self.broadcast_id = broadcast_id
+        self.text = BROADCAST_TEMPLATE.format(message=message)
+        self.owner_chat_id = owner_chat_id
+        self.limiter = limiter or RateLimiter()
+        self.concurrency = concurrency
+        self.report_interval = report_interval
+        self.sent = 0
+        self.failed = 0
+        self._results = []
+
+    async def send(self, chat_id):
+        """Send to one chat, honouring RetryAfter; returns the final delivery status.
+
+        A RetryAfter is Telegram throttling the bot, not a fault with this chat, so waiting it out draws on its own
+        BROADCAST_MAX_RATE_LIMITS budget rather than on BROADCAST_MAX_ATTEMPTS.
+        """
+        attempt = rate_limits = 0
+        while attempt < BROADCAST_MAX_ATTEMPTS:
+            await self.limiter.acquire(chat_id)
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=self.text, parse_mode='Markdown')
+                return 'sent'
+            except RetryAfter as e:
+                rate_limits += 1
+                if rate_limits > BROADCAST_MAX_RATE_LIMITS:
+                    logging.error(f"Broadcast {self.broadcast_id} gave up on {chat_id} after {rate_limits} rate limits")
+                    return 'failed'
+                retry_after = e.retry_after
+                if isinstance(retry_after, timedelta):
+                    retry_after = retry_after.total_seconds()
+                logging.warning(f"Broadcast {self.broadcast_id} rate limited, pausing {retry_after}s")
+                self.limiter.pause(retry_after)
+            except (Forbidden, BadRequest) as e:
+                logging.info(f"Broadcast {self.broadcast_id} cannot reach {chat_id}: {e}")
+                return 'failed'
+            except TelegramError as e:
+                attempt += 1
+                logging.error(f"Failed to send broadcast to {chat_id} (attempt {attempt}): {e}")
+                await asyncio.sleep(attempt)
+        return 'failed'
+
+    async def flush(self):
+        if self._results:
+            results, self._results = self._results, []
+            await run_db(record_broadcast_results, self.broadcast_id, results)
+
+    async def worker(self, queue):
+        while True:
+            chat_id = await queue.get()
+            try:
+                try:
+                    status = await self.send(chat_id)
+                except Exception as e:
+                    # A dead worker would leave queue.join() waiting forever; record the chat and keep draining
+                    logging.exception(f"Broadcast {self.broadcast_id} failed for {chat_id}: {e}")
+                    status = 'failed'
+                if status == 'sent':
+                    self.sent += 1
+                else:
+                    self.failed += 1
+                self._results.append((chat_id, status))
+                if len(self._results) >= BROADCAST_FLUSH_SIZE:
+                    await self.flush()
+            except Exception as e:
+                logging.exception(f"Broadcast {self.broadcast_id} could not record results: {e}")
+            finally:
+                queue.task_done()
+
+    async def report(self, total, started):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            await self.notify_owner(total, started, final=False)
+
+    async def notify_owner(self, total, started, final):
+        done = self.sent + self.failed
+        rate = done / max(time.monotonic() - started, 1e-9)
+        title = "✅ Broadcast complete" if final else "📊 Broadcast progress"
+        try:
+            await self.bot.send_message(
+                chat_id=self.owner_chat_id,
+                text=f"{title} (#{self.broadcast_id}): {done}/{total} processed, "
+                     f"{self.sent} sent, {self.failed} failed ({rate:.1f} msg/s)."
+            )
+        except TelegramError as e:
+            logging.error(f"Failed to report broadcast progress: {e}")
+
+    async def run(self):
+        pending = await run_db(get_pending_recipients, self.broadcast_id)
+        total = len(pending)
+        started = time.monotonic()
+        logging.info(f"Broadcast {self.broadcast_id}: {total} recipients pending")
+
+        queue = asyncio.Queue()
+        for chat_id in pending:
+            queue.put_nowait(chat_id)
+
+        workers = [asyncio.create_task(self.worker(queue)) for _ in range(min(self.concurrency, total))]
+        reporter = asyncio.create_task(self.report(total, started))
+        try:
+            await queue.join()
+        finally:
+            # Whatever was delivered before a shutdown is persisted so a restart resumes after it
+            reporter.cancel()
+            for task in workers:
+                task.cancel()
+            await self.flush()
+
+        await run_db(finish_broadcast, self.broadcast_id)
+        await self.notify_owner(total, started, final=True)
+        return self.sent, self.failed
+
+async def start_broadcast(application, message, owner_chat_id):
+    """Persist a new broadcast and deliver it in the background; returns its id."""
+    broadcast_id = await run_db(create_broadcast, message, owner_chat_id)
+    application.create_task(BroadcastJob(application.bot, broadcast_id, message, owner_chat_id,
+                                         limiter=get_rate_limiter(application)).run())
+    return broadcast_id
+
+async def resume_broadcasts(application):
+    """Restart any broadcast interrupted by a process restart."""
+    for broadcast_id, message, owner_chat_id in await run_db(get_unfinished_broadcasts):
+        logging.info(f"Resuming broadcast {broadcast_id}")
+        application.create_task(BroadcastJob(application.bot, broadcast_id, message, owner_chat_id,
+                                             limiter=get_rate_limiter(application)).run())
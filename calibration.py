@@ -0,0 +1,194 @@
+import json
+import numpy as np
+from datetime import datetime
+from database import get_db_connection
+from config import (
+    CALIBRATION_WINDOW, CALIBRATION_SHORT_WINDOW, CALIBRATION_PSI_EDGES, CALIBRATION_PSI_EPSILON
+)
+
+ALL_LEAGUES = "__all__"
+OUTCOMES = ("home", "draw", "away")
+
+class RingBuffer:
+    """Fixed-size window of floats with running sum and sum of squares."""
+
+    def __init__(self, size, values=None):
+        self.size = size
+        self.values = np.zeros(size)
+        self.count = 0
+        self.head = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        for value in values or []:
+            self.push(value)
+
+    def push(self, value):
+        """Add a value; returns the value evicted from the window, or None."""
+        evicted = None
+        if self.count == self.size:
+            evicted = self.values[self.head]
+            self.total -= evicted
+            self.total_sq -= evicted * evicted
+        else:
+            self.count += 1
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.size
+        self.total += value
+        self.total_sq += value * value
+        return evicted
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def variance(self):
+        if self.count < 2:
+            return 0.0
+        mean = self.mean()
+        return max(0.0, self.total_sq / self.count - mean * mean)
+
+    def ordered(self):
+        """Window contents oldest first (for persistence)."""
+        if self.count < self.size:
+            return self.values[:self.count].tolist()
+        return np.roll(self.values, -self.head).tolist()
+
+class LeagueCalibration:
+    """Rolling Brier, drift, PSI and volatility for one league, each updated in O(1) per result."""
+
+    def __init__(self, window=CALIBRATION_WINDOW, short_window=CALIBRATION_SHORT_WINDOW, edges=CALIBRATION_PSI_EDGES):
+        self.edges = np.asarray(edges)
+        self.brier = RingBuffer(window)
+        self.recent_brier = RingBuffer(short_window)
+        self.goals = RingBuffer(window)
+        self.inputs = RingBuffer(window)
+        # Predicted home-win probability against realised home wins, for the home_advantage assumption
+        self.predicted_home = RingBuffer(window)
+        self.home_wins = RingBuffer(window)
+        # PSI compares the current window's input histogram against the first full window seen
+        self.reference_counts = np.zeros(len(edges) + 1)
+        self.current_counts = np.zeros(len(edges) + 1)
+        self.settled = 0
+
+    def _bin(self, value):
+        return int(np.searchsorted(self.edges, value, side="right"))
+
+    def update(self, probabilities, outcome, exp_goals_total, goals_total):
+        """Fold one settled match into the rolling metrics."""
+        brier = sum((probabilities[k] - (k == outcome)) ** 2 for k in OUTCOMES) / len(OUTCOMES)
+        self.brier.push(brier)
+        self.recent_brier.push(brier)
+        self.goals.push(goals_total)
+        self.predicted_home.push(probabilities["home"])
+        self.home_wins.push(float(outcome == "home"))
+
+        evicted = self.inputs.push(exp_goals_total)
+        if evicted is not None:
+            self.current_counts[self._bin(evicted)] -= 1
+        self.current_counts[self._bin(exp_goals_total)] += 1
+        if self.settled < self.inputs.size:
+            self.reference_counts[self._bin(exp_goals_total)] += 1
+        self.settled += 1
+
+    def psi(self):
+        if self.settled <= self.inputs.size:
+            return 0.0
+        ref = self.reference_counts / self.reference_counts.sum() + CALIBRATION_PSI_EPSILON
+        cur = self.current_counts / self.current_counts.sum() + CALIBRATION_PSI_EPSILON
+        return float(np.sum((cur - ref) * np.log(cur / ref)))
+
+    def metrics(self):
+        """Metrics in the shape EaglensEngine.check_gates/compute_confidence expect."""
+        goals_mean = self.goals.mean()
+        return {
+            "brier_score": self.brier.mean(),
+            "performance_drift": max(0.0, self.recent_brier.mean() - self.brier.mean()),
+            "data_drift_psi": self.psi(),
+            # Dispersion index of total goals: 1.0 is Poisson-like, higher is more chaotic
+            "league_volatility": self.goals.variance() / goals_mean if goals_mean else 1.0,
+            "home_bias": abs(self.predicted_home.mean() - self.home_wins.mean()),
+            "sample_size": self.brier.count
+        }
+
+    def to_state(self):
+        return {
+            "brier": self.brier.ordered(),
+            "recent_brier": self.recent_brier.ordered(),
+            "goals": self.goals.ordered(),
+            "inputs": self.inputs.ordered(),
+            "predicted_home": self.predicted_home.ordered(),
+            "home_wins": self.home_wins.ordered(),
+            "reference_counts": self.reference_counts.tolist(),
+            "settled": self.settled
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        league = cls()
+        league.brier = RingBuffer(league.brier.size, state["brier"])
+        league.recent_brier = RingBuffer(league.recent_brier.size, state["recent_brier"])
+        league.goals = RingBuffer(league.goals.size, state["goals"])
+        league.inputs = RingBuffer(league.inputs.size, state["inputs"])
+        league.predicted_home = RingBuffer(league.predicted_home.size, state.get("predicted_home"))
+        league.home_wins = RingBuffer(league.home_wins.size, state.get("home_wins"))
+        for value in league.inputs.ordered():
+            league.current_counts[league._bin(value)] += 1
+        league.reference_counts = np.asarray(state["reference_counts"], dtype=float)
+        league.settled = state["settled"]
+        return league
+
+class CalibrationTracker:
+    """Per-league streaming calibration metrics plus an all-leagues aggregate, persisted to SQLite."""
+
+    def __init__(self):
+        self.leagues = {}
+
+    def settle(self, league, probabilities, home_goals, away_goals, exp_goals_total):
+        """Record a settled prediction for `league` and the aggregate; returns the league's new metrics."""
+        if home_goals > away_goals:
+            outcome = "home"
+        elif home_goals == away_goals:
+            outcome = "draw"
+        else:
+            outcome = "away"
+        for key in (league, ALL_LEAGUES):
+            if key not in self.leagues:
+                self.leagues[key] = LeagueCalibration()
+            self.leagues[key].update(probabilities, outcome, exp_goals_total, home_goals + away_goals)
+        return self.metrics(league)
+
+    def metrics(self, league=ALL_LEAGUES):
+        calibration = self.leagues.get(league)
+        return calibration.metrics() if calibration else None
+
+    def league_metrics(self):
+        return {league: c.metrics() for league, c in self.leagues.items() if league != ALL_LEAGUES}
+
+    def save(self, leagues=None, settled=()):
+        """Persist league state, and mark the (fixture_id, league) pairs it now includes, in one transaction."""
+        conn = get_db_connection()
+        updated_at = datetime.now().isoformat()
+        with conn:
+            conn.executemany(
+                'INSERT INTO calibration_state (league, state, updated_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(league) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at',
+                [(json.dumps(league), json.dumps(self.leagues[league].to_state()), updated_at)
+                 for league in (leagues or self.leagues)]
+            )
+            conn.executemany(
+                'INSERT OR IGNORE INTO calibration_settled (fixture_id, league, settled_at) VALUES (?, ?, ?)',
+                [(fixture_id, json.dumps(league), updated_at) for fixture_id, league in settled]
+            )
+
+    @classmethod
+    def load(cls):
+        tracker = cls()
+        conn = get_db_connection()
+        for league, state in conn.execute('SELECT league, state FROM calibration_state'):
+            tracker.leagues[json.loads(league)] = LeagueCalibration.from_state(json.loads(state))
+        return tracker
+
+def load_metrics(league=ALL_LEAGUES):
+    """Persisted metrics for one league, for processes that do not run the materializer; None before any result."""
+    conn = get_db_connection()
+    row = conn.execute('SELECT state FROM calibration_state WHERE league = ?', (json.dumps(league),)).fetchone()
+    return LeagueCalibration.from_state(json.loads(row[0])).metrics() if row else None
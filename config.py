@@ -1,10 +1,57 @@
+import math
 import os
+import secrets
 
 # Telegram Bot Token (to be provided by user)
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN", "8412034421:AAHsfCrH00KDe7iTKhyFXdmdPkoLA8SoY-g")
 
+# Runtime Mode: "polling" (getUpdates loop) or "webhook" (embedded HTTP server)
+RUN_MODE = os.getenv("RUN_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # Public base URL; Telegram posts to {WEBHOOK_URL}/telegram
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("PORT", "8443"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", secrets.token_urlsafe(32))  # Echoed by Telegram in a header
+
+# Update Workers: >1 runs handlers in that many processes, each owning a shard of users
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "1"))
+WORKER_QUEUE_SIZE = 1000  # Updates buffered per worker before the receiver waits
+PERSISTENCE_UPDATE_INTERVAL = 5  # Seconds between user_data/chat_data writes to SQLite
+
 # Football-Data.org API Key (to be provided by user)
 FOOTBALL_DATA_API_KEY = os.getenv("FOOTBALL_DATA_API_KEY", "b2d4e4fd5ed54f6b967fd6c40f2c6635")
+FOOTBALL_DATA_BASE_URL = os.getenv("FOOTBALL_DATA_BASE_URL", "https://api.football-data.org/v4")
+FOOTBALL_DATA_COMPETITIONS = os.getenv("FOOTBALL_DATA_COMPETITIONS", "PL,PD,BL1,SA,FL1,CL").split(",")
+FOOTBALL_DATA_REQUESTS_PER_MINUTE = 10  # Free tier quota
+FIXTURE_REFRESH_INTERVAL = 900  # Seconds between incremental fixture refreshes
+FIXTURE_WINDOW_DAYS = 7  # Days of results behind and fixtures ahead kept fresh
+HISTORY_SEASONS = int(os.getenv("HISTORY_SEASONS", "2"))  # Past seasons of results backfilled at startup
+
+# Prediction Materialization
+MODEL_VERSION = "poisson-v1"  # Key for stored predictions; bump when the model changes
+PREDICTION_HORIZON_DAYS = 7  # Days of upcoming fixtures kept predicted
+PREDICTION_REFRESH_INTERVAL = 60  # Seconds between change checks
+
+# News Ingestion
+NEWS_SOURCES = [s for s in os.getenv("NEWS_SOURCES", "").split(",") if s]  # JSON-lines files or RSS URLs
+NEWS_SOURCE_RELIABILITY = 0.8  # Default source reliability (SR) for ingested items
+NEWS_POLL_INTERVAL = 300  # Seconds between polls of each source
+NEWS_QUEUE_SIZE = 256  # Raw items buffered between sources and the classifier
+NEWS_BATCH_SIZE = 32  # Items classified per model call
+NEWS_BATCH_WAIT = 1.0  # Seconds to wait for a batch to fill before classifying a partial one
+NEWS_DEDUP_CAPACITY = 50000  # Content hashes remembered in memory
+NEWS_RESOLVER_TTL = 300  # Seconds before the team-to-fixture index is rebuilt
+
+# League-average expected goals, used as the prior and for teams without history
+DEFAULT_HOME_EXP_GOALS = 1.45
+DEFAULT_AWAY_EXP_GOALS = 1.15
+HOME_ADVANTAGE_LOG = math.log(DEFAULT_HOME_EXP_GOALS / DEFAULT_AWAY_EXP_GOALS)  # Scaled by the home_advantage weight
+
+# Team Strength Model
+STRENGTH_DECAY_PER_DAY = 0.0019  # Time-decay rate for historical results (half-life ~1 year)
+STRENGTH_RIDGE = 1.0  # L2 shrinkage of attack/defence towards league average
+STRENGTH_LEARNING_RATE = 0.05  # Step size for per-result online updates
+STRENGTH_REFIT_HOURS = 24  # Full warm-started refit interval; online updates in between
+STRENGTH_ONLINE_MAX_RESULTS = 50  # More new results than this at once (e.g. a season backfill) forces a full refit
 
 # Gating Thresholds
 BRIER_THRESHOLD = 0.23
@@ -13,18 +60,115 @@ DATA_DRIFT_PSI_SUPPRESS = 0.40
 LEAGUE_VOLATILITY_SUPPRESS = 1.50
 MIN_SAMPLE_SIZE = 5
 
+# Gate rules, checked in order: (metric, comparison, threshold, reason); reason may use {threshold}
+GATE_RULES = (
+    ("brier_score", ">", BRIER_THRESHOLD, "Calibration failure: Rolling Brier score exceeds threshold ({threshold})."),
+    ("performance_drift", ">", PERFORMANCE_DRIFT_SUPPRESS, "Performance degradation: Model accuracy has drifted significantly."),
+    ("data_drift_psi", ">", DATA_DRIFT_PSI_SUPPRESS, "Data drift detected: Input distribution has shifted beyond reliability."),
+    ("league_volatility", ">", LEAGUE_VOLATILITY_SUPPRESS, "Extreme volatility: League conditions are currently too unpredictable."),
+    ("sample_size", "<", MIN_SAMPLE_SIZE, "Insufficient data: Not enough historical matches for a reliable prediction."),
+)
+
+# Confidence rules: (metric, comparison, threshold, effect, amount); penalties are summed, then caps applied
+CONFIDENCE_BASE = 85
+CONFIDENCE_RULES = (
+    ("brier_score", ">", 0.20, "penalty", 15),
+    ("performance_drift", ">", 0.15, "penalty", 30),
+    ("data_drift_psi", ">", 0.25, "penalty", 20),
+    ("league_volatility", ">", 1.25, "cap", 40),
+    ("sample_size", "<", 10, "cap", 35),
+)
+
+# Assumption Registry: performance = (failing - metric) / (failing - healthy), clipped to [0, 1]
+ASSUMPTION_METRICS = {
+    "home_advantage": ("home_bias", 0.0, 0.10),
+    "recent_form": ("performance_drift", 0.0, PERFORMANCE_DRIFT_SUPPRESS),
+    "elo_predictive": ("brier_score", 0.18, BRIER_THRESHOLD),
+}
+ASSUMPTION_CONFIDENCE_PENALTY = {"recent_form": 20, "elo_predictive": 20}  # Confidence points lost at weight 0
+ASSUMPTION_MIN_SAMPLE = 30  # Settled results needed before assumptions are re-scored
+
+# Per-league threshold overrides: {competition_id: {metric: threshold}}
+LEAGUE_GATE_OVERRIDES = {}
+LEAGUE_CONFIDENCE_OVERRIDES = {}
+
 # Confidence Labels
 CONFIDENCE_HIGH = (70, 100)
 CONFIDENCE_MEDIUM = (45, 69)
 CONFIDENCE_LOW = (0, 44)
 
+# Rolling Calibration Metrics
+CALIBRATION_WINDOW = 200  # Settled matches in the rolling window per league
+CALIBRATION_SHORT_WINDOW = 30  # Recent matches compared against the window for performance drift
+CALIBRATION_PSI_EDGES = (1.5, 2.0, 2.25, 2.5, 2.75, 3.0, 3.25, 3.5, 4.0)  # Total expected-goals bins
+CALIBRATION_PSI_EPSILON = 1e-4  # Smoothing for empty PSI bins
+
+# Score Matrix Cache
+POISSON_CACHE_SIZE = 4096  # Max cached (home_exp_goals, away_exp_goals, max_goals) entries
+POISSON_CACHE_PRECISION = 2  # Decimal places expected goals are quantized to
+
+# Derived Markets (all read off the same score matrix)
+MARKET_TOTAL_LINES = (0.5, 1.5, 2.5, 3.5, 4.5)  # Over/under total-goals lines
+MARKET_HANDICAP_LINES = (-2.5, -1.5, -1.0, -0.5, 0.0, 0.5, 1.0, 1.5, 2.5)  # Asian handicap, from the home side
+MARKET_CORRECT_SCORES = 5  # Most likely scorelines returned
+
+# Poisson PMF Lookup Table
+PMF_GRID_MAX = 6.00  # Largest expected-goals value held in the table
+PMF_GRID_STEP = 0.01  # Lambda grid resolution (matches POISSON_CACHE_PRECISION)
+PMF_TABLE_MAX_GOALS = 10  # Goal counts precomputed per lambda
+PMF_TOLERANCE = 1e-12  # Max absolute deviation from scipy.stats.poisson.pmf
+
 # Database Path
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, "data", "eaglens.db")
+DB_CACHE_SIZE_KB = 16384  # SQLite page cache per connection
+DB_STATEMENT_CACHE_SIZE = 256  # Prepared statements kept per connection
+DB_BUSY_TIMEOUT = 5.0  # Seconds a writer waits on a locked database
+DB_EXECUTOR_WORKERS = 4  # Threads serving async database calls off the event loop
+ACCESS_CACHE_TTL = 300  # Seconds a user's access status is served from memory
+
+# Match Search
+SEARCH_RESULTS = 8  # Fixtures offered per search
+SEARCH_MIN_SIMILARITY = 0.4  # Trigram similarity a misspelt name needs to count as a match
+SEARCH_LOOKBACK_HOURS = 3  # Live fixtures that kicked off this recently stay searchable
+SEARCH_INDEX_TTL = 60  # Seconds before a worker re-syncs its index with the fixture store
+SEARCH_ALIASES = {
+    "man utd": "manchester united", "man united": "manchester united", "man city": "manchester city",
+    "spurs": "tottenham", "wolves": "wolverhampton", "villa": "aston villa", "forest": "nottingham forest",
+    "barca": "barcelona", "atleti": "atletico", "real": "real madrid", "bayern": "bayern munchen",
+    "gladbach": "monchengladbach", "bvb": "borussia dortmund", "psg": "paris saint germain",
+    "inter": "internazionale", "juve": "juventus",
+}
+
+# Invite Codes
+INVITE_BULK_MAX = 10000  # Most codes one /gen_code call may create
+
+# Subscription Expiry
+EXPIRY_SWEEP_INTERVAL = 3600  # Seconds between set-based sweeps of lapsed subscriptions
+RENEWAL_REMINDER_WINDOW = 3 * 86400  # Seconds before expiry that a renewal reminder is queued
+RENEWAL_REMINDER_BATCH = 500  # Queued reminders delivered per sweep
+
+# Broadcast Delivery
+BROADCAST_CONCURRENCY = 8  # Messages in flight at once
+BROADCAST_RATE = 25  # Global messages per second (Telegram allows ~30)
+BROADCAST_PER_CHAT_INTERVAL = 1.0  # Min seconds between messages to the same chat
+BROADCAST_MAX_ATTEMPTS = 3  # Tries per recipient on transient errors
+BROADCAST_MAX_RATE_LIMITS = 20  # RetryAfter pauses per recipient; these do not use up BROADCAST_MAX_ATTEMPTS
+BROADCAST_FLUSH_SIZE = 50  # Delivery results persisted per batch
+BROADCAST_REPORT_INTERVAL = 30  # Seconds between progress reports to the owner
 
 # Payment Configuration (Switching to Flutterwave)
 FLW_SECRET_KEY = os.getenv("FLW_SECRET_KEY")
 FLW_CLIENT_ID = os.getenv("FLW_CLIENT_ID")
+FLW_BASE_URL = os.getenv("FLW_BASE_URL", "https://api.flutterwave.com/v3")
+FLW_CONNECT_TIMEOUT = 5.0  # Seconds to establish a connection
+FLW_READ_TIMEOUT = 15.0  # Seconds to wait for a response
+FLW_MAX_RETRIES = 2  # Retries after the first attempt on 5xx/429/network errors
+FLW_RETRY_BACKOFF = 0.5  # Base seconds for jittered exponential backoff
+FLW_BREAKER_THRESHOLD = 5  # Consecutive failures before the circuit opens
+FLW_BREAKER_RESET = 60  # Seconds before a half-open probe is allowed
+FLW_POOL_SIZE = 10  # Keep-alive connections to Flutterwave
+FLW_WEBHOOK_HASH = os.getenv("FLW_WEBHOOK_HASH")  # Secret hash Flutterwave sends in the verif-hash header
 TRIAL_PRICE = 7.99
 QUARTERLY_PRICE = 19.99
 MONTHLY_PRICE = 349.00
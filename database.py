@@ -1,15 +1,64 @@
+import json
+import logging
 import sqlite3
-from datetime import datetime, timedelta
-from config import DB_PATH
+import threading
+import time
+from datetime import datetime
+from config import DB_PATH, DB_CACHE_SIZE_KB, DB_STATEMENT_CACHE_SIZE, DB_BUSY_TIMEOUT, ACCESS_CACHE_TTL, OWNER_ID
+from config import RENEWAL_REMINDER_WINDOW, RENEWAL_REMINDER_BATCH
 import os
 
+# One long-lived connection per (thread, database file), reused for every query
+_local = threading.local()
+_pool = {}
+_pool_lock = threading.Lock()
+# Bumped by close_db_connections(); a thread holding handles from an older generation drops them and reopens
+_generation = 0
+
+# telegram_id -> (is_verified, is_subscribed, expiry_ts, valid_until), times as epoch seconds
+_access_cache = {}
+_access_cache_lock = threading.Lock()
+
+def _open_connection(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # check_same_thread is off only so close_db_connections() can close other threads' handles;
+    # each connection is still used exclusively by the thread that opened it
+    conn = sqlite3.connect(
+        path,
+        timeout=DB_BUSY_TIMEOUT,
+        cached_statements=DB_STATEMENT_CACHE_SIZE,
+        check_same_thread=False
+    )
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA cache_size=-{DB_CACHE_SIZE_KB}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    return conn
+
 def get_db_connection():
-    # Check if we are in GitHub Actions and have a persistent DB URL (optional future-proofing)
-    # For now, we use the local SQLite file but ensure it's handled correctly
-    return sqlite3.connect(DB_PATH)
+    """Return this thread's pooled WAL connection, opening it on first use."""
+    conns = getattr(_local, "conns", None)
+    if conns is None or _local.generation != _generation:
+        conns = _local.conns = {}
+        _local.generation = _generation
+    conn = conns.get(DB_PATH)
+    if conn is None:
+        conn = conns[DB_PATH] = _open_connection(DB_PATH)
+        with _pool_lock:
+            _pool[(threading.get_ident(), DB_PATH)] = conn
+    return conn
+
+def close_db_connections():
+    """Close every pooled connection (shutdown and tests); any thread that queries again gets a fresh one."""
+    global _generation
+    with _pool_lock:
+        for conn in _pool.values():
+            conn.close()
+        _pool.clear()
+        _generation += 1
+    _local.__dict__.clear()
 
 def init_db():
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -47,100 +96,465 @@ def init_db():
             FOREIGN KEY(code) REFERENCES invite_codes(code)
         )
     ''')
+
+    # Broadcast jobs and their per-recipient delivery state (survives restarts)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            message TEXT,
+            owner_chat_id INTEGER,
+            status TEXT DEFAULT 'running',
+            created_at TEXT,
+            finished_at TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS broadcast_recipients (
+            broadcast_id INTEGER,
+            telegram_id INTEGER,
+            status TEXT DEFAULT 'pending',
+            PRIMARY KEY(broadcast_id, telegram_id),
+            FOREIGN KEY(broadcast_id) REFERENCES broadcasts(id)
+        )
+    ''')
+    
+
+    # Football-Data.org store: every bot read is served from these tables
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS competitions (
+            id INTEGER PRIMARY KEY,
+            code TEXT UNIQUE,
+            name TEXT,
+            area TEXT,
+            last_updated TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS teams (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            short_name TEXT,
+            tla TEXT,
+            last_updated TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS fixtures (
+            id INTEGER PRIMARY KEY,
+            competition_id INTEGER,
+            season INTEGER,
+            matchday INTEGER,
+            utc_date TEXT,
+            status TEXT,
+            home_team_id INTEGER,
+            away_team_id INTEGER,
+            home_team TEXT,
+            away_team TEXT,
+            home_score INTEGER,
+            away_score INTEGER,
+            last_updated TEXT,
+            FOREIGN KEY(competition_id) REFERENCES competitions(id)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_fixtures_utc_date ON fixtures(utc_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_fixtures_competition_status ON fixtures(competition_id, status)')
+    # Materialized predictions, one row per fixture and model version
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS predictions (
+            fixture_id INTEGER,
+            model_version TEXT,
+            status TEXT,
+            payload TEXT,
+            computed_at TEXT,
+            PRIMARY KEY(fixture_id, model_version),
+            FOREIGN KEY(fixture_id) REFERENCES fixtures(id)
+        )
+    ''')
+    # Streaming calibration state per league (ring buffers serialized as JSON)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS calibration_state (
+            league TEXT PRIMARY KEY,
+            state TEXT,
+            updated_at TEXT
+        )
+    ''')
+    # Fixtures already folded into calibration_state, so a restart never counts a result twice
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS calibration_settled (
+            fixture_id INTEGER PRIMARY KEY,
+            league TEXT,
+            settled_at TEXT
+        )
+    ''')
+    # Flutterwave transactions already turned into subscriptions (webhooks can be delivered more than once)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS processed_payments (
+            transaction_id TEXT PRIMARY KEY,
+            telegram_id INTEGER,
+            plan TEXT,
+            processed_at TEXT
+        )
+    ''')
+    # Model assumptions and every weight change they go through
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS assumptions (
+            name TEXT PRIMARY KEY,
+            status TEXT,
+            weight REAL,
+            updated_at TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS assumption_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            status TEXT,
+            weight REAL,
+            performance REAL,
+            changed_at TEXT
+        )
+    ''')
+    # Classified news items, deduplicated by content hash
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS news_items (
+            content_hash TEXT PRIMARY KEY,
+            fixture_id INTEGER,
+            category TEXT,
+            impact REAL,
+            sr REAL,
+            ss REAL,
+            pi REAL,
+            tr REAL,
+            title TEXT,
+            published TEXT,
+            created_at TEXT
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_news_items_fixture ON news_items(fixture_id)')
+    # Process-independent bot settings (e.g. the owner's chat id), shared by every worker
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+    # python-telegram-bot persistence: per-user/per-chat data and conversation states as JSON
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS persistence_user_data (
+            user_id INTEGER PRIMARY KEY,
+            data TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS persistence_chat_data (
+            chat_id INTEGER PRIMARY KEY,
+            data TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS persistence_conversations (
+            name TEXT,
+            conversation_key TEXT,
+            state TEXT,
+            PRIMARY KEY(name, conversation_key)
+        )
+    ''')
+    # Conditional-request validators per API resource for incremental refresh
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS api_cache (
+            resource TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at TEXT
+        )
+    ''')
     
     conn.commit()
-    conn.close()
+    migrate(conn)
+
+# Schema changes on top of the tables above, applied in order; PRAGMA user_version counts those already run
+MIGRATIONS = [
+    (
+        'CREATE INDEX IF NOT EXISTS idx_invite_usage_telegram_id ON invite_usage(telegram_id)',
+        'CREATE INDEX IF NOT EXISTS idx_invite_usage_code ON invite_usage(code)',
+    ),
+    (
+        # Expiry as a sortable epoch integer; expiry_date stays as the human-readable copy
+        'ALTER TABLE users ADD COLUMN expiry_ts INTEGER',
+        "UPDATE users SET expiry_ts = CAST(strftime('%s', expiry_date, 'utc') AS INTEGER) WHERE expiry_date IS NOT NULL",
+        'CREATE INDEX IF NOT EXISTS idx_users_subscribed_expiry ON users(is_subscribed, expiry_ts)',
+    ),
+    (
+        '''
+        CREATE TABLE IF NOT EXISTS renewal_reminders (
+            telegram_id INTEGER,
+            expiry_ts INTEGER,
+            kind TEXT,
+            status TEXT DEFAULT 'pending',
+            queued_at INTEGER,
+            PRIMARY KEY(telegram_id, expiry_ts, kind)
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_renewal_reminders_pending ON renewal_reminders(queued_at) WHERE status = 'pending'",
+    ),
+]
+
+def migrate(conn):
+    """Apply pending MIGRATIONS in one transaction; safe when several processes start at once."""
+    with conn:
+        # Take the write lock before reading the version so concurrent starters run each step once
+        conn.execute('BEGIN IMMEDIATE')
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        for statements in MIGRATIONS[version:]:
+            for statement in statements:
+                conn.execute(statement)
+        if version < len(MIGRATIONS):
+            conn.execute(f'PRAGMA user_version = {len(MIGRATIONS)}')
+            logging.info(f"Database schema migrated from version {version} to {len(MIGRATIONS)}")
 
 def add_invite_code(code, max_uses=1):
+    """Insert one code; returns False if it already exists."""
     conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            'INSERT INTO invite_codes (code, max_uses, current_uses, created_at) VALUES (?, ?, 0, ?)', 
+    with conn:
+        return conn.execute(
+            'INSERT OR IGNORE INTO invite_codes (code, max_uses, current_uses, created_at) VALUES (?, ?, 0, ?)',
             (code, max_uses, datetime.now().isoformat())
+        ).rowcount == 1
+
+def create_invite_codes(make_code, count, max_uses=1):
+    """Insert `count` new codes drawn from make_code() in one transaction, redrawing any already taken."""
+    conn = get_db_connection()
+    with conn:
+        # The write lock is held from the collision check to the insert, so no other writer can take a code in between
+        conn.execute('BEGIN IMMEDIATE')
+        codes = set()
+        while len(codes) < count:
+            batch = {make_code() for _ in range(count - len(codes))} - codes
+            taken = {row[0] for row in conn.execute(
+                'SELECT code FROM invite_codes WHERE code IN (SELECT value FROM json_each(?))',
+                (json.dumps(list(batch)),)
+            )}
+            codes |= batch - taken
+        created_at = datetime.now().isoformat()
+        conn.executemany(
+            'INSERT INTO invite_codes (code, max_uses, current_uses, created_at) VALUES (?, ?, 0, ?)',
+            [(code, max_uses, created_at) for code in codes]
         )
-        conn.commit()
-    except sqlite3.IntegrityError:
-        pass
-    conn.close()
+    return sorted(codes)
 
 def log_visitor(telegram_id, username):
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO users (telegram_id, username, first_seen) 
-        VALUES (?, ?, ?)
-        ON CONFLICT(telegram_id) DO UPDATE SET username = excluded.username
-    ''', (telegram_id, username, datetime.now().isoformat()))
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.execute('''
+            INSERT INTO users (telegram_id, username, first_seen) 
+            VALUES (?, ?, ?)
+            ON CONFLICT(telegram_id) DO UPDATE SET username = excluded.username
+        ''', (telegram_id, username, datetime.now().isoformat()))
 
 def verify_invite_code(telegram_id, code):
     conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Check if user is already verified
-    cursor.execute('SELECT is_verified FROM users WHERE telegram_id = ?', (telegram_id,))
-    res = cursor.fetchone()
-    if res and res[0]:
-        conn.close()
-        return True
-
-    # Check if code exists and has remaining uses
-    cursor.execute('SELECT max_uses, current_uses FROM invite_codes WHERE code = ?', (code,))
-    result = cursor.fetchone()
-    
-    if result:
-        max_uses, current_uses = result
-        if current_uses < max_uses:
-            # Record usage
-            cursor.execute(
-                'INSERT INTO invite_usage (code, telegram_id, used_at) VALUES (?, ?, ?)',
-                (code, telegram_id, datetime.now().isoformat())
-            )
-            # Increment current uses
-            cursor.execute('UPDATE invite_codes SET current_uses = current_uses + 1 WHERE code = ?', (code,))
-            # Mark user as verified and record code
-            cursor.execute('''
-                UPDATE users 
-                SET is_verified = 1, invite_code = ? 
-                WHERE telegram_id = ?
-            ''', (code, telegram_id))
-            conn.commit()
-            conn.close()
+    with conn:
+        # One writer at a time from here: the user check and the claim below cannot interleave with another redemption
+        conn.execute('BEGIN IMMEDIATE')
+
+        # Check if user is already verified
+        res = conn.execute('SELECT is_verified FROM users WHERE telegram_id = ?', (telegram_id,)).fetchone()
+        if res and res[0]:
             return True
-    
-    conn.close()
-    return False
+
+        # Claim a use only if one is left; a missing or exhausted code updates nothing
+        claimed = conn.execute(
+            'UPDATE invite_codes SET current_uses = current_uses + 1 WHERE code = ? AND current_uses < max_uses',
+            (code,)
+        ).rowcount
+        if not claimed:
+            return False
+
+        conn.execute(
+            'INSERT INTO invite_usage (code, telegram_id, used_at) VALUES (?, ?, ?)',
+            (code, telegram_id, datetime.now().isoformat())
+        )
+        # Mark user as verified and record code
+        conn.execute('UPDATE users SET is_verified = 1, invite_code = ? WHERE telegram_id = ?', (code, telegram_id))
+    invalidate_user_access(telegram_id)
+    return True
+
+def get_setting(key, default=None):
+    conn = get_db_connection()
+    row = conn.execute('SELECT value FROM settings WHERE key = ?', (key,)).fetchone()
+    return row[0] if row else default
+
+def set_setting(key, value):
+    conn = get_db_connection()
+    with conn:
+        conn.execute(
+            'INSERT INTO settings (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value',
+            (key, str(value))
+        )
+
+def get_owner_id():
+    """Owner chat id recorded by whichever worker saw the owner last (0 if never)."""
+    return int(get_setting("owner_id", OWNER_ID))
+
 def get_all_users():
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT telegram_id FROM users')
-    users = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return users
+    return [row[0] for row in conn.execute('SELECT telegram_id FROM users')]
 
-def check_user_access(telegram_id):
+def create_broadcast(message, owner_chat_id):
+    """Create a broadcast job addressed to every current user and return its id."""
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT is_verified, is_subscribed, expiry_date FROM users WHERE telegram_id = ?', (telegram_id,))
-    result = cursor.fetchone()
-    conn.close()
-    
-    if not result:
-        return False, "not_registered"
-    
-    is_verified, is_subscribed, expiry_date = result
+    with conn:
+        cursor = conn.execute(
+            'INSERT INTO broadcasts (message, owner_chat_id, status, created_at) VALUES (?, ?, ?, ?)',
+            (message, owner_chat_id, 'running', datetime.now().isoformat())
+        )
+        broadcast_id = cursor.lastrowid
+        conn.execute(
+            'INSERT INTO broadcast_recipients (broadcast_id, telegram_id) SELECT ?, telegram_id FROM users',
+            (broadcast_id,)
+        )
+    return broadcast_id
+
+def get_unfinished_broadcasts():
+    conn = get_db_connection()
+    return conn.execute(
+        "SELECT id, message, owner_chat_id FROM broadcasts WHERE status = 'running' ORDER BY id"
+    ).fetchall()
+
+def get_pending_recipients(broadcast_id):
+    conn = get_db_connection()
+    return [row[0] for row in conn.execute(
+        "SELECT telegram_id FROM broadcast_recipients WHERE broadcast_id = ? AND status = 'pending'",
+        (broadcast_id,)
+    )]
+
+def record_broadcast_results(broadcast_id, results):
+    """Persist a batch of (telegram_id, status) delivery outcomes in one transaction."""
+    conn = get_db_connection()
+    with conn:
+        conn.executemany(
+            'UPDATE broadcast_recipients SET status = ? WHERE broadcast_id = ? AND telegram_id = ?',
+            [(status, broadcast_id, telegram_id) for telegram_id, status in results]
+        )
+
+def get_broadcast_progress(broadcast_id):
+    """Return recipient counts per delivery status."""
+    conn = get_db_connection()
+    return dict(conn.execute(
+        'SELECT status, COUNT(*) FROM broadcast_recipients WHERE broadcast_id = ? GROUP BY status',
+        (broadcast_id,)
+    ).fetchall())
+
+def finish_broadcast(broadcast_id):
+    conn = get_db_connection()
+    with conn:
+        conn.execute(
+            "UPDATE broadcasts SET status = 'finished', finished_at = ? WHERE id = ?",
+            (datetime.now().isoformat(), broadcast_id)
+        )
+
+def sweep_subscriptions(now=None, remind_before=RENEWAL_REMINDER_WINDOW):
+    """Queue renewal reminders and expire lapsed subscriptions in one transaction.
+
+    Every statement is a range scan on (is_subscribed, expiry_ts). Returns (expired telegram_ids, reminders queued).
+    """
+    now = int(now if now is not None else time.time())
+    conn = get_db_connection()
+    with conn:
+        queued = conn.execute('''
+            INSERT OR IGNORE INTO renewal_reminders (telegram_id, expiry_ts, kind, queued_at)
+            SELECT telegram_id, expiry_ts, 'expiring', ? FROM users
+            WHERE is_subscribed = 1 AND expiry_ts > ? AND expiry_ts <= ?
+        ''', (now, now, now + remind_before)).rowcount
+        queued += conn.execute('''
+            INSERT OR IGNORE INTO renewal_reminders (telegram_id, expiry_ts, kind, queued_at)
+            SELECT telegram_id, expiry_ts, 'expired', ? FROM users
+            WHERE is_subscribed = 1 AND expiry_ts <= ?
+        ''', (now, now)).rowcount
+        expired = [row[0] for row in conn.execute(
+            'UPDATE users SET is_subscribed = 0 WHERE is_subscribed = 1 AND expiry_ts <= ? RETURNING telegram_id',
+            (now,)
+        )]
+    for telegram_id in expired:
+        invalidate_user_access(telegram_id)
+    return expired, queued
+
+def get_pending_reminders(limit=RENEWAL_REMINDER_BATCH):
+    """Oldest undelivered reminders as (telegram_id, expiry_ts, kind)."""
+    conn = get_db_connection()
+    return conn.execute(
+        "SELECT telegram_id, expiry_ts, kind FROM renewal_reminders WHERE status = 'pending' "
+        "ORDER BY queued_at LIMIT ?", (limit,)
+    ).fetchall()
+
+def record_reminder_results(results):
+    """Persist (telegram_id, expiry_ts, kind, status) delivery outcomes in one transaction."""
+    conn = get_db_connection()
+    with conn:
+        conn.executemany(
+            'UPDATE renewal_reminders SET status = ? WHERE telegram_id = ? AND expiry_ts = ? AND kind = ?',
+            [(status, telegram_id, expiry_ts, kind) for telegram_id, expiry_ts, kind, status in results]
+        )
+
+def _access_status(is_verified, is_subscribed, expiry_ts, now):
     if is_verified == 0:
         return False, "not_verified"
     
     if not is_subscribed:
         return False, "not_subscribed" 
-    if expiry_date and datetime.fromisoformat(expiry_date) < datetime.now():
+    if expiry_ts is not None and expiry_ts <= now:
         return False, "expired"
     
     return True, "active"
 
+def cached_user_access(telegram_id):
+    """Return (has_access, status) from the access cache, or None on a miss."""
+    entry = _access_cache.get(telegram_id)
+    if entry is None:
+        return None
+    is_verified, is_subscribed, expiry_ts, valid_until = entry
+    now = time.time()
+    if now >= valid_until:
+        with _access_cache_lock:
+            if _access_cache.get(telegram_id) is entry:
+                del _access_cache[telegram_id]
+        return None
+    return _access_status(is_verified, is_subscribed, expiry_ts, now)
+
+def invalidate_user_access(telegram_id):
+    """Drop a user's cached access status after a write that changes it."""
+    with _access_cache_lock:
+        _access_cache.pop(telegram_id, None)
+
+def clear_access_cache():
+    with _access_cache_lock:
+        _access_cache.clear()
+
+def check_user_access(telegram_id):
+    cached = cached_user_access(telegram_id)
+    if cached is not None:
+        return cached
+
+    conn = get_db_connection()
+    result = conn.execute(
+        'SELECT is_verified, is_subscribed, expiry_ts FROM users WHERE telegram_id = ?', (telegram_id,)
+    ).fetchone()
+    
+    if not result:
+        return False, "not_registered"
+    
+    is_verified, is_subscribed, expiry_ts = result
+    now = time.time()
+
+    # Cache for the TTL, but never past the moment the subscription lapses
+    valid_until = now + ACCESS_CACHE_TTL
+    if expiry_ts is not None and now < expiry_ts < valid_until:
+        valid_until = expiry_ts
+    with _access_cache_lock:
+        _access_cache[telegram_id] = (is_verified, is_subscribed, expiry_ts, valid_until)
+
+    return _access_status(is_verified, is_subscribed, expiry_ts, now)
+
 if __name__ == "__main__":
     init_db()
     # Add a test invite code
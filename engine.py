@@ -1,7 +1,44 @@
+from collections import OrderedDict
+from functools import lru_cache
 import numpy as np
-import pandas as pd
-from scipy.stats import poisson
 from config import *
+from rules import RuleTable
+
+def poisson_pmf_recurrence(lams, max_goals):
+    """Exact Poisson PMFs for goals 0..max_goals-1 via p(k) = p(k-1) * lam / k."""
+    lams = np.asarray(lams, dtype=float)
+    pmf = np.empty(lams.shape + (max_goals,))
+    pmf[..., 0] = np.exp(-lams)
+    for k in range(1, max_goals):
+        pmf[..., k] = pmf[..., k - 1] * lams / k
+    return pmf
+
+@lru_cache(maxsize=None)
+def build_pmf_table(grid_max=PMF_GRID_MAX, grid_step=PMF_GRID_STEP, max_goals=PMF_TABLE_MAX_GOALS):
+    """Precompute Poisson PMFs over the lambda grid 0..grid_max, shape (n_grid, max_goals).
+
+    Every entry stays within PMF_TOLERANCE of scipy.stats.poisson.pmf.
+    """
+    n_grid = int(round(grid_max / grid_step)) + 1
+    table = poisson_pmf_recurrence(np.arange(n_grid) * grid_step, max_goals)
+    table.setflags(write=False)
+    return table
+
+@lru_cache(maxsize=None)
+def build_market_masks(max_goals, total_lines=MARKET_TOTAL_LINES, handicap_lines=MARKET_HANDICAP_LINES):
+    """0/1 masks over the flattened (home goals, away goals) grid, one row per market outcome.
+
+    Rows: over each total line, both teams to score, home covering each handicap line, then a push on it.
+    """
+    home, away = np.indices((max_goals, max_goals))
+    total, diff = home + away, home - away
+    rows = [total > line for line in total_lines]
+    rows.append((home > 0) & (away > 0))
+    rows += [diff + line > 0 for line in handicap_lines]
+    rows += [diff + line == 0 for line in handicap_lines]
+    masks = np.array(rows, dtype=float).reshape(len(rows), max_goals * max_goals)
+    masks.setflags(write=False)
+    return masks
 
 class EaglensEngine:
     def __init__(self):
@@ -12,11 +49,81 @@ class EaglensEngine:
             "league_volatility": 1.1,
             "sample_size": 50
         }
+        # Per-competition metrics from CalibrationTracker; leagues without any fall back to the aggregate above
+        self.league_metrics = {}
+        self.rules = RuleTable()
+        self._gate_cache = {}
+        self.set_assumption_weights({})
+        self.cache_size = POISSON_CACHE_SIZE
+        self.cache_precision = POISSON_CACHE_PRECISION
+        self.pmf_table = build_pmf_table()
+        self._score_cache = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def clear_cache(self):
+        """Drop all cached score matrices; the hit/miss counters stay cumulative."""
+        self._score_cache.clear()
+
+    def cache_stats(self):
+        """Return score-matrix cache counters for the System Status view."""
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "size": len(self._score_cache),
+            "max_size": self.cache_size,
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "hit_rate": self.cache_hits / lookups if lookups else 0.0
+        }
 
     def calculate_poisson_probabilities(self, home_exp_goals, away_exp_goals, max_goals=10):
         """Calculate match outcome probabilities using Poisson distribution."""
-        home_probs = [poisson.pmf(i, home_exp_goals) for i in range(max_goals)]
-        away_probs = [poisson.pmf(i, away_exp_goals) for i in range(max_goals)]
+        _, probs = self.get_score_matrix(home_exp_goals, away_exp_goals, max_goals)
+        return dict(probs)
+
+    def get_score_matrix(self, home_exp_goals, away_exp_goals, max_goals=10):
+        """Return the (score_matrix, probabilities) pair, served from the LRU cache when possible.
+
+        Score matrices depend only on the expected goals, so calibration changes leave the cache valid.
+        """
+        home_exp_goals = round(float(home_exp_goals), self.cache_precision)
+        away_exp_goals = round(float(away_exp_goals), self.cache_precision)
+        key = (home_exp_goals, away_exp_goals, max_goals)
+
+        cached = self._score_cache.get(key)
+        if cached is not None:
+            self._score_cache.move_to_end(key)
+            self.cache_hits += 1
+            return cached
+
+        self.cache_misses += 1
+        cached = self._compute_score_matrix(home_exp_goals, away_exp_goals, max_goals)
+        self._score_cache[key] = cached
+        if len(self._score_cache) > self.cache_size:
+            self._score_cache.popitem(last=False)
+        return cached
+
+    def poisson_pmf(self, lams, max_goals=10):
+        """Poisson PMFs for goals 0..max_goals-1, read from the lookup table when lambda is on-grid."""
+        lams = np.asarray(lams, dtype=float)
+        if max_goals > self.pmf_table.shape[1]:
+            return poisson_pmf_recurrence(lams, max_goals)
+
+        # Lambdas that sit exactly on the grid are a table read, anything else falls back to the recurrence
+        steps = lams / PMF_GRID_STEP
+        idx = np.rint(steps).astype(int)
+        on_grid = (np.abs(steps - idx) < 1e-6) & (idx >= 0) & (idx < self.pmf_table.shape[0])
+        if on_grid.all():
+            return self.pmf_table[idx, :max_goals]
+
+        pmf = poisson_pmf_recurrence(lams, max_goals)
+        pmf[on_grid] = self.pmf_table[idx[on_grid], :max_goals]
+        return pmf
+
+    def _compute_score_matrix(self, home_exp_goals, away_exp_goals, max_goals):
+        """Build the Poisson score matrix and reduce it to H/D/A probabilities."""
+        home_probs = self.poisson_pmf(home_exp_goals, max_goals)
+        away_probs = self.poisson_pmf(away_exp_goals, max_goals)
         
         # Outer product to get score matrix
         score_matrix = np.outer(home_probs, away_probs)
@@ -27,90 +134,242 @@ class EaglensEngine:
         
         # Normalize to ensure sum is 1
         total = home_win + draw + away_win
+        score_matrix.setflags(write=False)
+        return score_matrix, {
+            "home": home_win / total,
+            "draw": draw / total,
+            "away": away_win / total
+        }
+
+    def score_matrices_batch(self, home_exp_goals, away_exp_goals, max_goals=10):
+        """Stacked score matrices for a slate, shape (n_matches, max_goals, max_goals)."""
+        # Quantize exactly like the single-match cache so both paths agree
+        home_exp_goals = np.round(np.asarray(home_exp_goals, dtype=float), self.cache_precision)
+        away_exp_goals = np.round(np.asarray(away_exp_goals, dtype=float), self.cache_precision)
+
+        # One table lookup per side for the whole slate: shape (n_matches, max_goals)
+        home_probs = self.poisson_pmf(home_exp_goals, max_goals)
+        away_probs = self.poisson_pmf(away_exp_goals, max_goals)
+        return home_probs[:, :, None] * away_probs[:, None, :]
+
+    def score_matrices_cached(self, home_exp_goals, away_exp_goals, max_goals=10):
+        """score_matrices_batch through the LRU cache: hits are reused and every miss is built in one batch pass."""
+        keys = [(round(float(h), self.cache_precision), round(float(a), self.cache_precision), max_goals)
+                for h, a in zip(home_exp_goals, away_exp_goals)]
+        matrices = [None] * len(keys)
+        missing = {}
+        for i, key in enumerate(keys):
+            cached = self._score_cache.get(key)
+            if cached is not None:
+                self._score_cache.move_to_end(key)
+                self.cache_hits += 1
+                matrices[i] = cached[0]
+            else:
+                missing.setdefault(key, []).append(i)
+
+        if missing:
+            built = self.score_matrices_batch([key[0] for key in missing], [key[1] for key in missing], max_goals)
+            probs = self.outcome_probabilities_batch(built)
+            for j, (key, rows) in enumerate(missing.items()):
+                score_matrix = built[j].copy()
+                score_matrix.setflags(write=False)
+                self._score_cache[key] = (score_matrix, {k: float(v[j]) for k, v in probs.items()})
+                for i in rows:
+                    matrices[i] = score_matrix
+                # Repeats of a key within one slate count as hits, as they would one at a time
+                self.cache_misses += 1
+                self.cache_hits += len(rows) - 1
+            while len(self._score_cache) > self.cache_size:
+                self._score_cache.popitem(last=False)
+        return np.stack(matrices) if matrices else np.zeros((0, max_goals, max_goals))
+
+    def calculate_poisson_probabilities_batch(self, home_exp_goals, away_exp_goals, max_goals=10):
+        """Calculate outcome probabilities for many matches in one broadcasted pass."""
+        return self.outcome_probabilities_batch(self.score_matrices_batch(home_exp_goals, away_exp_goals, max_goals))
+
+    def outcome_probabilities_batch(self, score_matrices):
+        """Reduce stacked score matrices to H/D/A probabilities."""
+        max_goals = score_matrices.shape[-1]
+        home_win = np.sum(score_matrices * np.tril(np.ones((max_goals, max_goals)), -1), axis=(1, 2))
+        draw = np.trace(score_matrices, axis1=1, axis2=2)
+        away_win = np.sum(score_matrices * np.triu(np.ones((max_goals, max_goals)), 1), axis=(1, 2))
+
+        # Normalize to ensure each row sums to 1
+        total = home_win + draw + away_win
         return {
             "home": home_win / total,
             "draw": draw / total,
             "away": away_win / total
         }
 
-    def compute_confidence(self, metrics):
+    def derive_markets_batch(self, score_matrices, outcomes, n_scores=MARKET_CORRECT_SCORES):
+        """Secondary markets for stacked score matrices, read off them with one matrix product.
+
+        `outcomes` are the H/D/A probabilities of the same matrices (for double chance). Like H/D/A, every market is
+        normalized by the probability mass inside the max_goals grid.
+        """
+        n_matches, max_goals = score_matrices.shape[0], score_matrices.shape[-1]
+        flat = score_matrices.reshape(n_matches, max_goals * max_goals)
+        totals = flat.sum(axis=1)
+        values = flat @ build_market_masks(max_goals).T / totals[:, None]
+
+        # Most likely scorelines: partial selection, then order just those
+        n_scores = min(n_scores, flat.shape[1])
+        top = np.argpartition(-flat, n_scores - 1, axis=1)[:, :n_scores]
+        top_probs = np.take_along_axis(flat, top, axis=1)
+        order = np.argsort(-top_probs, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_probs = np.take_along_axis(top_probs, order, axis=1) / totals[:, None]
+
+        n_totals, n_handicaps = len(MARKET_TOTAL_LINES), len(MARKET_HANDICAP_LINES)
+        btts = values[:, n_totals]
+        covers = values[:, n_totals + 1:n_totals + 1 + n_handicaps]
+        pushes = values[:, n_totals + 1 + n_handicaps:]
+        markets = []
+        for j in range(n_matches):
+            home, draw, away = float(outcomes["home"][j]), float(outcomes["draw"][j]), float(outcomes["away"][j])
+            markets.append({
+                "double_chance": {"1X": home + draw, "X2": draw + away, "12": home + away},
+                "totals": {f"{line:g}": {"over": float(values[j, k]), "under": 1.0 - float(values[j, k])}
+                           for k, line in enumerate(MARKET_TOTAL_LINES)},
+                "btts": {"yes": float(btts[j]), "no": 1.0 - float(btts[j])},
+                "asian_handicap": {
+                    f"{line:g}": {"home": float(covers[j, k]), "push": float(pushes[j, k]),
+                                  "away": 1.0 - float(covers[j, k]) - float(pushes[j, k])}
+                    for k, line in enumerate(MARKET_HANDICAP_LINES)
+                },
+                "correct_scores": [[f"{s // max_goals}-{s % max_goals}", float(p)]
+                                   for s, p in zip(top[j].tolist(), top_probs[j])]
+            })
+        return markets
+
+    def derive_markets(self, score_matrix, outcomes):
+        """Secondary markets for a single score matrix and its H/D/A probabilities."""
+        return self.derive_markets_batch(score_matrix[None], {k: [v] for k, v in outcomes.items()})[0]
+
+    def set_assumption_weights(self, weights):
+        """Precompute how AssumptionRegistry weights enter every prediction."""
+        self.assumption_weights = dict(weights)
+        # A weakened home advantage shrinks the home side's log-rate uplift
+        self.home_goals_factor = float(np.exp((weights.get("home_advantage", 1.0) - 1.0) * HOME_ADVANTAGE_LOG))
+        self.assumption_penalty = int(round(sum(
+            (1.0 - weights.get(name, 1.0)) * points for name, points in ASSUMPTION_CONFIDENCE_PENALTY.items()
+        )))
+        self._gate_cache = {}
+
+    def compute_confidence(self, metrics, league=None):
         """Compute confidence score (0-100) based on multiple factors."""
-        confidence = 85  # Base confidence
-        
-        # Adjust based on Brier Score
-        if metrics["brier_score"] > 0.20:
-            confidence -= 15
-            
-        # Adjust based on Performance Drift
-        if metrics["performance_drift"] > 0.15:
-            confidence -= 30
-            
-        # Adjust based on Data Drift
-        if metrics["data_drift_psi"] > 0.25:
-            confidence -= 20
-            
-        # Adjust based on League Volatility
-        if metrics["league_volatility"] > 1.25:
-            confidence = min(confidence, 40)
-            
-        # Adjust based on Sample Size
-        if metrics["sample_size"] < 10:
-            confidence = min(confidence, 35)
-            
-        return max(0, confidence)
+        return max(0, self.rules.evaluate([metrics], [league])[2][0] - self.assumption_penalty)
 
-    def check_gates(self, metrics):
+    def check_gates(self, metrics, league=None):
         """Check if any hard gating rules are triggered."""
-        if metrics["brier_score"] > BRIER_THRESHOLD:
-            return False, "Calibration failure: Rolling Brier score exceeds threshold (0.23)."
-        
-        if metrics["performance_drift"] > PERFORMANCE_DRIFT_SUPPRESS:
-            return False, "Performance degradation: Model accuracy has drifted significantly."
-            
-        if metrics["data_drift_psi"] > DATA_DRIFT_PSI_SUPPRESS:
-            return False, "Data drift detected: Input distribution has shifted beyond reliability."
-            
-        if metrics["league_volatility"] > LEAGUE_VOLATILITY_SUPPRESS:
-            return False, "Extreme volatility: League conditions are currently too unpredictable."
-            
-        if metrics["sample_size"] < MIN_SAMPLE_SIZE:
-            return False, "Insufficient data: Not enough historical matches for a reliable prediction."
-            
-        return True, None
+        reliable, reasons, _ = self.rules.evaluate([metrics], [league])
+        return reliable[0], reasons[0]
+
+    def gate_leagues(self, leagues):
+        """(is_reliable, reason, confidence) per league, re-evaluated only for leagues whose metrics changed."""
+        decisions, stale = {}, []
+        for league in set(leagues):
+            snapshot = self.rules.metric_vector(self.metrics_for(league))
+            cached = self._gate_cache.get(league)
+            if cached is not None and cached[0] == snapshot:
+                decisions[league] = cached[1]
+            else:
+                stale.append((league, snapshot))
+        if stale:
+            reliable, reasons, confidences = self.rules.evaluate(
+                [self.metrics_for(league) for league, _ in stale], [league for league, _ in stale]
+            )
+            confidences = [max(0, c - self.assumption_penalty) for c in confidences]
+            for (league, snapshot), decision in zip(stale, zip(reliable, reasons, confidences)):
+                self._gate_cache[league] = (snapshot, decision)
+                decisions[league] = decision
+        return decisions
 
-    def predict(self, home_team, away_team, home_exp_goals, away_exp_goals):
+    def confidence_label(self, confidence):
+        """Map a confidence score to its High/Medium/Low label."""
+        if confidence >= CONFIDENCE_HIGH[0]:
+            return "High"
+        elif confidence >= CONFIDENCE_MEDIUM[0]:
+            return "Medium"
+        return "Low"
+
+    def metrics_for(self, league=None):
+        """Calibration metrics for a league, or the all-leagues aggregate."""
+        return self.league_metrics.get(league, self.calibration_metrics)
+
+    def predict(self, home_team, away_team, home_exp_goals, away_exp_goals, league=None):
         """Main prediction entry point with gating and confidence calculation."""
         # 1. Check Gates
-        is_reliable, reason = self.check_gates(self.calibration_metrics)
+        is_reliable, reason, confidence = self.gate_leagues([league])[league]
+
+        # 2. Calculate Probabilities and the markets derived from the same score matrix
+        score_matrix, probs = self.get_score_matrix(home_exp_goals * self.home_goals_factor, away_exp_goals)
+        probs = dict(probs)
         if not is_reliable:
+            # Not published, but kept (as in predict_many) so suppressed predictions can still be settled
             return {
                 "status": "suppressed",
-                "reason": reason
+                "reason": reason,
+                "probabilities": probs
             }
-            
-        # 2. Calculate Probabilities
-        probs = self.calculate_poisson_probabilities(home_exp_goals, away_exp_goals)
         
-        # 3. Compute Confidence
-        confidence = self.compute_confidence(self.calibration_metrics)
-        
-        # 4. Determine Confidence Label
-        if confidence >= CONFIDENCE_HIGH[0]:
-            label = "High"
-        elif confidence >= CONFIDENCE_MEDIUM[0]:
-            label = "Medium"
-        else:
-            label = "Low"
+        # 3. Determine Confidence Label
+        label = self.confidence_label(confidence)
             
         return {
             "status": "success",
             "home_team": home_team,
             "away_team": away_team,
             "probabilities": probs,
+            "markets": self.derive_markets(score_matrix, probs),
             "confidence": confidence,
             "confidence_label": label
         }
 
+    def predict_many(self, fixtures, league=None):
+        """Predict a slate of (home_team, away_team, home_exp_goals, away_exp_goals[, league]) fixtures at once.
+
+        Fixtures without their own league use `league`; gates and confidence run once per distinct league.
+        """
+        fixtures = [fixture if len(fixture) == 5 else (*fixture, league) for fixture in fixtures]
+        if not fixtures:
+            return []
+
+        # 1. Check Gates and Confidence once per league
+        decisions = self.gate_leagues(fixture[4] for fixture in fixtures)
+        reliable = [i for i, fixture in enumerate(fixtures) if decisions[fixture[4]][0]]
+
+        # 2. Calculate Probabilities for every fixture in one pass. Suppressed ones keep theirs (never shown) so
+        # calibration can still settle them; otherwise a gated league could never collect the results to reopen
+        score_matrices = self.score_matrices_cached(
+            [fixture[2] * self.home_goals_factor for fixture in fixtures], [fixture[3] for fixture in fixtures]
+        )
+        probs = self.outcome_probabilities_batch(score_matrices)
+        markets = iter(self.derive_markets_batch(score_matrices[reliable], {k: v[reliable] for k, v in probs.items()}))
+
+        results = []
+        for i, (home_team, away_team, _, _, fixture_league) in enumerate(fixtures):
+            is_reliable, reason, confidence = decisions[fixture_league]
+            probabilities = {
+                "home": float(probs["home"][i]),
+                "draw": float(probs["draw"][i]),
+                "away": float(probs["away"][i])
+            }
+            if not is_reliable:
+                results.append({"status": "suppressed", "reason": reason, "probabilities": probabilities})
+                continue
+            results.append({
+                "status": "success",
+                "home_team": home_team,
+                "away_team": away_team,
+                "probabilities": probabilities,
+                "markets": next(markets),
+                "confidence": confidence,
+                "confidence_label": self.confidence_label(confidence)
+            })
+        return results
+
 # Example usage
 if __name__ == "__main__":
     engine = EaglensEngine()
@@ -0,0 +1,268 @@
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+import httpx
+from async_database import run_db
+from database import get_db_connection
+from config import (
+    FOOTBALL_DATA_API_KEY, FOOTBALL_DATA_BASE_URL, FOOTBALL_DATA_COMPETITIONS,
+    FOOTBALL_DATA_REQUESTS_PER_MINUTE, FIXTURE_WINDOW_DAYS, HISTORY_SEASONS
+)
+
+FINISHED = "FINISHED"
+UPCOMING_STATUSES = ("SCHEDULED", "TIMED")
+
+class RequestQuota:
+    """Sliding one-minute window that keeps us inside the Football-Data.org request quota."""
+
+    def __init__(self, per_minute=FOOTBALL_DATA_REQUESTS_PER_MINUTE, window=60.0):
+        self.per_minute = per_minute
+        self.window = window
+        self.sent = deque()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                while self.sent and now - self.sent[0] >= self.window:
+                    self.sent.popleft()
+                if len(self.sent) < self.per_minute:
+                    self.sent.append(now)
+                    return
+                await asyncio.sleep(self.window - (now - self.sent[0]))
+
+    def block_for(self, seconds):
+        """Treat the quota as used up for `seconds` after the API answers 429."""
+        now = time.monotonic()
+        self.sent = deque([now + seconds - self.window] * self.per_minute)
+
+class FootballDataClient:
+    """Conditional GETs against Football-Data.org v4 using stored ETag/Last-Modified validators."""
+
+    def __init__(self, api_key=FOOTBALL_DATA_API_KEY, base_url=FOOTBALL_DATA_BASE_URL, quota=None, transport=None):
+        self.base_url = base_url
+        self.quota = quota or RequestQuota()
+        self.client = httpx.AsyncClient(
+            headers={"X-Auth-Token": api_key},
+            timeout=httpx.Timeout(20.0, connect=5.0),
+            transport=transport
+        )
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def get(self, path, params=None):
+        """Return (payload, validators), or None when the resource has not changed since the last fetch.
+
+        The validators are saved by store_matches in the same transaction as the data, so a fetch whose store fails
+        is downloaded in full again next time instead of being answered with a 304.
+        """
+        resource = path + ("?" + str(httpx.QueryParams(params)) if params else "")
+        cached = await run_db(_load_validators, resource)
+        headers = {}
+        if cached:
+            etag, last_modified = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        while True:
+            await self.quota.acquire()
+            response = await self.client.get(f"{self.base_url}{path}", params=params, headers=headers)
+            if response.status_code != 429:
+                break
+            reset = int(response.headers.get("X-RequestCounter-Reset", 60))
+            logging.warning(f"Football-Data quota exhausted, waiting {reset}s")
+            self.quota.block_for(reset)
+
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+
+        return response.json(), (resource, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+
+def _load_validators(resource):
+    conn = get_db_connection()
+    return conn.execute('SELECT etag, last_modified FROM api_cache WHERE resource = ?', (resource,)).fetchone()
+
+def _save_validators(conn, resource, etag, last_modified):
+    conn.execute(
+        'INSERT INTO api_cache (resource, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?) '
+        'ON CONFLICT(resource) DO UPDATE SET etag = excluded.etag, '
+        'last_modified = excluded.last_modified, fetched_at = excluded.fetched_at',
+        (resource, etag, last_modified, datetime.now().isoformat())
+    )
+
+def store_matches(payload, validators=None):
+    """Upsert the competition, teams and fixtures from a /matches payload; returns fixtures changed.
+
+    `validators` from FootballDataClient.get are committed with the rows, or not at all.
+    """
+    competition = payload.get("competition")
+    matches = payload.get("matches", [])
+    conn = get_db_connection()
+    with conn:
+        competitions = {m["competition"]["id"]: m["competition"] for m in matches if m.get("competition")}
+        if competition:
+            competitions[competition["id"]] = {**competitions.get(competition["id"], {}), **competition}
+        conn.executemany(
+            'INSERT INTO competitions (id, code, name, area, last_updated) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT(id) DO UPDATE SET code = excluded.code, name = excluded.name, '
+            'area = COALESCE(excluded.area, competitions.area), last_updated = excluded.last_updated',
+            [(c["id"], c.get("code"), c.get("name"), (c.get("area") or {}).get("name"), c.get("lastUpdated"))
+             for c in competitions.values()]
+        )
+
+        teams = {}
+        for match in matches:
+            for side in ("homeTeam", "awayTeam"):
+                team = match[side]
+                if team.get("id") is not None:
+                    teams[team["id"]] = team
+        conn.executemany(
+            'INSERT INTO teams (id, name, short_name, tla, last_updated) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT(id) DO UPDATE SET name = excluded.name, short_name = excluded.short_name, '
+            'tla = excluded.tla, last_updated = excluded.last_updated',
+            [(t["id"], t.get("name"), t.get("shortName"), t.get("tla"), datetime.now().isoformat())
+             for t in teams.values()]
+        )
+
+        before = conn.total_changes
+        conn.executemany(
+            'INSERT INTO fixtures (id, competition_id, season, matchday, utc_date, status, home_team_id, '
+            'away_team_id, home_team, away_team, home_score, away_score, last_updated) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT(id) DO UPDATE SET utc_date = excluded.utc_date, status = excluded.status, '
+            'matchday = excluded.matchday, home_score = excluded.home_score, away_score = excluded.away_score, '
+            'last_updated = excluded.last_updated '
+            'WHERE excluded.last_updated IS NOT fixtures.last_updated',
+            [_fixture_row(match, competition) for match in matches]
+        )
+        changed = conn.total_changes - before
+        if validators:
+            _save_validators(conn, *validators)
+    return changed
+
+def _fixture_row(match, competition):
+    competition_id = (match.get("competition") or competition or {}).get("id")
+    season = (match.get("season") or {}).get("startDate")
+    full_time = (match.get("score") or {}).get("fullTime") or {}
+    return (
+        match["id"], competition_id, int(season[:4]) if season else None, match.get("matchday"),
+        match["utcDate"], match["status"], match["homeTeam"].get("id"), match["awayTeam"].get("id"),
+        match["homeTeam"].get("name"), match["awayTeam"].get("name"),
+        full_time.get("home"), full_time.get("away"), match.get("lastUpdated")
+    )
+
+async def refresh_fixtures(client, competitions=FOOTBALL_DATA_COMPETITIONS, window_days=FIXTURE_WINDOW_DAYS, today=None):
+    """Pull the fixture window for each competition; unchanged resources cost one 304 each."""
+    today = today or datetime.now(timezone.utc).date()
+    params = {
+        "dateFrom": (today - timedelta(days=window_days)).isoformat(),
+        "dateTo": (today + timedelta(days=window_days)).isoformat()
+    }
+    changed = 0
+    for code in competitions:
+        try:
+            fetched = await client.get(f"/competitions/{code}/matches", params)
+        except httpx.HTTPError as e:
+            logging.error(f"Fixture refresh failed for {code}: {e}")
+            continue
+        if fetched is not None:
+            changed += await run_db(store_matches, *fetched)
+    logging.info(f"Fixture refresh complete: {changed} fixtures changed")
+    return changed
+
+def season_start_year(day):
+    """Football-Data.org names a season by the year it starts; European seasons start in July or August."""
+    return day.year if day.month >= 7 else day.year - 1
+
+def history_seasons(today=None, past=HISTORY_SEASONS):
+    """The current season and the `past` seasons before it, oldest first."""
+    current = season_start_year(today or datetime.now(timezone.utc).date())
+    return list(range(current - past, current + 1))
+
+async def backfill_seasons(client, seasons, competitions=FOOTBALL_DATA_COMPETITIONS):
+    """Load every finished result of whole seasons, which the fixture window never reaches.
+
+    The strength model fits on these and backtest.py replays them. Seasons already stored cost one 304 each.
+    """
+    changed = 0
+    for code in competitions:
+        for season in seasons:
+            try:
+                fetched = await client.get(f"/competitions/{code}/matches", {"season": season, "status": FINISHED})
+            except httpx.HTTPError as e:
+                # The free tier only serves some past seasons; keep going with the rest
+                logging.error(f"Season backfill failed for {code} {season}: {e}")
+                continue
+            if fetched is not None:
+                changed += await run_db(store_matches, *fetched)
+    logging.info(f"Season backfill complete: {changed} fixtures changed")
+    return changed
+
+def get_fixtures_for_date(day):
+    """Fixtures kicking off on a UTC calendar day, ordered by kickoff."""
+    start = datetime.combine(day, datetime.min.time()).strftime("%Y-%m-%dT%H:%M:%SZ")
+    end = datetime.combine(day + timedelta(days=1), datetime.min.time()).strftime("%Y-%m-%dT%H:%M:%SZ")
+    conn = get_db_connection()
+    return conn.execute(
+        'SELECT id, competition_id, utc_date, status, home_team, away_team FROM fixtures '
+        'WHERE utc_date >= ? AND utc_date < ? ORDER BY utc_date, id',
+        (start, end)
+    ).fetchall()
+
+def get_upcoming_fixtures(limit=10, now=None):
+    now = (now or datetime.now(timezone.utc)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    conn = get_db_connection()
+    return conn.execute(
+        f'SELECT id, competition_id, utc_date, status, home_team, away_team FROM fixtures '
+        f'WHERE utc_date >= ? AND status IN ({",".join("?" * len(UPCOMING_STATUSES))}) '
+        f'ORDER BY utc_date, id LIMIT ?',
+        (now, *UPCOMING_STATUSES, limit)
+    ).fetchall()
+
+def get_finished_fixtures(competition_id=None):
+    """Settled results in kickoff order, for model fitting and calibration."""
+    conn = get_db_connection()
+    query = ('SELECT id, competition_id, season, utc_date, home_team, away_team, home_score, away_score '
+             'FROM fixtures WHERE status = ? AND home_score IS NOT NULL')
+    params = [FINISHED]
+    if competition_id is not None:
+        query += ' AND competition_id = ?'
+        params.append(competition_id)
+    return conn.execute(query + ' ORDER BY utc_date, id', params).fetchall()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill whole seasons of results from Football-Data.org")
+    parser.add_argument("seasons", nargs="*", type=int,
+                        help=f"Season start years (default: the current season and {HISTORY_SEASONS} before it)")
+    parser.add_argument("--competitions", default=",".join(FOOTBALL_DATA_COMPETITIONS),
+                        help="Comma-separated competition codes")
+    parser.add_argument("--db", help="SQLite database to load into (default: config DB_PATH)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
+
+    import database
+    if args.db:
+        database.DB_PATH = args.db
+    database.init_db()
+
+    async def backfill():
+        client = FootballDataClient()
+        try:
+            return await backfill_seasons(client, args.seasons or history_seasons(), args.competitions.split(","))
+        finally:
+            await client.close()
+
+    print(f"{asyncio.run(backfill())} fixtures changed")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,29 @@
 import secrets
 import string
-from database import add_invite_code
-from config import OWNER_ID
+from database import create_invite_codes
+from async_database import get_owner_id
+
+def random_invite_code(prefix="EAGLE", length=8):
+    random_part = ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(length))
+    return f"{prefix}-{random_part}"
+
+def generate_invite_codes(count, prefix="EAGLE", length=8, max_uses=100):
+    """Generate `count` secure multi-use invite codes in a single transaction."""
+    return create_invite_codes(lambda: random_invite_code(prefix, length), count, max_uses)
 
 def generate_invite_code(prefix="EAGLE", length=8, max_uses=100):
     """Generate a secure multi-use invite code."""
-    random_part = ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(length))
-    code = f"{prefix}-{random_part}"
-    add_invite_code(code, max_uses)
-    return code
+    return generate_invite_codes(1, prefix, length, max_uses)[0]
 
 async def notify_owner_of_new_code(context, code, max_uses):
     """Send the new invite code to the owner via Telegram."""
-    if OWNER_ID != 0:
+    owner_id = await get_owner_id()
+    if owner_id != 0:
         try:
             message = f"🦅 *New Invite Code Generated*\n\n" \
                       f"Code: `{code}`\n" \
                       f"Max Uses: {max_uses}\n\n" \
                       f"Share this code with potential subscribers!"
-            await context.bot.send_message(chat_id=OWNER_ID, text=message, parse_mode='Markdown')
+            await context.bot.send_message(chat_id=owner_id, text=message, parse_mode='Markdown')
         except Exception as e:
             print(f"Failed to notify owner: {e}")
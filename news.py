@@ -0,0 +1,354 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from datetime import datetime, timezone
+import httpx
+from async_database import run_db
+from database import get_db_connection
+from fixtures import UPCOMING_STATUSES
+from config import (
+    BASE_DIR, NEWS_SOURCE_RELIABILITY, NEWS_POLL_INTERVAL, NEWS_QUEUE_SIZE, NEWS_BATCH_SIZE, NEWS_BATCH_WAIT,
+    NEWS_DEDUP_CAPACITY, NEWS_RESOLVER_TTL
+)
+
+TRAINING_PATH = os.path.join(BASE_DIR, "news_training.jsonl")
+_DONE = object()
+
+def normalize(text):
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", (text or "").lower())).strip()
+
+def content_hash(item):
+    """Identity of a news item regardless of source, link or whitespace."""
+    return hashlib.sha1(normalize(f"{item.get('title')} {item.get('summary')}").encode()).hexdigest()
+
+class FileNewsSource:
+    """JSON-lines file of {"title", "summary", "published"[, "fixture_id"]} items; follow=True keeps tailing it."""
+
+    def __init__(self, path, reliability=NEWS_SOURCE_RELIABILITY, follow=False, poll_interval=NEWS_POLL_INTERVAL):
+        self.path = path
+        self.reliability = reliability
+        self.follow = follow
+        self.poll_interval = poll_interval
+        self.offset = 0
+
+    def _read_new_lines(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read()
+        if self.follow:
+            # A line without its newline is still being written: leave it for the next poll
+            data = data[:data.rfind(b"\n") + 1]
+        self.offset += len(data)
+        return [line for line in data.decode("utf-8", errors="replace").splitlines() if line.strip()]
+
+    def _parse(self, line):
+        """One line as an item, or None if it is not a JSON object."""
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            logging.warning(f"Skipping malformed line in {self.path}: {e}")
+            return None
+        if not isinstance(item, dict):
+            logging.warning(f"Skipping non-object line in {self.path}")
+            return None
+        return {**item, "sr": self.reliability}
+
+    async def items(self):
+        """Yield parsed items; a line that cannot be parsed is yielded as None so the pipeline can count it."""
+        while True:
+            for line in await asyncio.to_thread(self._read_new_lines):
+                yield self._parse(line)
+            if not self.follow:
+                return
+            await asyncio.sleep(self.poll_interval)
+
+class RSSNewsSource:
+    """RSS 2.0 feed polled over HTTP; <item> title/description become title/summary."""
+
+    def __init__(self, url, reliability=NEWS_SOURCE_RELIABILITY, follow=False, poll_interval=NEWS_POLL_INTERVAL,
+                 transport=None):
+        self.url = url
+        self.reliability = reliability
+        self.follow = follow
+        self.poll_interval = poll_interval
+        self.transport = transport
+
+    async def items(self):
+        async with httpx.AsyncClient(transport=self.transport, timeout=15.0) as client:
+            while True:
+                try:
+                    response = await client.get(self.url)
+                    response.raise_for_status()
+                    root = ET.fromstring(response.content)
+                except (httpx.HTTPError, ET.ParseError) as e:
+                    logging.warning(f"News feed {self.url} unavailable: {e}")
+                    root = None
+                for entry in root.iter("item") if root is not None else ():
+                    yield {
+                        "title": entry.findtext("title"),
+                        "summary": entry.findtext("description"),
+                        "published": entry.findtext("pubDate"),
+                        "sr": self.reliability
+                    }
+                if not self.follow:
+                    return
+                await asyncio.sleep(self.poll_interval)
+
+def sources_from_config(locations, follow=True):
+    return [RSSNewsSource(location, follow=follow) if location.startswith(("http://", "https://"))
+            else FileNewsSource(location, follow=follow) for location in locations]
+
+class ContentIndex:
+    """Bounded set of recently seen content hashes."""
+
+    def __init__(self, capacity=NEWS_DEDUP_CAPACITY, hashes=()):
+        self.capacity = capacity
+        self._hashes = OrderedDict()
+        for digest in hashes:
+            self.add(digest)
+
+    def add(self, digest):
+        """Remember a hash; returns False if it was already known."""
+        if digest in self._hashes:
+            self._hashes.move_to_end(digest)
+            return False
+        self._hashes[digest] = None
+        if len(self._hashes) > self.capacity:
+            self._hashes.popitem(last=False)
+        return True
+
+    def __len__(self):
+        return len(self._hashes)
+
+class NewsClassifier:
+    """TF-IDF + logistic regression over headlines, predicting category and direction for a whole batch."""
+
+    def __init__(self, vectorizer, category_model, direction_model):
+        self.vectorizer = vectorizer
+        self.category_model = category_model
+        self.direction_model = direction_model
+
+    @classmethod
+    def train(cls, records):
+        """Fit on {"text", "category", "direction"} records (direction is +1/-1 for the team mentioned)."""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+
+        texts = [normalize(r["text"]) for r in records]
+        vectorizer = TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True)
+        features = vectorizer.fit_transform(texts)
+        category_model = LogisticRegression(C=10.0, max_iter=1000).fit(features, [r["category"] for r in records])
+        direction_model = LogisticRegression(C=10.0, max_iter=1000).fit(features, [r["direction"] for r in records])
+        return cls(vectorizer, category_model, direction_model)
+
+    @classmethod
+    def load(cls, path=TRAINING_PATH):
+        with open(path) as f:
+            return cls.train([json.loads(line) for line in f if line.strip()])
+
+    def predict(self, texts):
+        """[(category, category_confidence, direction_score in [-1, 1])] for each text."""
+        if not texts:
+            return []
+        features = self.vectorizer.transform([normalize(t) for t in texts])
+        category_probs = self.category_model.predict_proba(features)
+        positive = list(self.direction_model.classes_).index(1)
+        direction = 2 * self.direction_model.predict_proba(features)[:, positive] - 1
+        return [
+            (self.category_model.classes_[row.argmax()], float(row.max()), float(d))
+            for row, d in zip(category_probs, direction)
+        ]
+
+class FixtureResolver:
+    """Maps team names mentioned in a headline to an upcoming fixture and the side (+1 home, -1 away)."""
+
+    def __init__(self, fixtures):
+        self.sides = {}
+        for fixture_id, home_aliases, away_aliases in fixtures:
+            for aliases, side in ((home_aliases, 1), (away_aliases, -1)):
+                for alias in aliases:
+                    self.sides.setdefault(alias, (fixture_id, side))
+        # Longest alias first so "manchester united" wins over "manchester"
+        aliases = sorted(self.sides, key=len, reverse=True)
+        self.pattern = re.compile(r"\b(" + "|".join(map(re.escape, aliases)) + r")\b") if aliases else None
+
+    @staticmethod
+    def aliases(*names):
+        found = set()
+        for name in names:
+            name = normalize(name)
+            if name:
+                found.add(name)
+                found.add(re.sub(r"\b(fc|afc|cf)\b", "", name).strip())
+        return {alias for alias in found if len(alias) > 2}
+
+    @classmethod
+    def load(cls, now=None):
+        now = (now or datetime.now(timezone.utc)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        conn = get_db_connection()
+        rows = conn.execute(
+            f'SELECT f.id, f.home_team, h.short_name, f.away_team, a.short_name FROM fixtures f '
+            f'LEFT JOIN teams h ON h.id = f.home_team_id LEFT JOIN teams a ON a.id = f.away_team_id '
+            f'WHERE f.utc_date >= ? AND f.status IN ({",".join("?" * len(UPCOMING_STATUSES))}) ORDER BY f.utc_date',
+            (now, *UPCOMING_STATUSES)
+        ).fetchall()
+        return cls([(fixture_id, cls.aliases(home, home_short), cls.aliases(away, away_short))
+                    for fixture_id, home, home_short, away, away_short in rows])
+
+    def resolve(self, text):
+        """(fixture_id, side) for the first team mentioned, or None."""
+        match = self.pattern.search(normalize(text)) if self.pattern else None
+        return self.sides[match.group(1)] if match else None
+
+def load_recent_hashes(limit=NEWS_DEDUP_CAPACITY):
+    conn = get_db_connection()
+    rows = conn.execute('SELECT content_hash FROM news_items ORDER BY created_at DESC LIMIT ?', (limit,)).fetchall()
+    return [row[0] for row in reversed(rows)]
+
+def store_news_items(items):
+    """Insert classified items, skipping hashes already stored; returns the items actually inserted."""
+    conn = get_db_connection()
+    created_at = datetime.now().isoformat()
+    inserted = []
+    with conn:
+        for item in items:
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO news_items (content_hash, fixture_id, category, impact, sr, ss, pi, tr, '
+                'title, published, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (item["content_hash"], item["fixture_id"], item["category"], item["impact"], item["sr"],
+                 item["ss"], item["pi"], item["tr"], item.get("title"), item.get("published"), created_at)
+            )
+            if cursor.rowcount:
+                inserted.append(item)
+    return inserted
+
+def load_news_by_fixture(fixture_ids):
+    """NewsSignalEngine-ready item dicts per fixture, in arrival order."""
+    fixture_ids = list(fixture_ids)
+    if not fixture_ids:
+        return {}
+    conn = get_db_connection()
+    news = {}
+    rows = conn.execute(
+        f'SELECT fixture_id, category, impact, sr, ss, pi, tr FROM news_items '
+        f'WHERE fixture_id IN ({",".join("?" * len(fixture_ids))}) ORDER BY created_at, rowid',
+        fixture_ids
+    )
+    for fixture_id, category, impact, sr, ss, pi, tr in rows:
+        news.setdefault(fixture_id, []).append(
+            {"category": category, "impact": impact, "sr": sr, "ss": ss, "pi": pi, "tr": tr}
+        )
+    return news
+
+class NewsPipeline:
+    """sources -> dedup -> bounded queue -> batched classification -> news_items -> per-fixture updates.
+
+    The bounded queue is the backpressure point: when classification falls behind, sources block
+    on put() instead of buffering a burst in memory.
+    """
+
+    def __init__(self, sources, classifier, on_update=None, queue_size=NEWS_QUEUE_SIZE,
+                 batch_size=NEWS_BATCH_SIZE, batch_wait=NEWS_BATCH_WAIT, seen=None, now=None):
+        self.sources = sources
+        self.classifier = classifier
+        self.on_update = on_update
+        self.queue = asyncio.Queue(queue_size)
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.seen = seen if seen is not None else ContentIndex()
+        self.now = now
+        self._resolver = None
+        self._resolver_built = 0.0
+        self.stats = {"received": 0, "duplicates": 0, "malformed": 0, "unmatched": 0, "stored": 0}
+
+    async def produce(self, source):
+        """Feed one source into the queue; unparseable items are counted and skipped, a failing source only stops itself."""
+        try:
+            async for raw in source.items():
+                self.stats["received"] += 1
+                if raw is None:
+                    self.stats["malformed"] += 1
+                    continue
+                raw["content_hash"] = content_hash(raw)
+                if not self.seen.add(raw["content_hash"]):
+                    self.stats["duplicates"] += 1
+                    continue
+                await self.queue.put(raw)
+        except Exception:
+            logging.exception(f"News source {type(source).__name__} failed")
+
+    async def produce_all(self):
+        try:
+            await asyncio.gather(*(self.produce(source) for source in self.sources))
+        finally:
+            await self.queue.put(_DONE)
+
+    async def batches(self):
+        """Yield lists of up to batch_size items, waiting at most batch_wait for a partial batch to fill."""
+        loop = asyncio.get_running_loop()
+        done = False
+        while not done:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_wait
+            while batch[-1] is not _DONE and len(batch) < self.batch_size:
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), max(0.0, deadline - loop.time())))
+                except asyncio.TimeoutError:
+                    break
+            if batch[-1] is _DONE:
+                batch.pop()
+                done = True
+            if batch:
+                yield batch
+
+    def resolver(self):
+        if self._resolver is None or time.monotonic() - self._resolver_built > NEWS_RESOLVER_TTL:
+            self._resolver = FixtureResolver.load(self.now)
+            self._resolver_built = time.monotonic()
+        return self._resolver
+
+    def process(self, batch):
+        """Blocking: classify a batch, attach fixtures and store; returns the fixture ids that got news."""
+        texts = [f"{raw.get('title') or ''} {raw.get('summary') or ''}" for raw in batch]
+        predictions = self.classifier.predict(texts)
+        resolver = self.resolver()
+        items = []
+        for raw, text, (category, confidence, direction) in zip(batch, texts, predictions):
+            if raw.get("fixture_id") is not None:
+                resolved = raw["fixture_id"], raw.get("side", 1)
+            else:
+                resolved = resolver.resolve(text)
+            if resolved is None:
+                self.stats["unmatched"] += 1
+                continue
+            fixture_id, side = resolved
+            items.append({
+                "content_hash": raw["content_hash"], "fixture_id": fixture_id, "category": category,
+                "impact": side * direction, "sr": raw.get("sr", NEWS_SOURCE_RELIABILITY), "ss": confidence,
+                "pi": raw.get("pi", 1.0), "tr": raw.get("tr", 1.0),
+                "title": raw.get("title"), "published": raw.get("published")
+            })
+        inserted = store_news_items(items)
+        self.stats["stored"] += len(inserted)
+        return {item["fixture_id"] for item in inserted}
+
+    async def run(self):
+        """Consume every source until exhausted (or forever for followed sources)."""
+        producer = asyncio.create_task(self.produce_all())
+        try:
+            async for batch in self.batches():
+                fixture_ids = await run_db(self.process, batch)
+                if fixture_ids and self.on_update:
+                    await self.on_update(fixture_ids)
+        finally:
+            producer.cancel()
+        logging.info(f"News pipeline finished: {self.stats}")
+        return self.stats
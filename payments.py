@@ -1,12 +1,65 @@
-import requests
-import sqlite3
+import asyncio
+import httpx
 import logging
+import random
+import time
 import uuid
 from datetime import datetime, timedelta
-from config import FLW_SECRET_KEY, FLW_CLIENT_ID, DB_PATH, CURRENCY
+from config import (
+    FLW_SECRET_KEY, FLW_CLIENT_ID, FLW_BASE_URL, CURRENCY,
+    FLW_CONNECT_TIMEOUT, FLW_READ_TIMEOUT, FLW_MAX_RETRIES, FLW_RETRY_BACKOFF,
+    FLW_BREAKER_THRESHOLD, FLW_BREAKER_RESET, FLW_POOL_SIZE, TRIAL_PRICE, QUARTERLY_PRICE, MONTHLY_PRICE
+)
+from async_database import run_db
+from database import get_db_connection, invalidate_user_access
+
+PLAN_PRICES = {"trial": TRIAL_PRICE, "quarterly": QUARTERLY_PRICE, "monthly": MONTHLY_PRICE}
+
+class CircuitBreaker:
+    """Stop calling Flutterwave after repeated failures, then let a single probe through."""
+
+    def __init__(self, failure_threshold=FLW_BREAKER_THRESHOLD, reset_timeout=FLW_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        """Closed: always. Open: never. Half-open: one probe at a time, until it succeeds or fails."""
+        state = self.state
+        if state != "half_open":
+            return state == "closed"
+        now = time.monotonic()
+        # A probe that never reported back (its caller was cancelled, say) stops blocking after reset_timeout
+        if self.probe_started is not None and now - self.probe_started < self.reset_timeout:
+            return False
+        self.probe_started = now
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self.probe_started = None
 
 class PaymentManager:
-    BASE_URL = "https://api.flutterwave.com/v3"
+    BASE_URL = FLW_BASE_URL
+    breaker = CircuitBreaker()
+    _client = None
     
     @staticmethod
     def get_headers():
@@ -18,11 +71,54 @@ class PaymentManager:
             headers["X-Client-Id"] = FLW_CLIENT_ID
         return headers
 
+    @classmethod
+    def get_client(cls):
+        """Shared keep-alive client, created on first use inside the running event loop."""
+        if cls._client is None or cls._client.is_closed:
+            cls._client = httpx.AsyncClient(
+                headers=cls.get_headers(),
+                timeout=httpx.Timeout(FLW_READ_TIMEOUT, connect=FLW_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=FLW_POOL_SIZE, max_keepalive_connections=FLW_POOL_SIZE)
+            )
+        return cls._client
+
+    @classmethod
+    async def close(cls):
+        if cls._client is not None:
+            await cls._client.aclose()
+            cls._client = None
+
+    @classmethod
+    async def request(cls, method, path, **kwargs):
+        """Call Flutterwave with bounded, jittered retries behind the circuit breaker."""
+        if not cls.breaker.allow():
+            raise httpx.TransportError("Flutterwave circuit breaker is open; payments are temporarily unavailable")
+
+        for attempt in range(FLW_MAX_RETRIES + 1):
+            try:
+                response = await cls.get_client().request(method, f"{cls.BASE_URL}{path}", **kwargs)
+                # Only gateway-side trouble is worth retrying; 4xx answers are final
+                if response.status_code < 500 and response.status_code != 429:
+                    cls.breaker.record_success()
+                    return response.json()
+                error = httpx.HTTPStatusError(
+                    f"Flutterwave returned {response.status_code}", request=response.request, response=response
+                )
+            except httpx.TransportError as e:
+                error = e
+
+            cls.breaker.record_failure()
+            if attempt == FLW_MAX_RETRIES or not cls.breaker.allow():
+                raise error
+            # Full jitter keeps many retrying handlers from hitting the gateway in lockstep
+            delay = random.uniform(0, FLW_RETRY_BACKOFF * 2 ** attempt)
+            logging.warning(f"Flutterwave {method} {path} failed ({error}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
     @staticmethod
-    def initialize_transaction(email, amount, metadata):
+    async def initialize_transaction(email, amount, metadata):
         """Initialize a transaction with Flutterwave."""
         tx_ref = str(uuid.uuid4())
-        url = f"{PaymentManager.BASE_URL}/payments"
         
         data = {
             "tx_ref": tx_ref,
@@ -42,8 +138,7 @@ class PaymentManager:
         
         logging.info(f"Initializing Flutterwave transaction for {email} with amount {amount}")
         try:
-            response = requests.post(url, headers=PaymentManager.get_headers(), json=data)
-            res_json = response.json()
+            res_json = await PaymentManager.request("POST", "/payments", json=data)
             if res_json.get('status') == 'success':
                 # Add tx_ref to response for verification later
                 res_json['data']['reference'] = tx_ref
@@ -56,22 +151,17 @@ class PaymentManager:
             return {"status": False, "message": str(e)}
 
     @staticmethod
-    def verify_transaction(transaction_id):
+    async def verify_transaction(transaction_id):
         """Verify a transaction with Flutterwave using the transaction ID."""
-        url = f"{PaymentManager.BASE_URL}/transactions/{transaction_id}/verify"
         try:
-            response = requests.get(url, headers=PaymentManager.get_headers())
-            return response.json()
+            return await PaymentManager.request("GET", f"/transactions/{transaction_id}/verify")
         except Exception as e:
             logging.error(f"Verification Exception: {e}")
             return {"status": "error", "message": str(e)}
 
     @staticmethod
-    def activate_subscription(telegram_id, plan_type):
-        """Update user status in database after successful payment."""
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
+    def subscription_terms(plan_type):
+        """(expiry_date, expiry_ts, trial_used) for a plan bought now."""
         if plan_type == "trial":
             days = 30
             trial_used = 1
@@ -81,15 +171,69 @@ class PaymentManager:
         else:
             days = 30
             trial_used = 0
-            
-        expiry_date = (datetime.now() + timedelta(days=days)).isoformat()
-        
-        cursor.execute('''
-            UPDATE users 
-            SET is_subscribed = 1, expiry_date = ?, trial_used = ? 
-            WHERE telegram_id = ?
-        ''', (expiry_date, trial_used, telegram_id))
+        expiry = datetime.now() + timedelta(days=days)
+        return expiry.isoformat(), int(expiry.timestamp()), trial_used
+
+    @staticmethod
+    def activate_subscription(telegram_id, plan_type):
+        """Update user status in database after successful payment."""
+        conn = get_db_connection()
+        expiry_date, expiry_ts, trial_used = PaymentManager.subscription_terms(plan_type)
         
-        conn.commit()
-        conn.close()
+        with conn:
+            conn.execute('''
+                UPDATE users 
+                SET is_subscribed = 1, expiry_date = ?, expiry_ts = ?, trial_used = ? 
+                WHERE telegram_id = ?
+            ''', (expiry_date, expiry_ts, trial_used, telegram_id))
+        invalidate_user_access(telegram_id)
+        return expiry_date
+
+    @staticmethod
+    def activate_transaction(transaction_id, telegram_id, plan_type):
+        """Activate a subscription at most once per Flutterwave transaction; returns the expiry, or None if seen."""
+        conn = get_db_connection()
+        expiry_date, expiry_ts, trial_used = PaymentManager.subscription_terms(plan_type)
+        with conn:
+            claimed = conn.execute(
+                'INSERT OR IGNORE INTO processed_payments (transaction_id, telegram_id, plan, processed_at) '
+                'VALUES (?, ?, ?, ?)', (transaction_id, telegram_id, plan_type, datetime.now().isoformat())
+            ).rowcount
+            if not claimed:
+                return None
+            conn.execute(
+                'UPDATE users SET is_subscribed = 1, expiry_date = ?, expiry_ts = ?, trial_used = ? WHERE telegram_id = ?',
+                (expiry_date, expiry_ts, trial_used, telegram_id)
+            )
+        invalidate_user_access(telegram_id)
         return expiry_date
+
+    @staticmethod
+    async def settle_payment(transaction_id, telegram_id=None):
+        """Re-verify a transaction with Flutterwave, then activate it at most once.
+
+        Used by both the webhook and /verify. With telegram_id (the /verify caller), the transaction must have been
+        started by that user. Returns {"status": "activated" | "already_processed" | "wrong_user" | "invalid",
+        "telegram_id": ..., "expiry": ...}.
+        """
+        res = await PaymentManager.verify_transaction(transaction_id)
+        data = res.get("data") or {}
+        if res.get("status") != "success" or data.get("status") != "successful":
+            logging.warning(f"Transaction {transaction_id} did not verify: {res.get('message')}")
+            return {"status": "invalid"}
+
+        meta = data.get("meta") or {}
+        plan, user_id = meta.get("plan"), meta.get("user_id")
+        if plan not in PLAN_PRICES or user_id is None:
+            logging.warning(f"Transaction {transaction_id} has no Eaglens plan metadata")
+            return {"status": "invalid"}
+        if data.get("currency") != CURRENCY or float(data.get("amount") or 0) < PLAN_PRICES[plan]:
+            logging.warning(f"Transaction {transaction_id} paid {data.get('amount')} {data.get('currency')} "
+                            f"for the {plan} plan")
+            return {"status": "invalid"}
+        if telegram_id is not None and int(user_id) != telegram_id:
+            logging.warning(f"User {telegram_id} tried to redeem transaction {transaction_id} of user {user_id}")
+            return {"status": "wrong_user"}
+
+        expiry = await run_db(PaymentManager.activate_transaction, str(transaction_id), int(user_id), plan)
+        return {"status": "activated" if expiry else "already_processed", "telegram_id": int(user_id), "expiry": expiry}
@@ -0,0 +1,102 @@
+import json
+from telegram.ext import BasePersistence, PersistenceInput
+from async_database import run_db
+from database import get_db_connection
+from config import PERSISTENCE_UPDATE_INTERVAL
+
+def _load_rows(table, key_column):
+    conn = get_db_connection()
+    return {key: json.loads(data) for key, data in conn.execute(f'SELECT {key_column}, data FROM {table}')}
+
+def _save_row(table, key_column, key, data):
+    conn = get_db_connection()
+    with conn:
+        conn.execute(
+            f'INSERT INTO {table} ({key_column}, data) VALUES (?, ?) '
+            f'ON CONFLICT({key_column}) DO UPDATE SET data = excluded.data',
+            (key, json.dumps(data))
+        )
+
+def _drop_row(table, key_column, key):
+    conn = get_db_connection()
+    with conn:
+        conn.execute(f'DELETE FROM {table} WHERE {key_column} = ?', (key,))
+
+def _load_conversations(name):
+    conn = get_db_connection()
+    rows = conn.execute('SELECT conversation_key, state FROM persistence_conversations WHERE name = ?', (name,))
+    return {tuple(json.loads(key)): json.loads(state) for key, state in rows}
+
+def _save_conversation(name, key, state):
+    conn = get_db_connection()
+    with conn:
+        if state is None:
+            conn.execute('DELETE FROM persistence_conversations WHERE name = ? AND conversation_key = ?',
+                         (name, json.dumps(list(key))))
+        else:
+            conn.execute(
+                'INSERT INTO persistence_conversations (name, conversation_key, state) VALUES (?, ?, ?) '
+                'ON CONFLICT(name, conversation_key) DO UPDATE SET state = excluded.state',
+                (name, json.dumps(list(key)), json.dumps(state))
+            )
+
+class SQLitePersistence(BasePersistence):
+    """user_data, chat_data and conversation states kept in the bot's SQLite database as JSON.
+
+    bot_data holds live objects (HTTP clients, the materializer) and is never persisted. Updates are
+    sharded by user, so a user's data is only ever written by the worker that owns them.
+    """
+
+    def __init__(self, update_interval=PERSISTENCE_UPDATE_INTERVAL):
+        super().__init__(store_data=PersistenceInput(bot_data=False, callback_data=False),
+                         update_interval=update_interval)
+
+    async def get_user_data(self):
+        return await run_db(_load_rows, "persistence_user_data", "user_id")
+
+    async def get_chat_data(self):
+        return await run_db(_load_rows, "persistence_chat_data", "chat_id")
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        return await run_db(_load_conversations, name)
+
+    async def update_user_data(self, user_id, data):
+        await run_db(_save_row, "persistence_user_data", "user_id", user_id, data)
+
+    async def update_chat_data(self, chat_id, data):
+        await run_db(_save_row, "persistence_chat_data", "chat_id", chat_id, data)
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def update_conversation(self, name, key, new_state):
+        await run_db(_save_conversation, name, key, new_state)
+
+    async def drop_user_data(self, user_id):
+        await run_db(_drop_row, "persistence_user_data", "user_id", user_id)
+
+    async def drop_chat_data(self, chat_id):
+        await run_db(_drop_row, "persistence_chat_data", "chat_id", chat_id)
+
+    async def refresh_user_data(self, user_id, user_data):
+        # The owning worker's in-memory copy is authoritative; nothing else writes this user's row
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        # Every update_* call already committed
+        pass
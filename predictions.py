@@ -0,0 +1,248 @@
+import json
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from database import get_db_connection
+from fixtures import FINISHED, UPCOMING_STATUSES, get_finished_fixtures
+from news import load_news_by_fixture
+from config import (
+    MODEL_VERSION, PREDICTION_HORIZON_DAYS, DEFAULT_HOME_EXP_GOALS, DEFAULT_AWAY_EXP_GOALS, STRENGTH_REFIT_HOURS,
+    STRENGTH_ONLINE_MAX_RESULTS
+)
+
+# bot.py imports this module for the read paths, so the numpy/scipy-backed modules (calibration, signals, strength)
+# are imported by PredictionMaterializer when it is first built, off the event loop
+OUTCOMES = ("home", "draw", "away")
+
+def _utc(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def load_upcoming_fixtures(now=None, horizon_days=PREDICTION_HORIZON_DAYS):
+    """Fixtures that still need a prediction, from now to the end of the horizon."""
+    now = now or datetime.now(timezone.utc)
+    conn = get_db_connection()
+    return conn.execute(
+        f'SELECT id, competition_id, utc_date, home_team, away_team FROM fixtures '
+        f'WHERE utc_date >= ? AND utc_date < ? AND status IN ({",".join("?" * len(UPCOMING_STATUSES))}) '
+        f'ORDER BY utc_date, id',
+        (_utc(now - timedelta(hours=3)), _utc(now + timedelta(days=horizon_days)), *UPCOMING_STATUSES)
+    ).fetchall()
+
+def data_fingerprint():
+    """Cheap summary of the fixture store that changes whenever any fixture row does."""
+    conn = get_db_connection()
+    return tuple(conn.execute('SELECT COUNT(*), MAX(last_updated) FROM fixtures').fetchone())
+
+def expected_goals(strength_models, competition_id, home_team, away_team):
+    model = (strength_models or {}).get(competition_id)
+    if model is None:
+        return DEFAULT_HOME_EXP_GOALS, DEFAULT_AWAY_EXP_GOALS
+    return model.expected_goals(home_team, away_team)
+
+def compute_predictions(engine, news_engine, fixtures, news_by_fixture=None, strength_models=None):
+    """Predict a slate in one batch, gated per league, and apply any news shifts; returns (fixture_id, prediction) pairs."""
+    news_by_fixture = news_by_fixture or {}
+    goals = [expected_goals(strength_models, competition_id, home_team, away_team)
+             for _, competition_id, _, home_team, away_team in fixtures]
+    predictions = engine.predict_many([
+        (home_team, away_team, *g, competition_id)
+        for (_, competition_id, _, home_team, away_team), g in zip(fixtures, goals)
+    ])
+
+    results = []
+    for (fixture_id, _, utc_date, home_team, away_team), g, prediction in zip(fixtures, goals, predictions):
+        prediction = {**prediction, "fixture_id": fixture_id, "utc_date": utc_date,
+                      "home_team": home_team, "away_team": away_team, "expected_goals": list(g)}
+        results.append((fixture_id, prediction))
+
+    apply_news(news_engine, [p for fixture_id, p in results if news_by_fixture.get(fixture_id)], news_by_fixture)
+    return results
+
+def apply_news(news_engine, predictions, news_by_fixture):
+    """Shift predictions' probabilities (suppressed ones' too, for calibration) by their fixtures' news in one pass."""
+    predictions = [p for p in predictions if "probabilities" in p]
+    if not predictions:
+        return
+    columns = news_engine.encode_news([news_by_fixture.get(p["fixture_id"], []) for p in predictions])
+    base = [[p.get("base_probabilities", p["probabilities"])[k] for k in OUTCOMES] for p in predictions]
+    shifted, total_shift = news_engine.apply_signal_shift_batch(base, **columns)
+    for prediction, probs, shift in zip(predictions, shifted, total_shift):
+        prediction["base_probabilities"] = prediction.get("base_probabilities", prediction["probabilities"])
+        prediction["probabilities"] = dict(zip(OUTCOMES, probs.tolist()))
+        prediction["news_shift"] = float(shift)
+
+def store_predictions(results, model_version=MODEL_VERSION):
+    conn = get_db_connection()
+    computed_at = datetime.now().isoformat()
+    with conn:
+        conn.executemany(
+            'INSERT INTO predictions (fixture_id, model_version, status, payload, computed_at) '
+            'VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT(fixture_id, model_version) DO UPDATE SET status = excluded.status, '
+            'payload = excluded.payload, computed_at = excluded.computed_at',
+            [(fixture_id, model_version, prediction["status"], json.dumps(prediction), computed_at)
+             for fixture_id, prediction in results]
+        )
+
+def _read_predictions(query, params):
+    conn = get_db_connection()
+    return [json.loads(row[0]) for row in conn.execute(query, params)]
+
+def get_predictions_for_date(day, model_version=MODEL_VERSION):
+    """Ready-made predictions for fixtures kicking off on a UTC calendar day."""
+    start = datetime.combine(day, datetime.min.time())
+    return _read_predictions(
+        'SELECT p.payload FROM fixtures f JOIN predictions p ON p.fixture_id = f.id AND p.model_version = ? '
+        'WHERE f.utc_date >= ? AND f.utc_date < ? ORDER BY f.utc_date, f.id',
+        (model_version, _utc(start), _utc(start + timedelta(days=1)))
+    )
+
+def get_upcoming_predictions(limit=5, model_version=MODEL_VERSION, now=None):
+    now = now or datetime.now(timezone.utc)
+    return _read_predictions(
+        f'SELECT p.payload FROM fixtures f JOIN predictions p ON p.fixture_id = f.id AND p.model_version = ? '
+        f'WHERE f.utc_date >= ? AND f.status IN ({",".join("?" * len(UPCOMING_STATUSES))}) '
+        f'ORDER BY f.utc_date, f.id LIMIT ?',
+        (model_version, _utc(now), *UPCOMING_STATUSES, limit)
+    )
+
+def get_prediction(fixture_id, model_version=MODEL_VERSION):
+    predictions = _read_predictions(
+        'SELECT payload FROM predictions WHERE fixture_id = ? AND model_version = ?', (fixture_id, model_version)
+    )
+    return predictions[0] if predictions else None
+
+def load_unsettled_predictions(model_version=MODEL_VERSION):
+    """Finished fixtures with a stored prediction not yet folded into calibration.
+
+    Suppressed predictions are settled too: the gates read these metrics, so settling only published predictions
+    would leave a gated league without any new results to reopen on.
+    """
+    conn = get_db_connection()
+    return conn.execute(
+        'SELECT f.id, f.competition_id, f.home_score, f.away_score, p.payload FROM fixtures f '
+        'JOIN predictions p ON p.fixture_id = f.id AND p.model_version = ? '
+        "WHERE f.status = ? AND f.home_score IS NOT NULL AND json_extract(p.payload, '$.probabilities') IS NOT NULL "
+        'AND f.id NOT IN (SELECT fixture_id FROM calibration_settled) ORDER BY f.utc_date, f.id',
+        (model_version, FINISHED)
+    ).fetchall()
+
+def apply_news_updates(news_engine, fixture_ids, model_version=MODEL_VERSION):
+    """Re-shift just the stored predictions whose fixtures received news; returns how many were rewritten."""
+    fixture_ids = list(fixture_ids)
+    conn = get_db_connection()
+    rows = conn.execute(
+        f'SELECT fixture_id, payload FROM predictions WHERE model_version = ? '
+        f'AND fixture_id IN ({",".join("?" * len(fixture_ids))})',
+        (model_version, *fixture_ids)
+    ).fetchall()
+    predictions = [json.loads(payload) for _, payload in rows]
+    apply_news(news_engine, predictions, load_news_by_fixture(fixture_ids))
+    store_predictions([(p["fixture_id"], p) for p in predictions], model_version)
+    return len(predictions)
+
+class PredictionMaterializer:
+    """Recompute the predictions table only when fixture data or calibration has changed."""
+
+    def __init__(self, engine, news_engine, model_version=MODEL_VERSION):
+        self.engine = engine
+        self.news_engine = news_engine
+        self.model_version = model_version
+        self.strength_models = {}
+        self._fitted_fixture_ids = set()
+        self._last_full_fit = None
+        self._fitted_through = ""
+        self._last_fingerprint = None
+        # The repeating job and the one-off run after a fixture change may land on different DB threads
+        self._refresh_lock = threading.Lock()
+        from calibration import CalibrationTracker
+        from signals import AssumptionRegistry
+        self.calibration = CalibrationTracker.load()
+        self.assumptions = AssumptionRegistry.load()
+        self.apply_calibration()
+
+    def fingerprint(self):
+        league_metrics = tuple(sorted((league, tuple(sorted(m.items())))
+                                      for league, m in self.engine.league_metrics.items()))
+        return (data_fingerprint(), tuple(sorted(self.engine.calibration_metrics.items())), league_metrics,
+                tuple(sorted(self.engine.assumption_weights.items())), self.model_version)
+
+    def apply_calibration(self):
+        """Point the engine's gates and assumption weights at the tracked state, once there is any."""
+        from calibration import ALL_LEAGUES
+        self.engine.league_metrics = self.calibration.league_metrics()
+        aggregate = self.calibration.metrics(ALL_LEAGUES)
+        if aggregate is not None:
+            self.engine.calibration_metrics = aggregate
+        self.engine.set_assumption_weights(self.assumptions.weights())
+
+    def settle_results(self):
+        """Score stored predictions against newly finished results; returns how many were settled."""
+        from calibration import ALL_LEAGUES
+        rows = load_unsettled_predictions(self.model_version)
+        if not rows:
+            return 0
+        settled = []
+        for fixture_id, competition_id, home_goals, away_goals, payload in rows:
+            prediction = json.loads(payload)
+            exp_goals = prediction.get("expected_goals", (DEFAULT_HOME_EXP_GOALS, DEFAULT_AWAY_EXP_GOALS))
+            self.calibration.settle(competition_id, prediction["probabilities"], home_goals, away_goals, sum(exp_goals))
+            settled.append((fixture_id, competition_id))
+        self.calibration.save({league for _, league in settled} | {ALL_LEAGUES}, settled)
+        self.assumptions.evaluate_all(self.calibration.metrics(ALL_LEAGUES))
+        self.assumptions.save()
+        self.apply_calibration()
+        logging.info(f"Settled {len(settled)} predictions into rolling calibration")
+        return len(settled)
+
+    def update_strengths(self):
+        """Warm-started full refit at most every STRENGTH_REFIT_HOURS; online updates for new results otherwise.
+
+        Online updates carry no time decay, so a large batch or results older than what is already fitted (a season
+        backfill) force a full refit instead.
+        """
+        from strength import fit_strength_models, update_strength_models
+        finished = get_finished_fixtures()
+        new_results = [row for row in finished if row[0] not in self._fitted_fixture_ids]
+        if not new_results:
+            return
+        now = datetime.now()
+        if (self._last_full_fit is None or now - self._last_full_fit >= timedelta(hours=STRENGTH_REFIT_HOURS)
+                or len(new_results) > STRENGTH_ONLINE_MAX_RESULTS
+                or min(row[3] for row in new_results) < self._fitted_through):
+            self.strength_models = fit_strength_models(finished, previous=self.strength_models)
+            self._last_full_fit = now
+        else:
+            update_strength_models(self.strength_models, new_results)
+        self._fitted_fixture_ids.update(row[0] for row in new_results)
+        self._fitted_through = max(self._fitted_through, max(row[3] for row in new_results))
+
+    def refresh(self, force=False, now=None):
+        """Blocking refresh; returns the number of predictions written (0 when nothing changed).
+
+        Concurrent calls run one after the other, so results are settled once and the strength models are never
+        refitted by two threads at the same time.
+        """
+        with self._refresh_lock:
+            return self._refresh(force, now)
+
+    def apply_news_updates(self, fixture_ids):
+        """Blocking: re-shift the predictions of fixtures that just got news, never interleaved with a refresh."""
+        with self._refresh_lock:
+            return apply_news_updates(self.news_engine, fixture_ids, self.model_version)
+
+    def _refresh(self, force, now):
+        self.settle_results()
+        fingerprint = self.fingerprint()
+        if not force and fingerprint == self._last_fingerprint:
+            return 0
+        self.update_strengths()
+        fixtures = load_upcoming_fixtures(now)
+        news_by_fixture = load_news_by_fixture(row[0] for row in fixtures)
+        results = compute_predictions(
+            self.engine, self.news_engine, fixtures, news_by_fixture, self.strength_models
+        )
+        store_predictions(results, self.model_version)
+        self._last_fingerprint = fingerprint
+        logging.info(f"Materialized {len(results)} predictions for model {self.model_version}")
+        return len(results)
@@ -0,0 +1,80 @@
+import numpy as np
+from config import (
+    GATE_RULES, CONFIDENCE_BASE, CONFIDENCE_RULES, LEAGUE_GATE_OVERRIDES, LEAGUE_CONFIDENCE_OVERRIDES
+)
+
+def _sign(comparison):
+    # a > t  <=>  sign*a > sign*t with sign=1; a < t with sign=-1
+    if comparison == ">":
+        return 1.0
+    if comparison == "<":
+        return -1.0
+    raise ValueError(f"Unsupported comparison: {comparison}")
+
+class RuleTable:
+    """Gate and confidence rules compiled once into threshold arrays, with per-league overrides."""
+
+    def __init__(self, gate_rules=GATE_RULES, confidence_rules=CONFIDENCE_RULES, base_confidence=CONFIDENCE_BASE,
+                 gate_overrides=LEAGUE_GATE_OVERRIDES, confidence_overrides=LEAGUE_CONFIDENCE_OVERRIDES):
+        self.metrics = tuple(dict.fromkeys(rule[0] for rule in (*gate_rules, *confidence_rules)))
+        column = {metric: i for i, metric in enumerate(self.metrics)}
+
+        self.gate_metrics = tuple(rule[0] for rule in gate_rules)
+        self.gate_columns = np.array([column[rule[0]] for rule in gate_rules], dtype=int)
+        self.gate_signs = np.array([_sign(rule[1]) for rule in gate_rules])
+        self.gate_thresholds = np.array([rule[2] for rule in gate_rules], dtype=float)
+        self.gate_reasons = tuple(rule[3] for rule in gate_rules)
+
+        self.confidence_metrics = tuple(rule[0] for rule in confidence_rules)
+        self.confidence_columns = np.array([column[rule[0]] for rule in confidence_rules], dtype=int)
+        self.confidence_signs = np.array([_sign(rule[1]) for rule in confidence_rules])
+        self.confidence_thresholds = np.array([rule[2] for rule in confidence_rules], dtype=float)
+        self.penalties = np.array([rule[4] if rule[3] == "penalty" else 0 for rule in confidence_rules], dtype=float)
+        self.caps = np.array([rule[4] if rule[3] == "cap" else np.inf for rule in confidence_rules], dtype=float)
+        self.base_confidence = base_confidence
+
+        self.gate_overrides = gate_overrides
+        self.confidence_overrides = confidence_overrides
+        self._league_thresholds = {}
+
+    def thresholds(self, league):
+        """(gate_thresholds, confidence_thresholds) for a league, compiled on first use."""
+        compiled = self._league_thresholds.get(league)
+        if compiled is None:
+            gate = self.gate_thresholds.copy()
+            for i, metric in enumerate(self.gate_metrics):
+                gate[i] = self.gate_overrides.get(league, {}).get(metric, gate[i])
+            confidence = self.confidence_thresholds.copy()
+            for i, metric in enumerate(self.confidence_metrics):
+                confidence[i] = self.confidence_overrides.get(league, {}).get(metric, confidence[i])
+            compiled = self._league_thresholds[league] = (gate, confidence)
+        return compiled
+
+    def metric_vector(self, metrics):
+        return tuple(metrics[metric] for metric in self.metrics)
+
+    def evaluate(self, metric_rows, leagues):
+        """Gate and score many leagues in one pass; returns (reliable, reasons, confidences) per row."""
+        if not metric_rows:
+            return [], [], []
+        values = np.array([self.metric_vector(m) for m in metric_rows], dtype=float)
+        thresholds = [self.thresholds(league) for league in leagues]
+        gate_thresholds = np.array([t[0] for t in thresholds])
+        confidence_thresholds = np.array([t[1] for t in thresholds])
+
+        # Gates: the first violated rule (in table order) supplies the reason
+        violated = self.gate_signs * values[:, self.gate_columns] > self.gate_signs * gate_thresholds
+        reliable = ~violated.any(axis=1)
+        first = violated.argmax(axis=1)
+        reasons = [
+            None if ok else self.gate_reasons[rule].format(threshold=gate_thresholds[row, rule])
+            for row, (ok, rule) in enumerate(zip(reliable, first))
+        ]
+
+        # Confidence: base minus triggered penalties, then the lowest triggered cap
+        triggered = (self.confidence_signs * values[:, self.confidence_columns]
+                     > self.confidence_signs * confidence_thresholds)
+        confidence = self.base_confidence - (triggered * self.penalties).sum(axis=1)
+        confidence = np.minimum(confidence, np.where(triggered, self.caps, np.inf).min(axis=1))
+        confidence = np.maximum(confidence, 0)
+        return reliable.tolist(), reasons, [int(c) for c in confidence]
@@ -0,0 +1,142 @@
+import re
+import time
+import unicodedata
+from datetime import datetime, timedelta, timezone
+from database import get_db_connection
+from fixtures import UPCOMING_STATUSES
+from news import normalize
+from config import SEARCH_ALIASES, SEARCH_LOOKBACK_HOURS, SEARCH_MIN_SIMILARITY, SEARCH_RESULTS
+
+SEARCH_STATUSES = UPCOMING_STATUSES + ("IN_PLAY", "PAUSED")
+STOP_WORDS = {"vs", "v", "versus", "against", "fc", "afc", "cf"}
+
+def fold(text):
+    """normalize() with accents removed, so "munchen" finds "München"."""
+    return normalize(unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode())
+
+def trigrams(term):
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class SearchIndex:
+    """In-memory fuzzy index over upcoming and live fixtures, keyed by team names, short names, TLAs and aliases.
+
+    Lookups are dictionary hits on a prefix map, falling back to trigram similarity for typos, so a search never
+    touches SQLite. refresh() re-reads the fixture window and only re-indexes rows that changed.
+    """
+
+    def __init__(self, aliases=SEARCH_ALIASES, min_similarity=SEARCH_MIN_SIMILARITY):
+        self.aliases = {fold(alias): fold(target) for alias, target in aliases.items()}
+        self.min_similarity = min_similarity
+        self.fixtures = {}  # fixture_id -> (row, home key, away key)
+        self.team_fixtures = {}  # team key -> fixture ids
+        self.teams = set()
+        self.term_teams = {}  # term -> team keys
+        self.prefixes = {}  # prefix -> terms
+        self.trigrams = {}  # trigram -> terms
+        self.refreshed_at = 0.0
+
+    def team_terms(self, name, short_name=None, tla=None):
+        key = fold(name)
+        names = {fold(name), fold(short_name), fold(tla)}
+        names |= {re.sub(r"\b(fc|afc|cf)\b", "", n).strip() for n in names}
+        names |= {alias for alias, target in self.aliases.items() if target in key}
+        terms = {n for n in names if n}
+        # Single words too, so "united" or "madrid" alone find their teams
+        terms |= {word for n in names for word in n.split() if len(word) > 2 and word not in STOP_WORDS}
+        return terms
+
+    def add_team(self, name, short_name=None, tla=None):
+        key = fold(name)
+        if key in self.teams:
+            return key
+        self.teams.add(key)
+        for term in self.team_terms(name, short_name, tla):
+            if term not in self.term_teams:
+                for i in range(1, len(term) + 1):
+                    self.prefixes.setdefault(term[:i], set()).add(term)
+                for gram in trigrams(term):
+                    self.trigrams.setdefault(gram, set()).add(term)
+            self.term_teams.setdefault(term, set()).add(key)
+        return key
+
+    def add_fixture(self, row):
+        """Index (fixture_id, utc_date, status, home, home_short, home_tla, away, away_short, away_tla)."""
+        fixture_id, _, _, home, home_short, home_tla, away, away_short, away_tla = row
+        self.remove_fixture(fixture_id)
+        home_key = self.add_team(home, home_short, home_tla)
+        away_key = self.add_team(away, away_short, away_tla)
+        self.fixtures[fixture_id] = (row, home_key, away_key)
+        for key in (home_key, away_key):
+            self.team_fixtures.setdefault(key, set()).add(fixture_id)
+
+    def remove_fixture(self, fixture_id):
+        entry = self.fixtures.pop(fixture_id, None)
+        if entry is not None:
+            for key in entry[1:]:
+                self.team_fixtures.get(key, set()).discard(fixture_id)
+
+    @staticmethod
+    def load_rows(now=None, lookback_hours=SEARCH_LOOKBACK_HOURS):
+        since = ((now or datetime.now(timezone.utc)) - timedelta(hours=lookback_hours)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        conn = get_db_connection()
+        return conn.execute(
+            f'SELECT f.id, f.utc_date, f.status, f.home_team, h.short_name, h.tla, f.away_team, a.short_name, a.tla '
+            f'FROM fixtures f LEFT JOIN teams h ON h.id = f.home_team_id LEFT JOIN teams a ON a.id = f.away_team_id '
+            f'WHERE f.utc_date >= ? AND f.status IN ({",".join("?" * len(SEARCH_STATUSES))})',
+            (since, *SEARCH_STATUSES)
+        ).fetchall()
+
+    def refresh(self, rows=None, now=None):
+        """Bring the index in line with load_rows(); returns how many fixtures were added, changed or dropped.
+
+        Pass rows read elsewhere to keep the SQL off the thread that serves searches.
+        """
+        rows = {row[0]: row for row in (self.load_rows(now) if rows is None else rows)}
+        changed = 0
+        for fixture_id in [f for f in self.fixtures if f not in rows]:
+            self.remove_fixture(fixture_id)
+            changed += 1
+        for fixture_id, row in rows.items():
+            entry = self.fixtures.get(fixture_id)
+            if entry is None or entry[0] != row:
+                self.add_fixture(row)
+                changed += 1
+        self.refreshed_at = time.monotonic()
+        return changed
+
+    def match_terms(self, token):
+        """{term: score} for one query token: exact and prefix hits first, trigram similarity for typos."""
+        terms = self.prefixes.get(token)
+        if terms:
+            return {term: 1.0 if term == token else 0.8 + 0.2 * len(token) / len(term) for term in terms}
+        grams = trigrams(token)
+        shared = {}
+        for gram in grams:
+            for term in self.trigrams.get(gram, ()):
+                shared[term] = shared.get(term, 0) + 1
+        scores = {}
+        for term, common in shared.items():
+            similarity = 2 * common / (len(grams) + len(term) + 1)
+            if similarity >= self.min_similarity:
+                scores[term] = 0.7 * similarity
+        return scores
+
+    def search(self, query, limit=SEARCH_RESULTS):
+        """Best fixtures for a free-text query as (fixture_id, home, away, utc_date), most relevant first."""
+        tokens = [t for t in fold(query).split() if t not in STOP_WORDS]
+        # Adjacent pairs catch multi-word names and aliases ("man utd", "real madrid")
+        phrases = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        team_scores = {}
+        for phrase in phrases:
+            for term, score in self.match_terms(phrase).items():
+                for key in self.term_teams[term]:
+                    if score > team_scores.get(key, 0.0):
+                        team_scores[key] = score
+
+        fixture_scores = {}
+        for key, score in team_scores.items():
+            for fixture_id in self.team_fixtures.get(key, ()):
+                fixture_scores[fixture_id] = fixture_scores.get(fixture_id, 0.0) + score
+        ranked = sorted(fixture_scores, key=lambda f: (-fixture_scores[f], self.fixtures[f][0][1], f))[:limit]
+        return [(f, self.fixtures[f][0][3], self.fixtures[f][0][6], self.fixtures[f][0][1]) for f in ranked]
@@ -1,5 +1,10 @@
+import numpy as np
+from datetime import datetime
+from database import get_db_connection
 from config import *
 
+OUTCOMES = ("home", "draw", "away")
+
 class NewsSignalEngine:
     CATEGORIES = {
         "LINEUP_AVAILABILITY": 0.12,
@@ -9,6 +14,9 @@ class NewsSignalEngine:
         "EXTERNAL_CONDITIONS": 0.04,
         "MARKET_NOISE": 0.02
     }
+    # Category code i is CATEGORY_CODES[i]; -1 marks an unknown category, which shifts nothing
+    CATEGORY_CODES = tuple(CATEGORIES)
+    MAX_SHIFTS = np.array(list(CATEGORIES.values()) + [0.0])
 
     def calculate_nss(self, sr, ss, pi, tr):
         """Calculate News Signal Score: SR × SS × PI × TR."""
@@ -55,20 +63,118 @@ class NewsSignalEngine:
             
         return shifted_probs, total_shift
 
-class AssumptionRegistry:
-    def __init__(self):
-        self.assumptions = {
-            "home_advantage": {"status": "active", "weight": 1.0},
-            "recent_form": {"status": "active", "weight": 1.0},
-            "elo_predictive": {"status": "active", "weight": 1.0}
+    def encode_news(self, news_lists):
+        """Flatten per-fixture lists of news item dicts into the columns apply_signal_shift_batch takes."""
+        rows = [(i, item) for i, items in enumerate(news_lists) for item in items]
+        codes = {category: code for code, category in enumerate(self.CATEGORY_CODES)}
+        return {
+            "fixture_index": np.array([i for i, _ in rows], dtype=int),
+            "category": np.array([codes.get(item.get("category"), -1) for _, item in rows], dtype=int),
+            "impact": np.array([item.get("impact") or 0.0 for _, item in rows], dtype=float),
+            **{field: np.array([item.get(field, 1) for _, item in rows], dtype=float)
+               for field in ("sr", "ss", "pi", "tr")}
         }
 
+    def apply_signal_shift_batch(self, base_probs, fixture_index, category, impact, sr=1.0, ss=1.0, pi=1.0, tr=1.0):
+        """apply_signal_shift for a whole slate: base_probs is (n_fixtures, 3) in home/draw/away order.
+
+        News items are columns keyed by fixture_index; returns (shifted_probs, total_shift) arrays.
+        """
+        base_probs = np.asarray(base_probs, dtype=float)
+        n = len(base_probs)
+        shift = self.MAX_SHIFTS[category] * impact * self.calculate_nss(sr, ss, pi, tr)
+
+        # Each item moves home/away by +/-shift and draw by -0.2|shift|, so only the per-fixture sums matter
+        favour_home = np.bincount(fixture_index, np.maximum(shift, 0.0), n)
+        favour_away = np.bincount(fixture_index, np.maximum(-shift, 0.0), n)
+        total_shift = favour_home + favour_away
+
+        shifted = base_probs + np.stack([
+            favour_home - 0.8 * favour_away,
+            -0.2 * total_shift,
+            favour_away - 0.8 * favour_home
+        ], axis=1)
+        shifted = np.maximum(shifted, 0.01)
+        return shifted / shifted.sum(axis=1, keepdims=True), total_shift
+
+class AssumptionRegistry:
+    DEFAULTS = {
+        "home_advantage": {"status": "active", "weight": 1.0},
+        "recent_form": {"status": "active", "weight": 1.0},
+        "elo_predictive": {"status": "active", "weight": 1.0}
+    }
+
+    def __init__(self, assumptions=None):
+        self.assumptions = assumptions or {name: dict(state) for name, state in self.DEFAULTS.items()}
+        self._changes = []
+
     def update_assumption(self, name, performance_metric):
-        """Reduce weight or deactivate assumption if performance degrades."""
+        """Set status and weight from the current performance; recovered assumptions return to full weight.
+
+        The weight depends only on performance_metric, so re-evaluating unchanged metrics is a no-op.
+        """
         if name in self.assumptions:
-            if performance_metric < 0.5:
-                self.assumptions[name]["status"] = "weakening"
-                self.assumptions[name]["weight"] *= 0.8
-            elif performance_metric < 0.3:
-                self.assumptions[name]["status"] = "degraded"
-                self.assumptions[name]["weight"] = 0.5
+            # Check the stricter bound first; otherwise < 0.5 would swallow it
+            if performance_metric < 0.3:
+                status, weight = "degraded", 0.5
+            elif performance_metric < 0.5:
+                status, weight = "weakening", 0.8
+            else:
+                status, weight = "active", 1.0
+            if self.assumptions[name] == {"status": status, "weight": weight}:
+                return
+            self.assumptions[name] = {"status": status, "weight": weight}
+            self._changes.append((name, status, weight, performance_metric))
+
+    def evaluate_all(self, metrics, min_sample=ASSUMPTION_MIN_SAMPLE):
+        """Score every assumption against one rolling metrics dict in a single pass; returns {name: performance}.
+
+        Windows smaller than min_sample are too noisy to judge, so they leave every assumption as it is.
+        """
+        names = [name for name in ASSUMPTION_METRICS if name in self.assumptions]
+        if not names or not metrics or metrics.get("sample_size", 0) < min_sample:
+            return {}
+        metric, healthy, failing = zip(*(ASSUMPTION_METRICS[name] for name in names))
+        values = np.array([metrics.get(m, h) for m, h in zip(metric, healthy)], dtype=float)
+        healthy, failing = np.array(healthy, dtype=float), np.array(failing, dtype=float)
+        performance = np.clip((failing - values) / (failing - healthy), 0.0, 1.0)
+        for name, p in zip(names, performance):
+            self.update_assumption(name, float(p))
+        return dict(zip(names, performance.tolist()))
+
+    def weights(self):
+        return {name: state["weight"] for name, state in self.assumptions.items()}
+
+    def save(self):
+        """Persist current weights and append any changes since the last save to assumption_history."""
+        conn = get_db_connection()
+        now = datetime.now().isoformat()
+        with conn:
+            conn.executemany(
+                'INSERT INTO assumptions (name, status, weight, updated_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(name) DO UPDATE SET status = excluded.status, weight = excluded.weight, '
+                'updated_at = excluded.updated_at',
+                [(name, state["status"], state["weight"], now) for name, state in self.assumptions.items()]
+            )
+            conn.executemany(
+                'INSERT INTO assumption_history (name, status, weight, performance, changed_at) VALUES (?, ?, ?, ?, ?)',
+                [(*change, now) for change in self._changes]
+            )
+        self._changes = []
+
+    @classmethod
+    def load(cls):
+        registry = cls()
+        conn = get_db_connection()
+        for name, status, weight in conn.execute('SELECT name, status, weight FROM assumptions'):
+            registry.assumptions[name] = {"status": status, "weight": weight}
+        return registry
+
+    def history(self, name=None):
+        conn = get_db_connection()
+        query = 'SELECT name, status, weight, performance, changed_at FROM assumption_history'
+        params = ()
+        if name is not None:
+            query += ' WHERE name = ?'
+            params = (name,)
+        return conn.execute(query + ' ORDER BY id', params).fetchall()
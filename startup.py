@@ -0,0 +1,33 @@
+import logging
+import sys
+import time
+from contextlib import contextmanager
+
+# Captured as early as possible: bot.py imports this module first
+PROCESS_START = time.perf_counter()
+
+_phases = []
+
+@contextmanager
+def phase(name):
+    """Time a startup phase and record how many modules it pulled in."""
+    modules_before = len(sys.modules)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _phases.append((name, elapsed, len(sys.modules) - modules_before))
+
+def elapsed_since_start():
+    """Seconds since the process started importing bot.py."""
+    return time.perf_counter() - PROCESS_START
+
+def log_report(title="Startup report"):
+    """Write an `-X importtime`-style summary of the recorded phases to the log."""
+    lines = [f"{title}: ready {elapsed_since_start() * 1e6:.0f} us after start"]
+    lines.append(f"{'phase [us]':>12} | {'modules':>7} | name")
+    for name, elapsed, modules in _phases:
+        lines.append(f"{elapsed * 1e6:>12.0f} | {modules:>7} | {name}")
+    logging.info("\n".join(lines))
+    _phases.clear()
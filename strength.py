@@ -0,0 +1,129 @@
+import numpy as np
+from datetime import datetime
+from scipy.optimize import minimize
+from config import (
+    STRENGTH_DECAY_PER_DAY, STRENGTH_RIDGE, STRENGTH_LEARNING_RATE,
+    DEFAULT_HOME_EXP_GOALS, DEFAULT_AWAY_EXP_GOALS
+)
+
+def _days(utc_date):
+    return datetime.fromisoformat(utc_date.replace("Z", "+00:00")).timestamp() / 86400.0
+
+class TeamStrengthModel:
+    """Time-decayed Poisson GLM: log(lambda_home) = mu + home_adv + attack[home] - defence[away]."""
+
+    def __init__(self, decay=STRENGTH_DECAY_PER_DAY, ridge=STRENGTH_RIDGE, learning_rate=STRENGTH_LEARNING_RATE):
+        self.decay = decay
+        self.ridge = ridge
+        self.learning_rate = learning_rate
+        self.teams = {}
+        self.mu = np.log(np.sqrt(DEFAULT_HOME_EXP_GOALS * DEFAULT_AWAY_EXP_GOALS))
+        self.home_adv = np.log(DEFAULT_HOME_EXP_GOALS / DEFAULT_AWAY_EXP_GOALS) / 2
+        self.attack = np.zeros(0)
+        self.defence = np.zeros(0)
+
+    def _team_index(self, name):
+        idx = self.teams.get(name)
+        if idx is None:
+            idx = self.teams[name] = len(self.teams)
+            self.attack = np.append(self.attack, 0.0)
+            self.defence = np.append(self.defence, 0.0)
+        return idx
+
+    def _pack(self):
+        return np.concatenate([[self.mu, self.home_adv], self.attack, self.defence])
+
+    def _unpack(self, params):
+        n = len(self.teams)
+        self.mu, self.home_adv = params[0], params[1]
+        self.attack, self.defence = params[2:2 + n].copy(), params[2 + n:].copy()
+
+    def fit(self, results, reference_date=None, max_iter=200):
+        """Fit on (utc_date, home_team, away_team, home_goals, away_goals) rows, warm-starting from current strengths."""
+        if not results:
+            return self
+        dates, homes, aways, home_goals, away_goals = zip(*results)
+        home_idx = np.array([self._team_index(t) for t in homes])
+        away_idx = np.array([self._team_index(t) for t in aways])
+        home_goals = np.asarray(home_goals, dtype=float)
+        away_goals = np.asarray(away_goals, dtype=float)
+
+        days = np.array([_days(d) for d in dates])
+        reference = _days(reference_date) if reference_date else days.max()
+        weights = np.exp(-self.decay * (reference - days))
+        n = len(self.teams)
+
+        def objective(params):
+            mu, home_adv = params[0], params[1]
+            attack, defence = params[2:2 + n], params[2 + n:]
+            eta_home = mu + home_adv + attack[home_idx] - defence[away_idx]
+            eta_away = mu + attack[away_idx] - defence[home_idx]
+            lam_home, lam_away = np.exp(eta_home), np.exp(eta_away)
+
+            nll = np.sum(weights * (lam_home - home_goals * eta_home + lam_away - away_goals * eta_away))
+            nll += 0.5 * self.ridge * (attack @ attack + defence @ defence)
+
+            # d(nll)/d(eta) per match, scattered back onto team parameters
+            g_home = weights * (lam_home - home_goals)
+            g_away = weights * (lam_away - away_goals)
+            grad = np.empty_like(params)
+            grad[0] = g_home.sum() + g_away.sum()
+            grad[1] = g_home.sum()
+            grad[2:2 + n] = (np.bincount(home_idx, g_home, n) + np.bincount(away_idx, g_away, n)
+                             + self.ridge * attack)
+            grad[2 + n:] = (-np.bincount(away_idx, g_home, n) - np.bincount(home_idx, g_away, n)
+                            + self.ridge * defence)
+            return nll, grad
+
+        result = minimize(objective, self._pack(), jac=True, method="L-BFGS-B", options={"maxiter": max_iter})
+        self._unpack(result.x)
+        return self
+
+    def partial_fit(self, home_team, away_team, home_goals, away_goals):
+        """O(1) online update from one new result: a single gradient step on the parameters it touches."""
+        h, a = self._team_index(home_team), self._team_index(away_team)
+        eta_home = self.mu + self.home_adv + self.attack[h] - self.defence[a]
+        eta_away = self.mu + self.attack[a] - self.defence[h]
+        g_home = np.exp(eta_home) - home_goals
+        g_away = np.exp(eta_away) - away_goals
+
+        lr = self.learning_rate
+        # Global terms are shared by every match, so they move more slowly than team terms
+        self.mu -= lr * 0.1 * (g_home + g_away)
+        self.home_adv -= lr * 0.1 * g_home
+        self.attack[h] -= lr * (g_home + self.ridge * self.attack[h])
+        self.attack[a] -= lr * (g_away + self.ridge * self.attack[a])
+        self.defence[a] -= lr * (-g_home + self.ridge * self.defence[a])
+        self.defence[h] -= lr * (-g_away + self.ridge * self.defence[h])
+        return self
+
+    def expected_goals(self, home_team, away_team):
+        """(home_exp_goals, away_exp_goals) for EaglensEngine.predict; unknown teams rate as league average."""
+        h, a = self.teams.get(home_team), self.teams.get(away_team)
+        attack_home = self.attack[h] if h is not None else 0.0
+        defence_home = self.defence[h] if h is not None else 0.0
+        attack_away = self.attack[a] if a is not None else 0.0
+        defence_away = self.defence[a] if a is not None else 0.0
+        return (
+            float(np.exp(self.mu + self.home_adv + attack_home - defence_away)),
+            float(np.exp(self.mu + attack_away - defence_home))
+        )
+
+def fit_strength_models(finished, previous=None):
+    """One model per competition from get_finished_fixtures() rows, warm-started from `previous`."""
+    by_competition = {}
+    for _, competition_id, _, utc_date, home_team, away_team, home_goals, away_goals in finished:
+        by_competition.setdefault(competition_id, []).append((utc_date, home_team, away_team, home_goals, away_goals))
+
+    models = dict(previous or {})
+    for competition_id, results in by_competition.items():
+        model = models.get(competition_id) or TeamStrengthModel()
+        models[competition_id] = model.fit(results)
+    return models
+
+def update_strength_models(models, new_results):
+    """Fold freshly settled get_finished_fixtures() rows into existing models without a full refit."""
+    for _, competition_id, _, _, home_team, away_team, home_goals, away_goals in new_results:
+        model = models.setdefault(competition_id, TeamStrengthModel())
+        model.partial_fit(home_team, away_team, home_goals, away_goals)
+    return models
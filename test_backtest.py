@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+import numpy as np
+from backtest import format_report, replay_shard, run_backtest, score_records, shard_results, sweep_variants
+
+def synthetic_results(leagues=(2021, 2014), seasons=(2024, 2025), teams=8, seed=7):
+    """Double round-robin seasons drawn from a known Poisson strength model, as get_finished_fixtures() rows."""
+    rng = np.random.default_rng(seed)
+    rows, fixture_id = [], 1
+    for league in leagues:
+        names = [f"Team {league}-{i}" for i in range(teams)]
+        attack, defence = rng.normal(0, 0.35, teams), rng.normal(0, 0.35, teams)
+        for season in seasons:
+            kickoff = datetime(season, 8, 10, 15, 0)
+            pairs = [(h, a) for h in range(teams) for a in range(teams) if h != a]
+            rng.shuffle(pairs)
+            for i, (h, a) in enumerate(pairs):
+                day = kickoff + timedelta(days=7 * (i // (teams // 2)))
+                home_goals = rng.poisson(np.exp(0.2 + 0.25 + attack[h] - defence[a]))
+                away_goals = rng.poisson(np.exp(0.2 + attack[a] - defence[h]))
+                rows.append((fixture_id, league, season, day.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                             names[h], names[a], int(home_goals), int(away_goals)))
+                fixture_id += 1
+    return rows
+
+def test_parallel_replay_matches_sequential():
+    results = synthetic_results()
+    shards = shard_results(results)
+    assert sorted(shards) == [(2014, 2024), (2014, 2025), (2021, 2024), (2021, 2025)]
+
+    report = run_backtest(results, workers=2)
+    sequential = score_records([record for rows in shards.values() for record in replay_shard(rows)])
+    assert report["baseline"]["fixtures"] == len(results) == sequential["fixtures"]
+    assert report["baseline"]["all_brier"] == sequential["all_brier"]
+    assert report["baseline"]["suppression_rate"] == sequential["suppression_rate"]
+    assert set(report["shards"]) == {"2014/2024", "2014/2025", "2021/2024", "2021/2025"}
+
+    baseline = report["baseline"]
+    # Better than the uniform forecast (2/9) once the strength model has a few weeks of results
+    assert baseline["all_brier"] < 2 / 9
+    assert 0 < baseline["suppression_rate"] < 1
+    assert sum(count for _, _, count in baseline["calibration_curve"]) == 3 * baseline["published"]
+
+def test_threshold_sweep():
+    results = synthetic_results(leagues=(2021,), seasons=(2025,))
+    report = run_backtest(results, {"sample_size": [0, 20, 40], "brier_score": [0.25, 1.0]}, workers=2)
+    assert len(report["sweep"]) == len(sweep_variants({"sample_size": [0, 20, 40], "brier_score": [0.25, 1.0]})) == 6
+
+    by_variant = {(v["overrides"]["sample_size"], v["overrides"]["brier_score"]): v for v in report["sweep"]}
+    # Stricter sample-size gates only ever suppress more
+    rates = [by_variant[(size, 1.0)]["suppression_rate"] for size in (0, 20, 40)]
+    assert rates == sorted(rates) and rates[0] < rates[-1]
+    assert by_variant[(0, 1.0)]["suppression_rate"] == 0.0
+    assert by_variant[(0, 0.25)]["suppression_rate"] >= by_variant[(0, 1.0)]["suppression_rate"]
+
+def test_empty_results():
+    report = run_backtest([], {"sample_size": [5.0]}, workers=1)
+    assert report["shards"] == {}
+    assert report["baseline"]["fixtures"] == 0 and report["baseline"]["brier"] is None
+    assert [(v["overrides"], v["brier"]) for v in report["sweep"]] == [({"sample_size": 5.0}, None)]
+    scored = score_records(replay_shard(synthetic_results(leagues=(2021,), seasons=(2025,))))
+    assert set(score_records([])) == set(scored)
+    assert format_report("baseline", report["baseline"]).endswith("no fixtures")
@@ -0,0 +1,16 @@
+from benchmark import run_suite, compare
+
+def test_benchmark_suite_smoke():
+    results = run_suite(iterations=20, concurrency=5)
+    assert "engine.predict" in results
+    assert "bot.handle_invite[concurrency=5]" in results
+    for stats in results.values():
+        assert stats["p50_us"] <= stats["p99_us"]
+        assert stats["ops_per_sec"] > 0
+
+def test_compare_flags_regressions():
+    baseline = {"engine.predict": {"p50_us": 10.0, "p99_us": 20.0, "ops_per_sec": 1000.0}}
+    steady = {"engine.predict": {"p50_us": 11.0, "p99_us": 25.0, "ops_per_sec": 950.0}}
+    slower = {"engine.predict": {"p50_us": 20.0, "p99_us": 40.0, "ops_per_sec": 500.0}}
+    assert compare(steady, baseline, tolerance=0.25) == []
+    assert len(compare(slower, baseline, tolerance=0.25)) == 2
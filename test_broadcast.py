@@ -0,0 +1,115 @@
+import asyncio
+import pytest
+from telegram.error import RetryAfter, Forbidden
+import database
+from broadcast import BroadcastJob, RateLimiter, get_rate_limiter
+from config import BROADCAST_MAX_ATTEMPTS, BROADCAST_MAX_RATE_LIMITS
+
+OWNER = 999
+
+class FakeBot:
+    def __init__(self, blocked=(), rate_limited=(), broken=(), rate_limits=1):
+        self.blocked = set(blocked)
+        self.rate_limited = {chat_id: rate_limits for chat_id in rate_limited}
+        self.broken = set(broken)
+        self.delivered = []
+        self.reports = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        if chat_id == OWNER:
+            self.reports.append(text)
+            return
+        if chat_id in self.blocked:
+            raise Forbidden("bot was blocked by the user")
+        if chat_id in self.broken:
+            raise ValueError("unexpected failure outside the Telegram client")
+        if self.rate_limited.get(chat_id):
+            self.rate_limited[chat_id] -= 1
+            raise RetryAfter(0)
+        self.delivered.append(chat_id)
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "eaglens.db"))
+    database.init_db()
+    for user_id in range(1, 21):
+        database.log_visitor(user_id, f"user{user_id}")
+    yield database
+    database.close_db_connections()
+
+def run_job(bot, broadcast_id):
+    limiter = RateLimiter(rate=1000, per_chat_interval=0)
+    job = BroadcastJob(bot, broadcast_id, "Matchday!", OWNER, limiter=limiter, concurrency=4)
+    return asyncio.run(job.run())
+
+def test_broadcast_delivery(db):
+    broadcast_id = db.create_broadcast("Matchday!", OWNER)
+    bot = FakeBot(blocked={3}, rate_limited={5})
+
+    sent, failed = run_job(bot, broadcast_id)
+    assert (sent, failed) == (19, 1)
+    assert sorted(bot.delivered) == [i for i in range(1, 21) if i != 3]
+    assert db.get_broadcast_progress(broadcast_id) == {"sent": 19, "failed": 1}
+    assert db.get_unfinished_broadcasts() == []
+    assert "complete" in bot.reports[-1]
+
+def test_rate_limits_do_not_use_up_attempts(db):
+    broadcast_id = db.create_broadcast("Matchday!", OWNER)
+    # Throttled more often than BROADCAST_MAX_ATTEMPTS, but within its own budget: still delivered
+    bot = FakeBot(rate_limited={5, 6}, rate_limits=BROADCAST_MAX_ATTEMPTS + 2)
+    assert run_job(bot, broadcast_id) == (20, 0)
+
+    broadcast_id = db.create_broadcast("Matchday!", OWNER)
+    bot = FakeBot(rate_limited={5}, rate_limits=BROADCAST_MAX_RATE_LIMITS + 1)
+    assert run_job(bot, broadcast_id) == (19, 1)
+
+def test_broadcast_resumes_pending_only(db):
+    broadcast_id = db.create_broadcast("Matchday!", OWNER)
+    # Simulate a run interrupted after the first ten deliveries were persisted
+    db.record_broadcast_results(broadcast_id, [(i, "sent") for i in range(1, 11)])
+    assert [row[0] for row in db.get_unfinished_broadcasts()] == [broadcast_id]
+
+    bot = FakeBot()
+    run_job(bot, broadcast_id)
+    assert sorted(bot.delivered) == list(range(11, 21))
+    assert db.get_broadcast_progress(broadcast_id) == {"sent": 20}
+
+def test_rate_limiter_spacing():
+    async def scenario():
+        limiter = RateLimiter(rate=50, per_chat_interval=0.05)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for _ in range(3):
+            await limiter.acquire(1)
+        return loop.time() - start
+
+    assert asyncio.run(scenario()) >= 0.1
+
+def test_unexpected_errors_do_not_stall_broadcast(db):
+    broadcast_id = db.create_broadcast("Matchday!", OWNER)
+    # More broken chats than workers: each one used to kill its worker and leave queue.join() hanging
+    bot = FakeBot(broken={1, 2, 3, 4, 5})
+    assert run_job(bot, broadcast_id) == (15, 5)
+    assert db.get_broadcast_progress(broadcast_id) == {"sent": 15, "failed": 5}
+
+def test_rate_limiter_is_shared_and_per_chat_waits_do_not_block():
+    class Application:
+        bot_data = {}
+
+    application = Application()
+    assert get_rate_limiter(application) is get_rate_limiter(application)
+
+    async def scenario():
+        limiter = RateLimiter(rate=1000, per_chat_interval=0.2)
+        loop = asyncio.get_running_loop()
+        await limiter.acquire(1)
+        start = loop.time()
+        waiting = asyncio.create_task(limiter.acquire(1))  # sleeps out chat 1's spacing
+        await asyncio.sleep(0)
+        await limiter.acquire(2)
+        other_chat = loop.time() - start
+        await waiting
+        return other_chat, loop.time() - start
+
+    other_chat, same_chat = asyncio.run(scenario())
+    assert other_chat < 0.05 and same_chat >= 0.19
@@ -0,0 +1,121 @@
+import json
+import os
+from datetime import datetime, timezone
+import numpy as np
+import pytest
+import database
+from calibration import ALL_LEAGUES, CalibrationTracker, LeagueCalibration
+from engine import EaglensEngine
+from fixtures import store_matches
+from predictions import PredictionMaterializer, get_prediction
+from signals import NewsSignalEngine
+
+RECORDINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_data", "football_data")
+NOW = datetime(2026, 1, 31, 9, 0, tzinfo=timezone.utc)
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "eaglens.db"))
+    database.init_db()
+    yield database
+    database.close_db_connections()
+
+def random_results(rng, n, mean_goals=2.6):
+    results = []
+    for _ in range(n):
+        p = rng.dirichlet([4, 3, 3])
+        results.append(({"home": p[0], "draw": p[1], "away": p[2]},
+                        int(rng.poisson(mean_goals * 0.55)), int(rng.poisson(mean_goals * 0.45)),
+                        rng.normal(mean_goals, 0.3)))
+    return results
+
+def test_rolling_metrics_match_brute_force():
+    rng = np.random.default_rng(11)
+    results = random_results(rng, 500)
+    tracker = CalibrationTracker()
+    for probs, hg, ag, xg in results:
+        metrics = tracker.settle(1, probs, hg, ag, xg)
+
+    # Recompute the last window from scratch
+    window = results[-200:]
+    briers, goals = [], []
+    for probs, hg, ag, _ in window:
+        outcome = "home" if hg > ag else "draw" if hg == ag else "away"
+        briers.append(np.mean([(probs[k] - (k == outcome)) ** 2 for k in ("home", "draw", "away")]))
+        goals.append(hg + ag)
+    assert metrics["brier_score"] == pytest.approx(np.mean(briers))
+    assert metrics["performance_drift"] == pytest.approx(max(0.0, np.mean(briers[-30:]) - np.mean(briers)))
+    assert metrics["league_volatility"] == pytest.approx(np.var(goals) / np.mean(goals))
+    assert metrics["sample_size"] == 200
+    assert tracker.metrics(ALL_LEAGUES) == metrics
+    assert tracker.metrics(2) is None
+
+def test_psi_rises_under_input_shift():
+    rng = np.random.default_rng(5)
+    stable, shifted = LeagueCalibration(), LeagueCalibration()
+    for probs, hg, ag, xg in random_results(rng, 400):
+        stable.update(probs, "home", xg, hg + ag)
+    for i, (probs, hg, ag, xg) in enumerate(random_results(rng, 400)):
+        shifted.update(probs, "home", xg + (1.2 if i >= 200 else 0.0), hg + ag)
+
+    assert stable.psi() < 0.1
+    assert shifted.psi() > EaglensEngine().calibration_metrics["data_drift_psi"] * 4
+
+def test_state_survives_restart(db):
+    rng = np.random.default_rng(2)
+    tracker = CalibrationTracker()
+    for probs, hg, ag, xg in random_results(rng, 250):
+        tracker.settle(2021, probs, hg, ag, xg)
+    tracker.save()
+
+    restored = CalibrationTracker.load()
+    assert set(restored.leagues) == {2021, ALL_LEAGUES}
+    assert restored.metrics(2021) == pytest.approx(tracker.metrics(2021))
+
+    # Further updates continue from the restored windows
+    for probs, hg, ag, xg in random_results(rng, 10):
+        tracker.settle(2021, probs, hg, ag, xg)
+        restored.settle(2021, probs, hg, ag, xg)
+    assert restored.metrics(2021) == pytest.approx(tracker.metrics(2021))
+
+def test_materializer_settles_each_result_once(db):
+    with open(os.path.join(RECORDINGS, "pl_matches.json")) as f:
+        store_matches(json.load(f))
+    engine = EaglensEngine()
+    PredictionMaterializer(engine, NewsSignalEngine()).refresh(now=NOW)
+
+    with open(os.path.join(RECORDINGS, "pl_matches_updated.json")) as f:
+        store_matches(json.load(f))
+    materializer = PredictionMaterializer(engine, NewsSignalEngine())
+    assert materializer.settle_results() == 1
+    assert engine.league_metrics[2021]["sample_size"] == 1
+    # One settled result is below MIN_SAMPLE_SIZE, so that league is now gated
+    assert engine.predict("Chelsea FC", "Arsenal FC", 1.5, 1.1, league=2021)["status"] == "suppressed"
+
+    restarted = PredictionMaterializer(EaglensEngine(), NewsSignalEngine())
+    assert restarted.settle_results() == 0
+    assert restarted.engine.league_metrics[2021]["sample_size"] == 1
+
+    # Suppressed predictions still settle, so the gated league keeps collecting results and can reopen
+    restarted.refresh(now=NOW)
+    stored = get_prediction(537912)
+    assert stored["status"] == "suppressed" and sum(stored["probabilities"].values()) == pytest.approx(1.0)
+    conn = db.get_db_connection()
+    with conn:
+        conn.execute("UPDATE fixtures SET status = 'FINISHED', home_score = 0, away_score = 2 WHERE id = 537912")
+    assert restarted.settle_results() == 1
+    assert restarted.engine.league_metrics[2021]["sample_size"] == 2
+
+def test_status_reads_persisted_metrics(db):
+    # Worker processes never run the materializer, so System Status reads what it persisted
+    from bot import load_system_status
+    assert load_system_status() == (None, None)
+
+    tracker = CalibrationTracker()
+    for probs, hg, ag, xg in random_results(np.random.default_rng(3), 30):
+        tracker.settle(2021, probs, hg, ag, xg)
+    tracker.save()
+    db.set_setting("engine_cache_stats", json.dumps(EaglensEngine().cache_stats()))
+    metrics, cache = load_system_status()
+    assert metrics == pytest.approx(tracker.metrics(ALL_LEAGUES))
+    assert cache["hits"] == 0 and cache["max_size"] > 0
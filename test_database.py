@@ -0,0 +1,209 @@
+import asyncio
+import threading
+import time
+import pytest
+import async_database
+import database
+from datetime import datetime, timedelta
+from payments import PaymentManager
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "eaglens.db"))
+    database.clear_access_cache()
+    database.init_db()
+    yield database
+    database.close_db_connections()
+
+def test_connection_pool(db):
+    conn = db.get_db_connection()
+    assert db.get_db_connection() is conn
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+
+    # Every thread gets its own connection
+    other = []
+    thread = threading.Thread(target=lambda: other.append(db.get_db_connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
+
+def test_close_reaches_every_thread(db):
+    # A long-lived executor thread, like the async layer's DB threads, keeps working across a close
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        count = lambda: db.get_db_connection().execute('SELECT COUNT(*) FROM users').fetchone()[0]
+        assert executor.submit(count).result() == 0
+        db.close_db_connections()
+        assert executor.submit(count).result() == 0
+        assert db.get_db_connection().execute('SELECT 1').fetchone() == (1,)
+
+def test_access_flow(db):
+    db.add_invite_code("EAGLE-TEST", max_uses=1)
+    db.log_visitor(1, "alice")
+    db.log_visitor(2, "bob")
+    assert db.check_user_access(1) == (False, "not_verified")
+
+    assert db.verify_invite_code(1, "EAGLE-TEST")
+    assert not db.verify_invite_code(2, "EAGLE-TEST")
+    assert db.check_user_access(1) == (False, "not_subscribed")
+
+    PaymentManager.activate_subscription(1, "trial")
+    assert db.check_user_access(1) == (True, "active")
+    assert sorted(db.get_all_users()) == [1, 2]
+
+def test_async_layer_keeps_loop_responsive(db):
+    db.log_visitor(1, "alice")
+
+    def slow_write():
+        conn = db.get_db_connection()
+        with conn:
+            conn.execute('UPDATE users SET username = ? WHERE telegram_id = 1', ("alice2",))
+            time.sleep(0.2)
+
+    async def scenario():
+        ticks = 0
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        tick_task = asyncio.create_task(ticker())
+        write = asyncio.create_task(async_database.run_db(slow_write))
+        await asyncio.sleep(0.05)
+        # WAL readers on other DB threads are served while the write is still open
+        statuses = await asyncio.gather(*(async_database.check_user_access(1) for _ in range(3)))
+        assert not write.done()
+        await write
+        tick_task.cancel()
+        return statuses, ticks
+
+    statuses, ticks = asyncio.run(scenario())
+    assert statuses == [(False, "not_verified")] * 3
+    assert ticks >= 10
+
+def test_access_cache(db):
+    db.log_visitor(1, "alice")
+    conn = db.get_db_connection()
+    expiry_ts = int(time.time()) + 1
+    conn.execute('UPDATE users SET is_verified = 1, is_subscribed = 1, expiry_ts = ? WHERE telegram_id = 1',
+                 (expiry_ts,))
+    conn.commit()
+    assert db.check_user_access(1) == (True, "active")
+
+    # Steady state is served from memory with no DB reads
+    statements = []
+    conn.set_trace_callback(statements.append)
+    for _ in range(5):
+        assert db.check_user_access(1) == (True, "active")
+    assert statements == []
+
+    # The entry lapses exactly at the subscription expiry
+    time.sleep(expiry_ts - time.time() + 0.05)
+    assert db.cached_user_access(1) is None
+    assert db.check_user_access(1) == (False, "expired")
+    conn.set_trace_callback(None)
+
+    # Writes through PaymentManager invalidate the cached status
+    PaymentManager.activate_subscription(1, "monthly")
+    assert db.check_user_access(1) == (True, "active")
+
+def test_migrations_upgrade_existing_database(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "legacy.db"))
+    conn = database.get_db_connection()
+    # A database created before migrations existed: no expiry_ts, no secondary indexes
+    conn.execute('CREATE TABLE users (telegram_id INTEGER PRIMARY KEY, username TEXT, invite_code TEXT, '
+                 'is_verified BOOLEAN DEFAULT 0, is_subscribed BOOLEAN DEFAULT 0, expiry_date TEXT, '
+                 'trial_used BOOLEAN DEFAULT 0, first_seen TEXT)')
+    expiry = datetime.now() + timedelta(days=10)
+    conn.execute("INSERT INTO users (telegram_id, is_verified, is_subscribed, expiry_date) VALUES (1, 1, 1, ?)",
+                 (expiry.isoformat(),))
+    conn.commit()
+    try:
+        database.init_db()
+        database.init_db()  # already current: a no-op
+        assert conn.execute('PRAGMA user_version').fetchone()[0] == len(database.MIGRATIONS)
+        assert conn.execute('SELECT expiry_ts FROM users').fetchone()[0] == int(expiry.timestamp())
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {"idx_invite_usage_telegram_id", "idx_invite_usage_code", "idx_users_subscribed_expiry"} <= indexes
+    finally:
+        database.close_db_connections()
+
+def test_subscription_sweep(db):
+    now = int(time.time())
+    conn = db.get_db_connection()
+    with conn:
+        conn.executemany(
+            'INSERT INTO users (telegram_id, is_verified, is_subscribed, expiry_ts) VALUES (?, 1, ?, ?)',
+            [(1, 1, now - 60), (2, 1, now + 3600), (3, 1, now + 30 * 86400), (4, 0, now - 60), (5, 1, None)]
+        )
+    assert db.check_user_access(1) == (False, "expired")
+    assert db.check_user_access(2) == (True, "active")
+
+    expired, queued = db.sweep_subscriptions(now)
+    assert expired == [1]
+    assert queued == 2
+    assert db.check_user_access(1) == (False, "not_subscribed")
+    assert sorted(db.get_pending_reminders()) == [(1, now - 60, "expired"), (2, now + 3600, "expiring")]
+
+    # A second sweep finds nothing new, and delivered reminders leave the queue
+    assert db.sweep_subscriptions(now) == ([], 0)
+    db.record_reminder_results([(1, now - 60, "expired", "sent")])
+    assert db.get_pending_reminders() == [(2, now + 3600, "expiring")]
+
+    # Renewing moves the expiry, so the next lapse gets its own reminder
+    PaymentManager.activate_subscription(2, "monthly")
+    assert sorted(db.sweep_subscriptions(now + 40 * 86400)[0]) == [2, 3]
+
+def test_sweep_and_owner_queries_use_indexes(db):
+    conn = db.get_db_connection()
+    queries = [
+        ('SELECT telegram_id FROM users WHERE is_subscribed = 1 AND expiry_ts <= ?', (0,)),
+        ('SELECT telegram_id FROM users WHERE is_subscribed = 1 AND expiry_ts > ? AND expiry_ts <= ?', (0, 1)),
+        ("SELECT telegram_id, expiry_ts, kind FROM renewal_reminders WHERE status = 'pending' ORDER BY queued_at", ()),
+        ('SELECT telegram_id FROM invite_usage WHERE code = ?', ("EAGLE",)),
+        ('SELECT code FROM invite_usage WHERE telegram_id = ?', (1,)),
+    ]
+    for sql, params in queries:
+        # A SCAN is only acceptable over an index (the partial pending-reminders index)
+        plan = [row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+        assert all("INDEX" in step for step in plan), (sql, plan)
+
+def test_bulk_invite_codes_redraw_collisions(db):
+    from invites import generate_invite_codes
+    assert db.add_invite_code("EAGLE-TAKEN")
+    assert not db.add_invite_code("EAGLE-TAKEN")
+
+    draws = iter(["EAGLE-TAKEN", "EAGLE-A", "EAGLE-A", "EAGLE-B", "EAGLE-C", "EAGLE-D"])
+    assert db.create_invite_codes(lambda: next(draws), 3, max_uses=5) == ["EAGLE-A", "EAGLE-B", "EAGLE-C"]
+
+    codes = generate_invite_codes(2000, max_uses=3)
+    assert len(set(codes)) == 2000
+    conn = db.get_db_connection()
+    assert conn.execute('SELECT COUNT(*) FROM invite_codes WHERE max_uses = 3').fetchone()[0] == 2000
+
+def test_concurrent_redemption_never_exceeds_max_uses(db):
+    max_uses, contenders = 5, 40
+    db.add_invite_code("EAGLE-RUSH", max_uses=max_uses)
+    for user_id in range(contenders):
+        db.log_visitor(user_id, f"user{user_id}")
+
+    barrier = threading.Barrier(contenders)
+    results = []
+
+    def redeem(user_id):
+        barrier.wait()
+        results.append(db.verify_invite_code(user_id, "EAGLE-RUSH"))
+
+    threads = [threading.Thread(target=redeem, args=(user_id,)) for user_id in range(contenders)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    conn = db.get_db_connection()
+    assert results.count(True) == max_uses
+    assert conn.execute("SELECT current_uses FROM invite_codes WHERE code = 'EAGLE-RUSH'").fetchone()[0] == max_uses
+    assert conn.execute('SELECT COUNT(*) FROM invite_usage').fetchone()[0] == max_uses
+    assert conn.execute('SELECT COUNT(*) FROM users WHERE is_verified = 1').fetchone()[0] == max_uses
@@ -1,4 +1,9 @@
+import time
+import numpy as np
+from scipy.stats import poisson
+from config import PMF_TOLERANCE
 from engine import EaglensEngine
+from rules import RuleTable
 
 def test_engine():
     engine = EaglensEngine()
@@ -23,5 +28,205 @@ def test_engine():
     print(f"Status: {res3['status']}")
     print(f"Confidence: {res3['confidence']} ({res3['confidence_label']})")
 
+def test_predict_many():
+    engine = EaglensEngine()
+    fixtures = [("Team A", "Team B", 1.5, 1.0), ("Team C", "Team D", 0.8, 2.1), ("Team E", "Team F", 1.2, 1.2)]
+
+    print("--- Test 4: Batch Prediction Matches Single Prediction ---")
+    batch = engine.predict_many(fixtures)
+    assert len(batch) == len(fixtures)
+    for fixture, res in zip(fixtures, batch):
+        single = engine.predict(*fixture)
+        assert res['status'] == 'success'
+        assert res['confidence'] == single['confidence']
+        for k in ('home', 'draw', 'away'):
+            assert abs(res['probabilities'][k] - single['probabilities'][k]) < 1e-12
+        print(f"{res['home_team']} vs {res['away_team']}: {res['probabilities']}")
+
+    print("\n--- Test 5: Batch Gating ---")
+    engine.calibration_metrics['brier_score'] = 0.25
+    batch = engine.predict_many(fixtures)
+    assert all(res['status'] == 'suppressed' for res in batch)
+    # Single and batch predictions share one suppressed shape, probabilities included
+    for fixture, res in zip(fixtures, batch):
+        single = engine.predict(*fixture)
+        assert single.keys() == res.keys() == {'status', 'reason', 'probabilities'}
+        assert single['reason'] == res['reason']
+        for k in ('home', 'draw', 'away'):
+            assert abs(res['probabilities'][k] - single['probabilities'][k]) < 1e-12
+    assert engine.predict_many([]) == []
+
+def test_score_matrix_cache():
+    engine = EaglensEngine()
+    engine.cache_size = 2
+
+    print("--- Test 6: Score Matrix Cache ---")
+    first = engine.calculate_poisson_probabilities(1.5, 1.0)
+    # Inputs that quantize to the same key are served from the cache
+    second = engine.calculate_poisson_probabilities(1.501, 0.999)
+    assert first == second
+    assert (engine.cache_hits, engine.cache_misses) == (1, 1)
+
+    # LRU eviction keeps the cache bounded and drops the least recently used key
+    engine.calculate_poisson_probabilities(2.0, 1.0)
+    engine.calculate_poisson_probabilities(1.5, 1.0)
+    engine.calculate_poisson_probabilities(0.5, 0.5)
+    assert engine.cache_stats()['size'] == 2
+    assert (1.5, 1.0, 10) in engine._score_cache
+    assert (2.0, 1.0, 10) not in engine._score_cache
+    print(engine.cache_stats())
+
+    # Score matrices do not depend on calibration: a calibration change keeps the cache warm
+    engine.calibration_metrics['sample_size'] = 40
+    engine.calculate_poisson_probabilities(1.5, 1.0)
+    assert engine.cache_stats()['size'] == 2
+    assert (engine.cache_hits, engine.cache_misses) == (3, 3)
+
+    # Clearing drops the entries but not the cumulative counters
+    engine.clear_cache()
+    assert engine.cache_stats()['size'] == 0
+    assert (engine.cache_hits, engine.cache_misses) == (3, 3)
+
+    # The batch path used in production reads and fills the same cache
+    engine.cache_size = 16
+    slate = [("A", "B", 1.5, 1.0), ("C", "D", 0.8, 2.1), ("E", "F", 0.8, 2.1)]
+    first = engine.predict_many(slate)
+    assert (engine.cache_hits, engine.cache_misses) == (4, 5)
+    assert engine.predict_many(slate) == first
+    assert (engine.cache_hits, engine.cache_misses) == (7, 5)
+
+def test_pmf_table():
+    engine = EaglensEngine()
+    goals = np.arange(10)
+
+    print("--- Test 7: PMF Table Accuracy ---")
+    # On-grid lambdas come from the table, off-grid ones from the exact recurrence
+    lams = np.concatenate([np.arange(0, 601) * 0.01, [0.123456, 2.71828, 6.5, 9.87]])
+    reference = poisson.pmf(goals[None, :], lams[:, None])
+    error = np.max(np.abs(engine.poisson_pmf(lams) - reference))
+    print(f"Max abs error vs scipy: {error:.2e}")
+    assert error < PMF_TOLERANCE
+
+    print("\n--- Test 8: Per-Prediction Speedup ---")
+    def scipy_prediction(home_exp_goals, away_exp_goals, max_goals=10):
+        home_probs = [poisson.pmf(i, home_exp_goals) for i in range(max_goals)]
+        away_probs = [poisson.pmf(i, away_exp_goals) for i in range(max_goals)]
+        return np.outer(home_probs, away_probs)
+
+    runs = 200
+    start = time.perf_counter()
+    for _ in range(runs):
+        scipy_prediction(1.5, 1.0)
+    scipy_time = (time.perf_counter() - start) / runs
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        engine._compute_score_matrix(1.5, 1.0, 10)
+    table_time = (time.perf_counter() - start) / runs
+
+    print(f"scipy: {scipy_time * 1e6:.1f}us, table: {table_time * 1e6:.1f}us, speedup: {scipy_time / table_time:.1f}x")
+    assert table_time < scipy_time
+
+def reference_gates(metrics):
+    """The original if-chain the rule table replaced."""
+    if metrics["brier_score"] > 0.23:
+        return False, "Calibration failure: Rolling Brier score exceeds threshold (0.23)."
+    if metrics["performance_drift"] > 0.25:
+        return False, "Performance degradation: Model accuracy has drifted significantly."
+    if metrics["data_drift_psi"] > 0.40:
+        return False, "Data drift detected: Input distribution has shifted beyond reliability."
+    if metrics["league_volatility"] > 1.50:
+        return False, "Extreme volatility: League conditions are currently too unpredictable."
+    if metrics["sample_size"] < 5:
+        return False, "Insufficient data: Not enough historical matches for a reliable prediction."
+    return True, None
+
+def reference_confidence(metrics):
+    confidence = 85
+    if metrics["brier_score"] > 0.20:
+        confidence -= 15
+    if metrics["performance_drift"] > 0.15:
+        confidence -= 30
+    if metrics["data_drift_psi"] > 0.25:
+        confidence -= 20
+    if metrics["league_volatility"] > 1.25:
+        confidence = min(confidence, 40)
+    if metrics["sample_size"] < 10:
+        confidence = min(confidence, 35)
+    return max(0, confidence)
+
+def test_rule_table():
+    engine = EaglensEngine()
+    rng = np.random.default_rng(4)
+
+    print("--- Test 9: Compiled Rules Match The If-Chain ---")
+    rows = [{
+        "brier_score": rng.uniform(0.1, 0.3), "performance_drift": rng.uniform(0, 0.35),
+        "data_drift_psi": rng.uniform(0, 0.6), "league_volatility": rng.uniform(0.8, 1.8),
+        "sample_size": int(rng.integers(0, 20))
+    } for _ in range(2000)]
+    reliable, reasons, confidences = engine.rules.evaluate(rows, [None] * len(rows))
+    for metrics, ok, reason, confidence in zip(rows, reliable, reasons, confidences):
+        assert (ok, reason) == reference_gates(metrics)
+        assert confidence == reference_confidence(metrics)
+    print(f"{sum(reliable)}/{len(rows)} reliable")
+
+    print("\n--- Test 10: Per-League Overrides In One Batch ---")
+    engine.rules = RuleTable(gate_overrides={2002: {"brier_score": 0.26}})
+    engine.league_metrics = {2002: dict(engine.calibration_metrics, brier_score=0.25),
+                             2021: dict(engine.calibration_metrics, brier_score=0.25)}
+    batch = engine.predict_many([("A", "B", 1.5, 1.0, 2002), ("C", "D", 1.5, 1.0, 2021), ("E", "F", 1.5, 1.0)])
+    assert [res["status"] for res in batch] == ["success", "suppressed", "success"]
+    assert batch[1]["reason"] == "Calibration failure: Rolling Brier score exceeds threshold (0.23)."
+
+    print("\n--- Test 11: Gate Decisions Cached Until Metrics Change ---")
+    calls = []
+    evaluate = engine.rules.evaluate
+    engine.rules.evaluate = lambda rows, leagues: calls.append(list(leagues)) or evaluate(rows, leagues)
+    engine.predict_many([("A", "B", 1.5, 1.0, 2002), ("C", "D", 1.5, 1.0, 2021)])
+    assert calls == []
+    engine.league_metrics[2021]["brier_score"] = 0.18
+    assert engine.predict("C", "D", 1.5, 1.0, league=2021)["status"] == "success"
+    assert calls == [[2021]]
+
+def test_derived_markets():
+    from engine import build_market_masks
+    engine = EaglensEngine()
+    fixtures = [("Team A", "Team B", 1.5, 1.0), ("Team C", "Team D", 0.8, 2.1), ("Team E", "Team F", 2.7, 0.4)]
+    assert build_market_masks(10) is build_market_masks(10)
+
+    for fixture, batch in zip(fixtures, engine.predict_many(fixtures)):
+        single = engine.predict(*fixture)
+        markets = single["markets"]
+        matrix, _ = engine.get_score_matrix(fixture[2] * engine.home_goals_factor, fixture[3])
+        total = matrix.sum()
+        cells = [(h, a, matrix[h, a] / total) for h in range(10) for a in range(10)]
+
+        # Reference values from explicit loops over the same score matrix
+        for line, market in markets["totals"].items():
+            over = sum(p for h, a, p in cells if h + a > float(line))
+            assert abs(market["over"] - over) < 1e-12 and abs(market["over"] + market["under"] - 1) < 1e-12
+        assert abs(markets["btts"]["yes"] - sum(p for h, a, p in cells if h > 0 and a > 0)) < 1e-12
+        for line, market in markets["asian_handicap"].items():
+            assert abs(market["home"] - sum(p for h, a, p in cells if h - a + float(line) > 0)) < 1e-12
+            assert abs(market["push"] - sum(p for h, a, p in cells if h - a + float(line) == 0)) < 1e-12
+        probs = single["probabilities"]
+        assert abs(markets["asian_handicap"]["-0.5"]["home"] - probs["home"]) < 1e-12
+        assert abs(markets["asian_handicap"]["0"]["push"] - probs["draw"]) < 1e-12
+        assert abs(markets["double_chance"]["1X"] - (probs["home"] + probs["draw"])) < 1e-12
+        expected_scores = sorted(cells, key=lambda c: -c[2])[:5]
+        assert [score for score, _ in markets["correct_scores"]] == [f"{h}-{a}" for h, a, _ in expected_scores]
+
+        # The batch path agrees with the single path
+        for outcome, value in batch["markets"]["totals"]["2.5"].items():
+            assert abs(value - markets["totals"]["2.5"][outcome]) < 1e-12
+        assert batch["markets"]["correct_scores"][0][0] == markets["correct_scores"][0][0]
+        assert abs(batch["markets"]["asian_handicap"]["-1.5"]["home"] - markets["asian_handicap"]["-1.5"]["home"]) < 1e-12
+
 if __name__ == "__main__":
     test_engine()
+    test_predict_many()
+    test_score_matrix_cache()
+    test_pmf_table()
+    test_rule_table()
+    test_derived_markets()
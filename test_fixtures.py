@@ -0,0 +1,132 @@
+import asyncio
+import json
+import os
+from datetime import date
+import httpx
+import pytest
+import database
+import fixtures
+from fixtures import FootballDataClient, RequestQuota, backfill_seasons, history_seasons, refresh_fixtures
+
+RECORDINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_data", "football_data")
+TODAY = date(2026, 1, 31)
+
+def load_recording(name):
+    with open(os.path.join(RECORDINGS, name)) as f:
+        return json.load(f)
+
+class RecordedFootballData:
+    """Replays recorded Football-Data.org responses, honouring If-None-Match."""
+
+    def __init__(self, recording):
+        self.recording = recording
+        self.etag = '"v1"'
+        self.requests = []
+
+    def handler(self, request):
+        self.requests.append(request)
+        assert request.headers["X-Auth-Token"]
+        if request.headers.get("If-None-Match") == self.etag:
+            return httpx.Response(304)
+        return httpx.Response(200, json=load_recording(self.recording), headers={"ETag": self.etag})
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "eaglens.db"))
+    database.init_db()
+    yield database
+    database.close_db_connections()
+
+def run_refresh(api, competitions=("PL",)):
+    async def scenario():
+        client = FootballDataClient(api_key="test", transport=httpx.MockTransport(api.handler))
+        try:
+            return await refresh_fixtures(client, competitions=competitions, today=TODAY)
+        finally:
+            await client.close()
+    return asyncio.run(scenario())
+
+def test_ingest_and_incremental_refresh(db):
+    api = RecordedFootballData("pl_matches.json")
+    assert run_refresh(api) == 6
+    assert api.requests[0].url.params["dateFrom"] == "2026-01-24"
+
+    # Unchanged resource: conditional request answered with 304, nothing rewritten
+    assert run_refresh(api) == 0
+    assert api.requests[-1].headers["If-None-Match"] == '"v1"'
+
+    # New ETag with one fixture finished: only that row changes
+    api.recording, api.etag = "pl_matches_updated.json", '"v2"'
+    assert run_refresh(api) == 1
+
+    today = fixtures.get_fixtures_for_date(TODAY)
+    assert [(row[4], row[5], row[3]) for row in today] == [
+        ("Chelsea FC", "Arsenal FC", "FINISHED"),
+        ("Manchester United FC", "Liverpool FC", "TIMED")
+    ]
+    finished = fixtures.get_finished_fixtures()
+    assert len(finished) == 4
+    assert finished[-1][6:] == (0, 2)
+    assert db.get_db_connection().execute('SELECT COUNT(*) FROM teams').fetchone()[0] == 6
+
+def test_failed_store_does_not_keep_validators(db, monkeypatch):
+    api = RecordedFootballData("pl_matches.json")
+    fixture_row = fixtures._fixture_row
+
+    def broken_row(match, competition):
+        raise KeyError("utcDate")
+
+    monkeypatch.setattr(fixtures, "_fixture_row", broken_row)
+    with pytest.raises(KeyError):
+        run_refresh(api)
+    assert db.get_db_connection().execute('SELECT COUNT(*) FROM api_cache').fetchone()[0] == 0
+
+    # Nothing was stored, so the next refresh must not be answered with a 304
+    monkeypatch.setattr(fixtures, "_fixture_row", fixture_row)
+    assert run_refresh(api) == 6
+    assert "If-None-Match" not in api.requests[-1].headers
+
+def test_request_quota_window():
+    async def scenario():
+        quota = RequestQuota(per_minute=3, window=0.2)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for _ in range(4):
+            await quota.acquire()
+        return loop.time() - start
+
+    assert asyncio.run(scenario()) >= 0.19
+
+def test_quota_exhausted_retries(db):
+    responses = [httpx.Response(429, headers={"X-RequestCounter-Reset": "0"}),
+                 httpx.Response(200, json=load_recording("pl_matches.json"))]
+
+    async def scenario():
+        client = FootballDataClient(api_key="test", transport=httpx.MockTransport(lambda request: responses.pop(0)))
+        try:
+            return await refresh_fixtures(client, competitions=("PL",), today=TODAY)
+        finally:
+            await client.close()
+
+    assert asyncio.run(scenario()) == 6
+
+def test_season_backfill(db):
+    assert history_seasons(date(2026, 1, 31), past=2) == [2023, 2024, 2025]
+    assert history_seasons(date(2026, 8, 1), past=0) == [2026]
+
+    api = RecordedFootballData("pl_matches.json")
+
+    async def scenario():
+        client = FootballDataClient(api_key="test", transport=httpx.MockTransport(api.handler))
+        try:
+            return await backfill_seasons(client, [2024, 2025], competitions=("PL",))
+        finally:
+            await client.close()
+
+    assert asyncio.run(scenario()) == 6
+    assert [(r.url.path, r.url.params["season"], r.url.params["status"]) for r in api.requests] == [
+        ("/v4/competitions/PL/matches", "2024", "FINISHED"), ("/v4/competitions/PL/matches", "2025", "FINISHED")
+    ]
+    assert len(fixtures.get_finished_fixtures()) == 3
+    # Seasons already loaded are conditional requests answered with 304
+    assert asyncio.run(scenario()) == 0
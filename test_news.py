@@ -0,0 +1,140 @@
+import asyncio
+import json
+import os
+from datetime import datetime, timezone
+import httpx
+import pytest
+import database
+from engine import EaglensEngine
+from fixtures import store_matches
+from news import ContentIndex, FileNewsSource, NewsClassifier, NewsPipeline, RSSNewsSource, content_hash
+from predictions import PredictionMaterializer, get_upcoming_predictions
+from signals import NewsSignalEngine
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_data")
+NOW = datetime(2026, 1, 31, 9, 0, tzinfo=timezone.utc)
+
+@pytest.fixture(scope="module")
+def classifier():
+    return NewsClassifier.load()
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "eaglens.db"))
+    database.init_db()
+    with open(os.path.join(TEST_DATA, "football_data", "pl_matches.json")) as f:
+        store_matches(json.load(f))
+    yield database
+    database.close_db_connections()
+
+def feed_transport():
+    with open(os.path.join(TEST_DATA, "news", "feed.xml"), "rb") as f:
+        feed = f.read()
+    return httpx.MockTransport(lambda request: httpx.Response(200, content=feed))
+
+def test_classifier_batch(classifier):
+    results = classifier.predict([
+        "Defender ruled out with a knee injury",
+        "Manager sacked after another defeat",
+        "Odds shorten as punters back a home win"
+    ])
+    assert [category for category, _, _ in results] == [
+        "LINEUP_AVAILABILITY", "TACTICAL_MANAGERIAL", "MARKET_NOISE"
+    ]
+    assert results[0][2] < 0 < results[2][2]
+
+def test_pipeline_updates_only_fixtures_with_news(db, classifier, tmp_path):
+    materializer = PredictionMaterializer(EaglensEngine(), NewsSignalEngine())
+    materializer.refresh(now=NOW)
+    before = {p["fixture_id"]: p for p in get_upcoming_predictions(now=NOW)}
+
+    path = tmp_path / "wire.jsonl"
+    with open(path, "w") as f:
+        # The same Arsenal story as the RSS feed, differently punctuated: deduplicated by content hash
+        f.write(json.dumps({"title": "Arsenal striker ruled out for six weeks, with a hamstring injury!",
+                            "summary": "The club confirmed the forward will miss the trip to Stamford Bridge."}) + "\n")
+        f.write(json.dumps({"title": "Tottenham manager sacked", "summary": "Caretaker in charge."}) + "\n")
+
+    updated = []
+    async def on_update(fixture_ids):
+        updated.append(sorted(fixture_ids))
+        await asyncio.to_thread(materializer.apply_news_updates, fixture_ids)
+
+    sources = [RSSNewsSource("https://news.example/feed.xml", transport=feed_transport()), FileNewsSource(str(path))]
+    pipeline = NewsPipeline(sources, classifier, on_update, batch_wait=0.05, now=NOW)
+    stats = asyncio.run(pipeline.run())
+    assert stats == {"received": 5, "duplicates": 1, "malformed": 0, "unmatched": 1, "stored": 3}
+
+    after = {p["fixture_id"]: p for p in get_upcoming_predictions(now=NOW)}
+    # Arsenal (away) lose a striker: Chelsea's home chance rises
+    assert after[537911]["probabilities"]["home"] > before[537911]["probabilities"]["home"]
+    assert after[537911]["base_probabilities"] == before[537911]["probabilities"]
+    # Liverpool (away) get their captain back
+    assert after[537912]["probabilities"]["away"] > before[537912]["probabilities"]["away"]
+    # Tottenham (home) lose their manager
+    assert after[537913]["probabilities"]["home"] < before[537913]["probabilities"]["home"]
+    assert sorted(sum(updated, [])) == [537911, 537912, 537913]
+
+    # A full re-materialization reproduces the incremental result from the stored news
+    materializer.refresh(force=True, now=NOW)
+    rebuilt = {p["fixture_id"]: p for p in get_upcoming_predictions(now=NOW)}
+    for fixture_id in after:
+        assert rebuilt[fixture_id]["probabilities"] == pytest.approx(after[fixture_id]["probabilities"])
+
+def test_file_source_skips_malformed_and_waits_for_partial_lines(db, classifier, tmp_path):
+    path = tmp_path / "wire.jsonl"
+    with open(path, "w") as f:
+        f.write(json.dumps({"title": "Chelsea FC injury update", "summary": "", "fixture_id": 537911}) + "\n")
+        f.write("{not json\n")
+        f.write('["not", "an", "object"]\n')
+        f.write('{"title": "Tottenham manager sack')
+
+    source = FileNewsSource(str(path), follow=True)
+    assert [item and item["title"] for item in map(source._parse, source._read_new_lines())] == [
+        "Chelsea FC injury update", None, None
+    ]
+    # The half-written line is left unread until its writer finishes it
+    with open(path, "a") as f:
+        f.write('ed", "summary": "Caretaker in charge."}\n')
+    assert [source._parse(line)["title"] for line in source._read_new_lines()] == ["Tottenham manager sacked"]
+    assert source._read_new_lines() == []
+
+    class Broken:
+        async def items(self):
+            yield {"title": "Liverpool captain back in training", "summary": "", "fixture_id": 537912}
+            raise ConnectionError("feed went away")
+
+    pipeline = NewsPipeline([FileNewsSource(str(path)), Broken()], classifier, batch_wait=0.05, now=NOW)
+    stats = asyncio.run(pipeline.run())
+    assert stats["malformed"] == 2
+    assert stats["stored"] == 3
+
+def test_backpressure_bounds_buffered_items(db, classifier):
+    class Burst:
+        async def items(self):
+            for i in range(400):
+                yield {"title": f"Chelsea FC injury update {i}", "summary": "", "fixture_id": 537911}
+
+    queue_size, batch_size = 8, 16
+    pipeline = NewsPipeline([Burst()], classifier, queue_size=queue_size, batch_size=batch_size, batch_wait=0.01)
+    processed, lag = [0], []
+    process = pipeline.process
+
+    def slow_process(batch):
+        lag.append(pipeline.stats["received"] - processed[0])
+        processed[0] += len(batch)
+        return process(batch)
+
+    pipeline.process = slow_process
+    stats = asyncio.run(pipeline.run())
+    assert stats["stored"] == 400
+    # Never more than one batch in hand plus a full queue plus the item blocked on put()
+    assert max(lag) <= batch_size + queue_size + 1
+
+def test_content_index_is_bounded():
+    index = ContentIndex(capacity=3)
+    digests = [content_hash({"title": f"story {i}", "summary": ""}) for i in range(5)]
+    assert all(index.add(d) for d in digests)
+    assert len(index) == 3
+    assert not index.add(digests[-1])
+    assert index.add(digests[0])
@@ -0,0 +1,118 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+import pytest
+import payments
+from payments import PaymentManager, CircuitBreaker
+
+class FakeFlutterwave(BaseHTTPRequestHandler):
+    """Local stand-in for the Flutterwave v3 API."""
+    failures_left = 0
+    delay = 0.0
+    calls = []
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def handle_call(self):
+        FakeFlutterwave.calls.append((self.command, self.path))
+        time.sleep(FakeFlutterwave.delay)
+        if FakeFlutterwave.failures_left > 0:
+            FakeFlutterwave.failures_left -= 1
+            return self.reply(503, {"status": "error", "message": "Service unavailable"})
+        return None
+
+    def do_POST(self):
+        if self.handle_call() is None and self.path == "/v3/payments":
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            self.reply(200, {"status": "success", "data": {"link": f"https://checkout.test/{body['tx_ref']}"}})
+
+    def do_GET(self):
+        if self.handle_call() is None and self.path.startswith("/v3/transactions/"):
+            self.reply(200, {"status": "success", "data": {"status": "successful", "meta": {"plan": "trial"}}})
+
+@pytest.fixture
+def flutterwave(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeFlutterwave)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    FakeFlutterwave.failures_left = 0
+    FakeFlutterwave.delay = 0.0
+    FakeFlutterwave.calls = []
+    monkeypatch.setattr(PaymentManager, "BASE_URL", f"http://127.0.0.1:{server.server_port}/v3")
+    monkeypatch.setattr(PaymentManager, "breaker", CircuitBreaker(failure_threshold=3, reset_timeout=60))
+    monkeypatch.setattr(payments, "FLW_RETRY_BACKOFF", 0.01)
+    yield FakeFlutterwave
+    server.shutdown()
+
+def run(coro):
+    async def scenario():
+        try:
+            return await coro
+        finally:
+            await PaymentManager.close()
+    return asyncio.run(scenario())
+
+def test_initialize_and_verify(flutterwave):
+    res = run(PaymentManager.initialize_transaction("user_1@eaglens.bot", 7.99, {"user_id": 1, "plan": "trial"}))
+    assert res["status"] is True
+    assert res["data"]["link"].endswith(res["data"]["reference"])
+
+    res = run(PaymentManager.verify_transaction("12345"))
+    assert res["data"]["status"] == "successful"
+
+def test_retries_transient_failures(flutterwave):
+    flutterwave.failures_left = 2
+    res = run(PaymentManager.verify_transaction("12345"))
+    assert res["status"] == "success"
+    assert len(flutterwave.calls) == 3
+
+def test_read_timeout(flutterwave, monkeypatch):
+    monkeypatch.setattr(payments, "FLW_READ_TIMEOUT", 0.05)
+    monkeypatch.setattr(payments, "FLW_MAX_RETRIES", 0)
+    flutterwave.delay = 0.3
+    res = run(PaymentManager.verify_transaction("12345"))
+    assert res["status"] == "error"
+
+def test_circuit_breaker_opens(flutterwave, monkeypatch):
+    monkeypatch.setattr(payments, "FLW_MAX_RETRIES", 0)
+    flutterwave.failures_left = 100
+    for _ in range(3):
+        assert run(PaymentManager.verify_transaction("12345"))["status"] == "error"
+    assert PaymentManager.breaker.state == "open"
+
+    # Open circuit fails fast without touching the gateway
+    calls = len(flutterwave.calls)
+    res = run(PaymentManager.initialize_transaction("user_1@eaglens.bot", 7.99, {"plan": "trial"}))
+    assert res["status"] is False
+    assert "circuit breaker" in res["message"]
+    assert len(flutterwave.calls) == calls
+
+def test_half_open_admits_one_probe(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(payments, "time", SimpleNamespace(monotonic=lambda: clock[0]))
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    clock[0] += 30
+    assert breaker.state == "half_open"
+    assert [breaker.allow() for _ in range(3)] == [True, False, False]
+    breaker.record_failure()  # probe failed: open again for another reset_timeout
+    assert breaker.state == "open" and not breaker.allow()
+
+    clock[0] += 30
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow() and breaker.allow()
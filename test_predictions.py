@@ -0,0 +1,129 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import date, datetime, timezone
+import pytest
+import database
+from engine import EaglensEngine
+from fixtures import store_matches
+from news import store_news_items
+from predictions import PredictionMaterializer, get_predictions_for_date, get_upcoming_predictions
+from signals import NewsSignalEngine
+
+RECORDINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_data", "football_data")
+NOW = datetime(2026, 1, 31, 9, 0, tzinfo=timezone.utc)
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "eaglens.db"))
+    database.init_db()
+    with open(os.path.join(RECORDINGS, "pl_matches.json")) as f:
+        store_matches(json.load(f))
+    yield database
+    database.close_db_connections()
+
+def test_materialize_only_on_change(db):
+    engine = EaglensEngine()
+    materializer = PredictionMaterializer(engine, NewsSignalEngine())
+    assert materializer.refresh(now=NOW) == 3
+    assert materializer.refresh(now=NOW) == 0
+
+    today = get_predictions_for_date(date(2026, 1, 31))
+    assert [(p["home_team"], p["away_team"]) for p in today] == [
+        ("Chelsea FC", "Arsenal FC"), ("Manchester United FC", "Liverpool FC")
+    ]
+    assert all(p["status"] == "success" for p in today)
+    assert len(get_upcoming_predictions(now=NOW)) == 3
+
+    # A calibration change re-materializes the slate
+    engine.calibration_metrics["brier_score"] = 0.25
+    assert materializer.refresh(now=NOW) == 3
+    assert all(p["status"] == "suppressed" for p in get_predictions_for_date(date(2026, 1, 31)))
+
+def test_materialize_applies_news(db):
+    store_news_items([{"content_hash": "a" * 40, "fixture_id": 537911, "category": "LINEUP_AVAILABILITY",
+                       "impact": 1.0, "sr": 1.0, "ss": 1.0, "pi": 1.0, "tr": 1.0}])
+    materializer = PredictionMaterializer(EaglensEngine(), NewsSignalEngine())
+    materializer.refresh(now=NOW)
+
+    shifted, plain = get_predictions_for_date(date(2026, 1, 31))
+    assert shifted["probabilities"]["home"] > shifted["base_probabilities"]["home"]
+    assert shifted["news_shift"] == pytest.approx(0.12)
+    assert "base_probabilities" not in plain
+
+def test_concurrent_refreshes_are_serialized(db):
+    materializer = PredictionMaterializer(EaglensEngine(), NewsSignalEngine())
+    settle, running, overlap = materializer.settle_results, [], []
+
+    def slow_settle():
+        running.append(1)
+        overlap.append(len(running))
+        time.sleep(0.05)
+        running.pop()
+        return settle()
+
+    materializer.settle_results = slow_settle
+    threads = [threading.Thread(target=materializer.refresh, kwargs={"now": NOW}) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert overlap == [1, 1]
+    assert len(get_upcoming_predictions(now=NOW)) == 3
+
+def test_news_during_refresh_is_not_overwritten(db, monkeypatch):
+    import predictions
+    materializer = PredictionMaterializer(EaglensEngine(), NewsSignalEngine())
+    materializer.refresh(now=NOW)
+    compute, updaters = predictions.compute_predictions, []
+
+    def compute_while_news_arrives(*args):
+        # The refresh has already read the news table; a story lands before it writes its (unshifted) results
+        results = compute(*args)
+        store_news_items([{"content_hash": "b" * 40, "fixture_id": 537911, "category": "LINEUP_AVAILABILITY",
+                           "impact": 1.0, "sr": 1.0, "ss": 1.0, "pi": 1.0, "tr": 1.0}])
+        updaters.append(threading.Thread(target=materializer.apply_news_updates, args=([537911],)))
+        updaters[0].start()
+        time.sleep(0.05)
+        return results
+
+    monkeypatch.setattr(predictions, "compute_predictions", compute_while_news_arrives)
+    materializer.refresh(force=True, now=NOW)
+    updaters[0].join()
+    shifted = {p["fixture_id"]: p for p in get_upcoming_predictions(now=NOW)}[537911]
+    assert shifted["probabilities"]["home"] > shifted["base_probabilities"]["home"]
+
+def test_backfilled_results_force_a_full_refit(db, monkeypatch):
+    import predictions
+    import strength
+    finished, calls = [], []
+    monkeypatch.setattr(predictions, "get_finished_fixtures", lambda: list(finished))
+    monkeypatch.setattr(strength, "fit_strength_models",
+                        lambda rows, previous=None: calls.append(("fit", len(rows))) or {})
+    monkeypatch.setattr(strength, "update_strength_models", lambda models, rows: calls.append(("update", len(rows))))
+
+    def results(start, count, day):
+        return [(i, 2021, 2025, f"{day}T15:00:00Z", "Home", "Away", 1, 0) for i in range(start, start + count)]
+
+    materializer = PredictionMaterializer(EaglensEngine(), NewsSignalEngine())
+    finished += results(0, 10, "2026-01-10")
+    materializer.update_strengths()
+    finished += results(10, 2, "2026-01-17")
+    materializer.update_strengths()
+    # A backfilled season arrives after the first fit: older than anything fitted, so refit with time decay
+    finished += results(12, 3, "2024-09-01")
+    materializer.update_strengths()
+    finished += results(15, predictions.STRENGTH_ONLINE_MAX_RESULTS + 1, "2026-01-24")
+    materializer.update_strengths()
+    assert calls == [("fit", 10), ("update", 2), ("fit", 15), ("fit", 66)]
+
+def test_bot_import_defers_numpy():
+    # numpy/scipy-backed modules load in the engine warm-up and the materializer job, not at bot import
+    code = ("import sys, bot; "
+            "print(sorted(m for m in ('numpy', 'scipy', 'strength', 'calibration', 'signals') if m in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timezone
+import pytest
+from telegram import Bot, Update, User
+import database
+from bot import build_application
+from fixtures import store_matches
+from predictions import PredictionMaterializer
+from search import SearchIndex
+from signals import NewsSignalEngine
+
+RECORDINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_data", "football_data")
+NOW = datetime(2026, 1, 31, 9, 0, tzinfo=timezone.utc)
+USER_ID = 5150
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "eaglens.db"))
+    database.init_db()
+    database.clear_access_cache()
+    with open(os.path.join(RECORDINGS, "pl_matches.json")) as f:
+        store_matches(json.load(f))
+    yield database
+    database.close_db_connections()
+    database.clear_access_cache()
+
+def fixture_row(fixture_id, home, away, utc_date="2026-02-07T15:00:00Z", status="TIMED"):
+    return (fixture_id, utc_date, status, home, None, None, away, None, None)
+
+def top(index, query):
+    return [(home, away) for _, home, away, _ in index.search(query)][0]
+
+def test_ranked_fuzzy_matches(db):
+    index = SearchIndex()
+    assert index.refresh(now=NOW) == 3  # finished fixtures are not searchable
+    index.add_fixture(fixture_row(900, "FC Bayern München", "Borussia Dortmund"))
+
+    assert top(index, "arsnal") == ("Chelsea FC", "Arsenal FC")  # typo
+    assert top(index, "chel") == ("Chelsea FC", "Arsenal FC")  # prefix
+    assert top(index, "man utd vs liverpool") == ("Manchester United FC", "Liverpool FC")  # alias + both teams
+    assert top(index, "spurs") == ("Tottenham Hotspur FC", "Manchester City FC")
+    assert top(index, "munchen") == ("FC Bayern München", "Borussia Dortmund")  # accents folded
+    # Two teams named in the query outrank fixtures matching only one of them
+    assert top(index, "arsenal chelsea") == ("Chelsea FC", "Arsenal FC")
+    assert len(index.search("manchester")) == 2
+    assert index.search("zzzzqx") == []
+
+def test_incremental_refresh(db):
+    index = SearchIndex()
+    index.refresh(now=NOW)
+    assert index.refresh(now=NOW) == 0
+
+    conn = db.get_db_connection()
+    with conn:
+        conn.execute("UPDATE fixtures SET status = 'FINISHED' WHERE home_team = 'Chelsea FC' AND status = 'TIMED'")
+        conn.execute("INSERT INTO fixtures (id, utc_date, status, home_team, away_team) "
+                     "VALUES (77, '2026-02-08T16:00:00Z', 'SCHEDULED', 'Aston Villa FC', 'Everton FC')")
+    assert index.refresh(now=NOW) == 2
+    assert all(home != "Chelsea FC" for _, home, _, _ in index.search("chelsea"))
+    assert top(index, "villa") == ("Aston Villa FC", "Everton FC")
+
+def test_search_is_sub_millisecond():
+    index = SearchIndex()
+    teams = [f"{city} {suffix} FC" for city in ("Leeds", "Bristol", "Norwich", "Stoke", "Hull", "Derby", "Wigan",
+                                                "Reading", "Luton", "Burnley", "Watford", "Sunderland")
+             for suffix in ("United", "City", "Rovers", "Athletic", "Town", "Wanderers")]
+    for i in range(500):
+        index.add_fixture(fixture_row(i, teams[i % len(teams)], teams[(i * 7 + 3) % len(teams)]))
+
+    queries = ["leeds", "brstol city", "sunderlnd ath", "wigan vs hull", "rov", "watford town"] * 50
+    started = time.perf_counter()
+    for query in queries:
+        assert index.search(query)
+    assert (time.perf_counter() - started) / len(queries) < 1e-3
+
+class SearchBot(Bot):
+    """Bot recording outgoing messages (with their keyboards) instead of calling Telegram."""
+
+    def __init__(self):
+        super().__init__("123456:search-test")
+        self._calls = []
+
+    @property
+    def calls(self):
+        return self._calls
+
+    async def get_me(self, *args, **kwargs):
+        self._bot_user = User(123456, "Eaglens", True, username="EaglensBot")
+        return self._bot_user
+
+    async def send_message(self, chat_id, text, *args, reply_markup=None, **kwargs):
+        self._calls.append(("send", text, reply_markup))
+
+    async def edit_message_text(self, text, *args, **kwargs):
+        self._calls.append(("edit", text, None))
+
+    async def answer_callback_query(self, *args, **kwargs):
+        return True
+
+def test_search_match_flow(db):
+    from engine import EaglensEngine
+    PredictionMaterializer(EaglensEngine(), NewsSignalEngine()).refresh(now=NOW)
+    conn = db.get_db_connection()
+    with conn:
+        conn.execute('INSERT INTO users (telegram_id, is_verified, is_subscribed, expiry_ts) VALUES (?, 1, 1, ?)',
+                     (USER_ID, int(time.time()) + 3600))
+
+    def message(update_id, text):
+        return {"update_id": update_id, "message": {
+            "message_id": update_id, "date": int(time.time()), "text": text,
+            "chat": {"id": USER_ID, "type": "private"}, "from": {"id": USER_ID, "is_bot": False, "first_name": "S"}
+        }}
+
+    async def scenario():
+        bot = SearchBot()
+        application = build_application(bot=bot)
+        application.bot_data['search_index'] = index = SearchIndex()
+        index.refresh(now=NOW)
+        index.refreshed_at = float("inf")  # keep the NOW-based window for the test
+        async with application:
+            await application.process_update(Update.de_json(message(1, "🔍 Search Match"), bot))
+            await application.process_update(Update.de_json(message(2, "man utd"), bot))
+            _, text, markup = bot.calls[-1]
+            button = markup.inline_keyboard[0][0]
+            assert button.text.startswith("Manchester United FC vs Liverpool FC")
+
+            callback = {"update_id": 3, "callback_query": {
+                "id": "cb", "chat_instance": "ci", "data": button.callback_data,
+                "from": {"id": USER_ID, "is_bot": False, "first_name": "S"},
+                "message": {"message_id": 2, "date": int(time.time()), "text": text,
+                            "chat": {"id": USER_ID, "type": "private"}}
+            }}
+            await application.process_update(Update.de_json(callback, bot))
+            kind, text, _ = bot.calls[-1]
+            assert kind == "edit" and "Manchester United FC vs Liverpool FC" in text
+
+    asyncio.run(scenario())
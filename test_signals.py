@@ -0,0 +1,92 @@
+import random
+import numpy as np
+import pytest
+import database
+from engine import EaglensEngine
+from signals import OUTCOMES, AssumptionRegistry, NewsSignalEngine
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "eaglens.db"))
+    database.init_db()
+    yield database
+    database.close_db_connections()
+
+def random_slate(rng, n_fixtures=300):
+    categories = list(NewsSignalEngine.CATEGORIES) + ["UNKNOWN"]
+    slate = []
+    for _ in range(n_fixtures):
+        p = np.random.default_rng(rng.randrange(10**6)).dirichlet([4, 3, 3])
+        items = []
+        for _ in range(rng.randrange(0, 30)):
+            item = {"category": rng.choice(categories), "impact": rng.uniform(-1, 1)}
+            for field in ("sr", "ss", "pi", "tr"):
+                if rng.random() < 0.7:
+                    item[field] = rng.uniform(0, 1.5)
+            items.append(item)
+        slate.append((dict(zip(OUTCOMES, p)), items))
+    return slate
+
+def test_batch_matches_per_item():
+    engine = NewsSignalEngine()
+    slate = random_slate(random.Random(9))
+    # Strong news that pushes probabilities into the 0.01 floor
+    slate.append(({"home": 0.9, "draw": 0.05, "away": 0.05}, [{"category": "LINEUP_AVAILABILITY", "impact": -1}] * 10))
+
+    columns = engine.encode_news([items for _, items in slate])
+    base = [[probs[k] for k in OUTCOMES] for probs, _ in slate]
+    shifted, total_shift = engine.apply_signal_shift_batch(base, **columns)
+
+    for (probs, items), batch_probs, batch_shift in zip(slate, shifted, total_shift):
+        expected, expected_shift = engine.apply_signal_shift(probs, items)
+        assert np.allclose(batch_probs, [expected[k] for k in OUTCOMES], rtol=0, atol=1e-12)
+        assert abs(batch_shift - expected_shift) < 1e-12
+
+def test_assumption_thresholds():
+    registry = AssumptionRegistry()
+    registry.update_assumption("recent_form", 0.2)
+    registry.update_assumption("elo_predictive", 0.4)
+    registry.update_assumption("home_advantage", 0.9)
+    assert registry.assumptions["recent_form"] == {"status": "degraded", "weight": 0.5}
+    assert registry.assumptions["elo_predictive"] == {"status": "weakening", "weight": pytest.approx(0.8)}
+    assert registry.assumptions["home_advantage"] == {"status": "active", "weight": 1.0}
+
+def test_assumption_weights_recover_and_ignore_small_samples():
+    registry = AssumptionRegistry()
+    weakening = {"home_bias": 0.06, "performance_drift": 0.0, "brier_score": 0.18, "sample_size": 100}
+    for _ in range(10):
+        registry.evaluate_all(weakening)
+    # Repeated evaluation of the same metrics does not compound
+    assert registry.weights()["home_advantage"] == pytest.approx(0.8)
+    assert len(registry._changes) == 1
+
+    # A handful of results is noise, not evidence
+    assert registry.evaluate_all({**weakening, "home_bias": 0.5, "sample_size": 3}) == {}
+    assert registry.weights()["home_advantage"] == pytest.approx(0.8)
+
+    registry.evaluate_all({**weakening, "home_bias": 0.01})
+    assert registry.assumptions["home_advantage"] == {"status": "active", "weight": 1.0}
+
+def test_evaluate_all_persists_with_history(db):
+    registry = AssumptionRegistry.load()
+    performance = registry.evaluate_all({"home_bias": 0.09, "performance_drift": 0.05, "brier_score": 0.21,
+                                         "sample_size": 200})
+    assert performance["home_advantage"] == pytest.approx(0.1)
+    assert performance["recent_form"] == pytest.approx(0.8)
+    assert performance["elo_predictive"] == pytest.approx(0.4)
+    registry.save()
+
+    restored = AssumptionRegistry.load()
+    assert restored.weights() == pytest.approx({"home_advantage": 0.5, "recent_form": 1.0, "elo_predictive": 0.8})
+    assert [(name, status) for name, status, *_ in restored.history()] == [
+        ("home_advantage", "degraded"), ("elo_predictive", "weakening")
+    ]
+
+def test_weights_shape_engine_output():
+    engine = EaglensEngine()
+    baseline = engine.predict("A", "B", 1.5, 1.0)
+    engine.set_assumption_weights({"home_advantage": 0.5, "recent_form": 0.5, "elo_predictive": 1.0})
+    weighted = engine.predict("A", "B", 1.5, 1.0)
+    assert weighted["probabilities"]["home"] < baseline["probabilities"]["home"]
+    assert weighted["confidence"] == baseline["confidence"] - 10
+    assert engine.predict_many([("A", "B", 1.5, 1.0)])[0]["probabilities"] == pytest.approx(weighted["probabilities"])
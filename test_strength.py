@@ -0,0 +1,56 @@
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from engine import EaglensEngine
+from strength import TeamStrengthModel
+
+def simulate_season(n_teams=20, seed=3):
+    """Double round-robin with known strengths: mu=0.15, home_adv=0.25."""
+    rng = np.random.default_rng(seed)
+    attack = rng.normal(0, 0.3, n_teams)
+    defence = rng.normal(0, 0.3, n_teams)
+    attack -= attack.mean()
+    defence -= defence.mean()
+    start = datetime(2025, 8, 15)
+    results = []
+    for i, (h, a) in enumerate((h, a) for h in range(n_teams) for a in range(n_teams) if h != a):
+        lam_home = np.exp(0.15 + 0.25 + attack[h] - defence[a])
+        lam_away = np.exp(0.15 + attack[a] - defence[h])
+        kickoff = (start + timedelta(hours=12 * i)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        results.append((kickoff, f"Team {h}", f"Team {a}", int(rng.poisson(lam_home)), int(rng.poisson(lam_away))))
+    return results, attack, defence
+
+def test_fit_recovers_strengths_quickly():
+    results, attack, defence = simulate_season()
+    model = TeamStrengthModel(ridge=0.1)
+
+    start = time.perf_counter()
+    model.fit(results)
+    elapsed = time.perf_counter() - start
+    print(f"Fitted {len(results)} matches in {elapsed * 1000:.1f}ms")
+    assert elapsed < 1.0
+
+    order = [model.teams[f"Team {i}"] for i in range(len(attack))]
+    assert np.corrcoef(model.attack[order], attack)[0, 1] > 0.7
+    assert np.corrcoef(model.defence[order], defence)[0, 1] > 0.7
+    assert 0.1 < model.home_adv < 0.4
+
+def test_partial_fit_and_engine_feed():
+    results, _, _ = simulate_season()
+    model = TeamStrengthModel().fit(results[:-20])
+    before = model.expected_goals("Team 0", "Team 1")
+
+    # A thrashing nudges the winner's attack up without touching the rest of the league
+    untouched = model.expected_goals("Team 5", "Team 6")
+    model.partial_fit("Team 0", "Team 1", 6, 0)
+    after = model.expected_goals("Team 0", "Team 1")
+    assert after[0] > before[0]
+    assert after[1] <= before[1]
+    assert abs(model.expected_goals("Team 5", "Team 6")[0] - untouched[0]) < 0.05
+
+    # Warm-started refit converges from the previous solution
+    model.fit(results)
+
+    prediction = EaglensEngine().predict("Team 0", "Team 1", *model.expected_goals("Team 0", "Team 1"))
+    assert prediction["status"] == "success"
+    assert model.expected_goals("Unknown FC", "Team 1")[0] > 0
@@ -0,0 +1,187 @@
+import asyncio
+import time
+from types import SimpleNamespace
+import httpx
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from telegram import Bot, User
+import database
+from bot import build_application
+from payments import PaymentManager, CircuitBreaker
+from webhook import PAYMENT_TASKS_KEY, create_webhook_app, notify_payment, run_webhook
+
+SECRET = "telegram-secret"
+FLW_HASH = "flutterwave-hash"
+USER_ID = 4242
+
+class StandInBot(Bot):
+    """Bot whose Telegram API calls are recorded instead of sent."""
+
+    def __init__(self):
+        super().__init__("123456:webhook-test")
+        self._sent = []
+
+    async def get_me(self, *args, **kwargs):
+        self._bot_user = User(123456, "Eaglens", True, username="EaglensBot")
+        return self._bot_user
+
+    @property
+    def sent(self):
+        return self._sent
+
+    async def send_message(self, chat_id, text, *args, **kwargs):
+        self._sent.append((chat_id, text))
+
+async def fake_flutterwave(request):
+    """Local stand-in for GET /transactions/{id}/verify."""
+    transaction_id = request.match_info["transaction_id"]
+    if transaction_id == "999":
+        return web.json_response({"status": "success", "data": {
+            "id": 999, "status": "successful", "amount": 0.5, "currency": "USD",
+            "meta": {"user_id": str(USER_ID), "plan": "monthly"}
+        }})
+    return web.json_response({"status": "success", "data": {
+        "id": int(transaction_id), "status": "successful", "amount": 7.99, "currency": "USD",
+        "meta": {"user_id": str(USER_ID), "plan": "trial"}
+    }})
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "eaglens.db"))
+    database.init_db()
+    database.clear_access_cache()
+    yield database
+    database.close_db_connections()
+    database.clear_access_cache()
+
+def start_update(update_id, text, user_id=USER_ID):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": int(time.time()), "text": text,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Sub", "username": "subscriber"},
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+            if text.startswith("/") else []
+        }
+    }
+
+async def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+def test_webhook_end_to_end(db, monkeypatch):
+    monkeypatch.setattr(PaymentManager, "breaker", CircuitBreaker())
+
+    async def scenario():
+        flutterwave_app = web.Application()
+        flutterwave_app.router.add_get("/v3/transactions/{transaction_id}/verify", fake_flutterwave)
+        flutterwave = TestServer(flutterwave_app)
+        await flutterwave.start_server()
+        monkeypatch.setattr(PaymentManager, "BASE_URL", str(flutterwave.make_url("/v3")))
+
+        bot = StandInBot()
+        application = build_application(bot=bot)
+        webhook_app = create_webhook_app(application, secret_token=SECRET, flw_hash=FLW_HASH)
+        server = TestServer(webhook_app)
+        await server.start_server()
+        try:
+            async with application, httpx.AsyncClient(base_url=str(server.make_url(""))) as client:
+                await application.start()
+
+                # Telegram: only requests carrying the secret token are accepted
+                response = await client.post("/telegram", json=start_update(1, "/start"))
+                assert response.status_code == 403
+                response = await client.post("/telegram", json=start_update(1, "/start"),
+                                             headers={"X-Telegram-Bot-Api-Secret-Token": SECRET})
+                assert response.status_code == 200
+                await wait_for(lambda: bot.sent)
+                assert bot.sent[0][0] == USER_ID and "Invite Code" in bot.sent[0][1]
+                assert database.check_user_access(USER_ID) == (False, "not_verified")
+
+                # Flutterwave: the event is only a hint; the transaction is re-verified before activation
+                event = {"event": "charge.completed", "data": {"id": 555, "status": "successful"}}
+                response = await client.post("/flutterwave", json=event, headers={"verif-hash": "wrong"})
+                assert response.status_code == 403
+                for _ in range(2):  # Flutterwave may deliver the same event twice
+                    response = await client.post("/flutterwave", json=event, headers={"verif-hash": FLW_HASH})
+                    assert response.status_code == 200
+                    await wait_for(lambda: not webhook_app[PAYMENT_TASKS_KEY])
+                assert len(bot.sent) == 2 and "Payment Successful" in bot.sent[1][1]
+                assert database.check_user_access(USER_ID) == (False, "not_verified")  # invite still required
+                row = database.get_db_connection().execute(
+                    'SELECT is_subscribed, trial_used FROM users WHERE telegram_id = ?', (USER_ID,)
+                ).fetchone()
+                assert row == (1, 1)
+
+                # Underpaid transactions are not activated
+                underpaid = {"event": "charge.completed", "data": {"id": 999, "status": "successful"}}
+                await client.post("/flutterwave", json=underpaid, headers={"verif-hash": FLW_HASH})
+                await wait_for(lambda: not webhook_app[PAYMENT_TASKS_KEY])
+                assert len(bot.sent) == 2
+                processed = database.get_db_connection().execute('SELECT COUNT(*) FROM processed_payments')
+                assert processed.fetchone()[0] == 1
+
+                # /verify goes through the same claim: the webhook already redeemed 555, and nobody else may
+                headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+                await client.post("/telegram", json=start_update(2, "/verify 555"), headers=headers)
+                await wait_for(lambda: len(bot.sent) == 3)
+                assert "already been applied" in bot.sent[2][1]
+                await client.post("/telegram", json=start_update(3, "/verify 556", user_id=USER_ID + 1),
+                                  headers=headers)
+                await wait_for(lambda: len(bot.sent) == 4)
+                assert bot.sent[3][0] == USER_ID + 1 and "not made from your account" in bot.sent[3][1]
+                processed = database.get_db_connection().execute('SELECT COUNT(*) FROM processed_payments')
+                assert processed.fetchone()[0] == 1
+
+                await application.stop()
+        finally:
+            await server.close()
+            await flutterwave.close()
+            await PaymentManager.close()
+
+    asyncio.run(scenario())
+
+def test_payment_task_failures_are_logged(monkeypatch, caplog):
+    async def unreachable(transaction_id):
+        raise ConnectionError("Flutterwave unreachable")
+
+    monkeypatch.setattr(PaymentManager, "settle_payment", unreachable)
+    asyncio.run(notify_payment(build_application(bot=StandInBot()), 555))
+    assert "Failed to process Flutterwave transaction 555" in caplog.text
+    assert "Flutterwave unreachable" in caplog.text
+
+def test_post_shutdown_runs_after_application_shutdown():
+    calls = []
+
+    class RecordingApplication:
+        post_init = None
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            calls.append("shutdown")
+
+        async def start(self):
+            calls.append("start")
+
+        async def stop(self):
+            calls.append("stop")
+
+        async def post_shutdown(self, application):
+            calls.append("post_shutdown")
+
+    async def set_webhook(*args, **kwargs):
+        pass
+
+    application = RecordingApplication()
+    application.bot = SimpleNamespace(set_webhook=set_webhook)
+    stop = asyncio.Event()
+    stop.set()
+    asyncio.run(run_webhook(application, url="https://example.test", listen="127.0.0.1", port=0,
+                            secret_token=SECRET, stop_event=stop))
+    assert calls == ["start", "stop", "shutdown", "post_shutdown"]
@@ -0,0 +1,109 @@
+import asyncio
+import time
+import pytest
+from telegram import Bot, Update, User
+import database
+from persistence import SQLitePersistence
+from workers import UpdateRouter, shard_for, shard_key
+
+OWNER = (7000, "lordsgreat")
+USERS = [(1000 + i, f"user{i}") for i in range(6)]
+
+class OutboxBot(Bot):
+    """Bot that records sends in an outbox table, so messages from worker processes can be inspected."""
+
+    def __init__(self):
+        super().__init__("123456:worker-test")
+
+    async def get_me(self, *args, **kwargs):
+        self._bot_user = User(123456, "Eaglens", True, username="EaglensBot")
+        return self._bot_user
+
+    async def send_message(self, chat_id, text, *args, **kwargs):
+        conn = database.get_db_connection()
+        with conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, chat_id INTEGER, text TEXT)')
+            conn.execute('INSERT INTO outbox (chat_id, text) VALUES (?, ?)', (chat_id, text))
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "eaglens.db"))
+    database.init_db()
+    yield database
+    database.close_db_connections()
+
+def message(update_id, user, text):
+    user_id, username = user
+    return Update.de_json({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": int(time.time()), "text": text,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": username, "username": username},
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}] if text.startswith("/") else []
+        }
+    }, None)
+
+def outbox():
+    conn = database.get_db_connection()
+    conn.execute('CREATE TABLE IF NOT EXISTS outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, chat_id INTEGER, text TEXT)')
+    messages = {}
+    for chat_id, text in conn.execute('SELECT chat_id, text FROM outbox ORDER BY id'):
+        messages.setdefault(chat_id, []).append(text)
+    return messages
+
+def run_router(workers, updates):
+    """Push updates through a fresh set of worker processes and wait for them to drain."""
+    router = UpdateRouter(workers=workers, bot_factory=OutboxBot, db_path=database.DB_PATH)
+    router.start()
+    try:
+        async def dispatch_all():
+            for update in updates:
+                await router.dispatch(update)
+        asyncio.run(dispatch_all())
+    finally:
+        router.stop(timeout=60)
+    assert all(process.exitcode == 0 for process in router.processes)
+
+def test_shard_is_stable_per_user():
+    first, second = message(1, USERS[0], "/start"), message(2, USERS[0], "hello")
+    assert shard_key(first) == shard_key(second) == USERS[0][0]
+    assert shard_for(shard_key(first), 4) == shard_for(shard_key(second), 4)
+    assert {shard_for(user_id, 4) for user_id, _ in USERS} == {0, 1, 2, 3}
+
+def test_persistence_round_trip(db):
+    async def scenario():
+        persistence = SQLitePersistence()
+        await persistence.update_user_data(1, {"awaiting_invite": True})
+        await persistence.update_chat_data(2, {"page": 3})
+        await persistence.update_conversation("checkout", (1, 1), "PLAN")
+        await persistence.update_conversation("checkout", (2, 2), "PLAN")
+        await persistence.update_conversation("checkout", (2, 2), None)
+        await persistence.drop_chat_data(2)
+
+        restored = SQLitePersistence()
+        assert await restored.get_user_data() == {1: {"awaiting_invite": True}}
+        assert await restored.get_chat_data() == {}
+        assert await restored.get_conversations("checkout") == {(1, 1): "PLAN"}
+    asyncio.run(scenario())
+
+def test_workers_share_state_through_the_database(db):
+    database.add_invite_code("TEAMCODE", max_uses=len(USERS))
+
+    # First deployment: the owner and every user press /start
+    updates = [message(1, OWNER, "/start")] + [message(10 + i, user, "/start") for i, user in enumerate(USERS)]
+    run_router(2, updates)
+    assert database.get_owner_id() == OWNER[0]
+
+    # Restart with a different worker count: per-user state (awaiting_invite) comes back from persistence
+    updates = [message(100, OWNER, "/gen_code 3")] + [message(110 + i, user, "TEAMCODE") for i, user in enumerate(USERS)]
+    run_router(3, updates)
+
+    messages = outbox()
+    for user_id, _ in USERS:
+        invite_prompt, verified, plans = messages[user_id]
+        assert "Invite Code" in invite_prompt
+        assert "Invite Verified" in verified and "Subscription Required" in plans
+        assert database.check_user_access(user_id) == (False, "not_subscribed")
+    # The owner id stored by the first run reaches /gen_code's notification in the second
+    assert any("New Invite Code Generated" in text for text in messages[OWNER[0]])
@@ -0,0 +1,109 @@
+import asyncio
+import hmac
+import logging
+import signal
+from aiohttp import web
+from telegram import Update
+from payments import PaymentManager
+from config import WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_SECRET, FLW_WEBHOOK_HASH
+
+APPLICATION_KEY = web.AppKey("application", object)
+PAYMENT_TASKS_KEY = web.AppKey("payment_tasks", set)
+
+def _header_matches(request, header, expected):
+    supplied = request.headers.get(header)
+    return bool(expected) and supplied is not None and hmac.compare_digest(supplied, expected)
+
+async def notify_payment(application, transaction_id):
+    """Verify a reported payment out of band and tell the subscriber once it is active.
+
+    Runs as a detached task, so failures are logged here rather than lost with the task.
+    """
+    try:
+        settled = await PaymentManager.settle_payment(transaction_id)
+        if settled["status"] != "activated":
+            return
+        telegram_id, expiry = settled["telegram_id"], settled["expiry"]
+        logging.info(f"Activated subscription for {telegram_id} from Flutterwave transaction {transaction_id}")
+        router = application.bot_data.get('router')
+        if router is not None:
+            # The worker serving this user keeps its own access cache
+            await router.invalidate_user(telegram_id)
+        await application.bot.send_message(
+            chat_id=telegram_id,
+            text=f"🎉 *Payment Successful!*\n\nYour Eaglens access is now **Active** until {expiry[:10]}.\n"
+                 "Use /start to open the main menu and start raining dollars! 💰",
+            parse_mode='Markdown'
+        )
+    except Exception:
+        logging.exception(f"Failed to process Flutterwave transaction {transaction_id}")
+
+def create_webhook_app(application, secret_token=WEBHOOK_SECRET, flw_hash=FLW_WEBHOOK_HASH):
+    """aiohttp app serving Telegram updates on /telegram and Flutterwave events on /flutterwave."""
+
+    async def telegram_update(request):
+        if not _header_matches(request, "X-Telegram-Bot-Api-Secret-Token", secret_token):
+            return web.Response(status=403)
+        try:
+            update = Update.de_json(await request.json(), application.bot)
+        except ValueError:
+            return web.Response(status=400)
+        await application.update_queue.put(update)
+        return web.Response()
+
+    async def flutterwave_event(request):
+        if not _header_matches(request, "verif-hash", flw_hash):
+            return web.Response(status=403)
+        try:
+            event = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        data = event.get("data") or {}
+        if event.get("event") == "charge.completed" and data.get("status") == "successful" and data.get("id"):
+            # Acknowledge at once; Flutterwave retries slow endpoints, and the payment is re-verified anyway
+            task = asyncio.create_task(notify_payment(application, data["id"]))
+            tasks = request.app[PAYMENT_TASKS_KEY]
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        return web.Response()
+
+    app = web.Application()
+    app[APPLICATION_KEY] = application
+    app[PAYMENT_TASKS_KEY] = set()
+    app.router.add_post("/telegram", telegram_update)
+    app.router.add_post("/flutterwave", flutterwave_event)
+    return app
+
+async def run_webhook(application, url=WEBHOOK_URL, listen=WEBHOOK_LISTEN, port=WEBHOOK_PORT,
+                      secret_token=WEBHOOK_SECRET, stop_event=None):
+    """Run the bot behind the embedded HTTP server until SIGINT/SIGTERM (or stop_event)."""
+    stop_event = stop_event or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    try:
+        async with application:
+            if application.post_init:
+                await application.post_init(application)
+            await application.bot.set_webhook(
+                url=f"{url.rstrip('/')}/telegram", secret_token=secret_token, allowed_updates=Update.ALL_TYPES
+            )
+            await application.start()
+
+            runner = web.AppRunner(create_webhook_app(application, secret_token))
+            await runner.setup()
+            await web.TCPSite(runner, listen, port).start()
+            logging.info(f"Webhook server listening on {listen}:{port}")
+            try:
+                await stop_event.wait()
+            finally:
+                await runner.cleanup()
+                await application.stop()
+    finally:
+        # As in run_polling: after Application.shutdown() has flushed persistence, before the database closes
+        if application.post_shutdown:
+            await application.post_shutdown(application)
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import multiprocessing
+import queue
+from telegram import Update
+import database
+from config import WORKER_PROCESSES, WORKER_QUEUE_SIZE
+
+INVALIDATE_USER = "invalidate_user"
+UPDATE = "update"
+
+def shard_key(update):
+    """The user an update belongs to (falling back to its chat), so one user's updates stay in order."""
+    if update.effective_user is not None:
+        return update.effective_user.id
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    return 0
+
+def shard_for(key, workers):
+    return key % workers
+
+async def serve_shard(inbox, bot=None):
+    """Handle this worker's updates one at a time, in arrival order, until a None arrives."""
+    import bot as eaglens_bot
+    from persistence import SQLitePersistence
+
+    application = eaglens_bot.build_application(bot=bot, persistence=SQLitePersistence())
+    loop = asyncio.get_running_loop()
+    async with application:
+        await application.start()
+        while True:
+            message = await loop.run_in_executor(None, inbox.get)
+            if message is None:
+                break
+            kind, payload = message
+            if kind == INVALIDATE_USER:
+                database.invalidate_user_access(payload)
+            else:
+                await application.process_update(Update.de_json(payload, application.bot))
+        await application.stop()
+
+def worker_main(index, inbox, bot_factory=None, db_path=None):
+    """Worker process entry point; bot_factory/db_path let tests swap in a stand-in bot and database."""
+    import async_database
+    if db_path:
+        database.DB_PATH = db_path
+    database.init_db()
+    logging.info(f"Update worker {index} started")
+    try:
+        asyncio.run(serve_shard(inbox, bot_factory() if bot_factory else None))
+    finally:
+        async_database.shutdown()
+        database.close_db_connections()
+
+class UpdateRouter:
+    """Receiver side: forwards each update to the worker process that owns its user."""
+
+    def __init__(self, workers=WORKER_PROCESSES, bot_factory=None, db_path=None, queue_size=WORKER_QUEUE_SIZE):
+        context = multiprocessing.get_context("spawn")
+        self.inboxes = [context.Queue(queue_size) for _ in range(workers)]
+        self.processes = [
+            context.Process(target=worker_main, args=(i, inbox, bot_factory, db_path),
+                            name=f"eaglens-worker-{i}", daemon=True)
+            for i, inbox in enumerate(self.inboxes)
+        ]
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+
+    async def _put(self, index, message):
+        try:
+            self.inboxes[index].put_nowait(message)
+        except queue.Full:
+            # Backpressure: wait for the worker without blocking the receiver's event loop
+            await asyncio.to_thread(self.inboxes[index].put, message)
+
+    async def dispatch(self, update, context=None):
+        """TypeHandler callback for the receiver application."""
+        await self._put(shard_for(shard_key(update), len(self.inboxes)), (UPDATE, update.to_dict()))
+
+    async def invalidate_user(self, telegram_id):
+        """Drop a user's cached access status in the worker that serves them."""
+        await self._put(shard_for(telegram_id, len(self.inboxes)), (INVALIDATE_USER, telegram_id))
+
+    def stop(self, timeout=30):
+        """Let every worker drain its queue, then wait for it to exit."""
+        for inbox in self.inboxes:
+            inbox.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                logging.warning(f"{process.name} did not stop in {timeout}s; terminating")
+                process.terminate()